@@ -0,0 +1,220 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class UserCache:
+    """
+    Short-TTL in-process cache of authenticated users keyed by user id
+    (normalized to str, since JWT claims carry the id as a string).
+    Entries are dropped by the signal handlers in account/signals.py whenever
+    the user row is saved or deleted.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+    def get(self, user_id):
+        """
+        Return a copy of the cached user, or None on a miss or expired entry.
+        """
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self.hits += 1
+            user = entry[1]
+        # Hand out a copy so per-request attribute changes never leak into the cache
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[str(user_id)] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class UsernameCache:
+    """
+    Bounded LRU mapping username -> user id, used to resolve created_by_username
+    sent by scanners and bulk imports. Only existing users are cached, so a user
+    created in another worker is found on the next lookup. Saves and deletes in
+    this process drop the user's entries (account/signals.py); renames and
+    deletions in other workers are picked up when USERNAME_CACHE_TTL runs out.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()  # username -> (expires, user id)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a lookup that raced one does not store what it read
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, 'USERNAME_CACHE_SIZE', 256)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'USERNAME_CACHE_TTL', 60)
+
+    def _lookup(self, username, now):
+        # Caller holds the lock; returns the cached user id or None
+        entry = self._entries.get(username)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[username]
+        self.misses += 1
+        return None
+
+    def _store(self, username, user_id, generation):
+        # Caller holds the lock
+        if user_id is None or generation != self._generation or self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._entries[username] = (time.monotonic() + self.ttl, user_id)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def resolve(self, username):
+        """
+        Return the id of the user with this username, or None if there is none.
+        """
+        if not username:
+            return None
+        with self._lock:
+            user_id = self._lookup(username, time.monotonic())
+            generation = self._generation
+        if user_id is not None:
+            return user_id
+        from .models import CustomUser
+        user_id = CustomUser.objects.filter(username=username).values_list('id', flat=True).first()
+        with self._lock:
+            self._store(username, user_id, generation)
+        return user_id
+
+    def resolve_many(self, usernames):
+        """
+        Resolve a collection of usernames with at most one query.
+        Returns a dict username -> user id (None for unknown usernames).
+        """
+        resolved = {}
+        missing = set()
+        now = time.monotonic()
+        with self._lock:
+            for username in set(u for u in usernames if u):
+                user_id = self._lookup(username, now)
+                if user_id is not None:
+                    resolved[username] = user_id
+                else:
+                    missing.add(username)
+            generation = self._generation
+        if missing:
+            from .models import CustomUser
+            rows = dict(CustomUser.objects.filter(username__in=missing).values_list('username', 'id'))
+            with self._lock:
+                for username in missing:
+                    resolved[username] = rows.get(username)
+                    self._store(username, resolved[username], generation)
+        return resolved
+
+    def username_for(self, user_id):
+        """
+        Reverse lookup among cached entries; None if the user is not cached.
+        The cache is small, so a scan is cheaper than a query.
+        """
+        if user_id is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for name, (expires, cached_id) in self._entries.items():
+                if cached_id == user_id and expires > now:
+                    return name
+        return None
+
+    def invalidate_user(self, user_id, username=None):
+        """
+        Drop every entry pointing at this user (covers renames) and the entry
+        for its current username (covers a username taken over from a deleted user).
+        """
+        with self._lock:
+            self._generation += 1
+            stale = [name for name, (_, cached_id) in self._entries.items() if cached_id == user_id]
+            if username is not None and username in self._entries:
+                stale.append(username)
+            for name in set(stale):
+                del self._entries[name]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+user_cache = UserCache()
+username_cache = UsernameCache()
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import user_cache, username_cache
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_cached_user_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Drop the cached user on any save (profile edit, password change, deactivation).
+    The last_login stamp written at token issue does not affect authorization.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_cache.invalidate(instance.pk)
+    username_cache.invalidate_user(instance.pk, instance.username)
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user_on_delete(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    username_cache.invalidate_user(instance.pk, instance.username)
@@ -1,3 +1,134 @@
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CachedJWTAuthentication
+from .cache import UsernameCache, user_cache, username_cache
+from .models import CustomUser
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """
+    The JWT auth class resolves users from user_cache; saves and deletes invalidate it
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = CustomUser.objects.create(username='scanner-1', role='n_user')
+        self.request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+        self.auth = CachedJWTAuthentication()
+
+    def authenticate(self):
+        return self.auth.authenticate(self.request)[0]
+
+    def test_second_request_is_served_from_the_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().pk, self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual((user.username, user.role), ('scanner-1', 'n_user'))
+
+        # Copies are handed out, so request-local changes stay out of the cache
+        user.role = 'admin'
+        self.assertEqual(self.authenticate().role, 'n_user')
+
+    def test_save_and_delete_invalidate(self):
+        self.authenticate()
+        self.user.role = 'manager'
+        self.user.save()
+        self.assertEqual(self.authenticate().role, 'manager')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_last_login_stamp_keeps_the_entry(self):
+        self.authenticate()
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+
+class UsernameCacheTests(TestCase):
+    """
+    created_by_username -> user id LRU (account/cache.py)
+    """
+
+    def setUp(self):
+        username_cache.clear()
+        self.alice = CustomUser.objects.create(username='alice')
+        self.bob = CustomUser.objects.create(username='bob')
+
+    def test_hits_are_cached_and_misses_are_not(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(username_cache.resolve('alice'), self.alice.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(username_cache.resolve('alice'), self.alice.pk)
+            self.assertEqual(username_cache.username_for(self.alice.pk), 'alice')
+
+        with self.assertNumQueries(2):
+            self.assertIsNone(username_cache.resolve('carol'))
+            self.assertIsNone(username_cache.resolve('carol'))
+        carol = CustomUser.objects.create(username='carol')
+        self.assertEqual(username_cache.resolve('carol'), carol.pk)
+
+    def test_resolve_many_uses_one_query(self):
+        username_cache.resolve('alice')
+        with self.assertNumQueries(1):
+            resolved = username_cache.resolve_many(['alice', 'bob', 'nobody', '', 'bob'])
+        self.assertEqual(resolved, {'alice': self.alice.pk, 'bob': self.bob.pk, 'nobody': None})
+        self.assertEqual(username_cache.stats()['size'], 2)
+
+    def test_rename_and_delete_invalidate(self):
+        username_cache.resolve_many(['alice', 'bob'])
+        self.alice.username = 'alicia'
+        self.alice.save()
+        self.assertIsNone(username_cache.resolve('alice'))
+        self.assertEqual(username_cache.resolve('alicia'), self.alice.pk)
+
+        bob_id = self.bob.pk
+        self.bob.delete()
+        self.assertIsNone(username_cache.username_for(bob_id))
+        self.assertIsNone(username_cache.resolve('bob'))
+
+    def test_entries_expire(self):
+        cache = UsernameCache(ttl=60)
+        with mock.patch('account.cache.time.monotonic', return_value=1000.0):
+            cache.resolve('alice')
+        with mock.patch('account.cache.time.monotonic', return_value=1059.0), self.assertNumQueries(0):
+            cache.resolve('alice')
+        with mock.patch('account.cache.time.monotonic', return_value=1061.0), self.assertNumQueries(1):
+            cache.resolve('alice')
+
+    def test_lookup_racing_an_invalidation_is_not_stored(self):
+        cache = UsernameCache()
+
+        def rename_while_querying(execute, sql, params, many, context):
+            # What another thread's post_save would do while this lookup waits on the database
+            cache.invalidate_user(self.alice.pk, 'alice')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(rename_while_querying):
+            self.assertEqual(cache.resolve('alice'), self.alice.pk)
+        self.assertEqual(cache.stats()['size'], 0)
+        cache.resolve('alice')
+        self.assertEqual(cache.stats()['size'], 1)
 
-# Create your tests here.
+    def test_lru_bound(self):
+        cache = UsernameCache(maxsize=1)
+        cache.resolve('alice')
+        cache.resolve('bob')
+        self.assertEqual(cache.stats()['size'], 1)
+        self.assertIsNone(cache.username_for(self.alice.pk))
+        self.assertEqual(cache.username_for(self.bob.pk), 'bob')
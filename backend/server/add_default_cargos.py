@@ -3,6 +3,7 @@
 Script to add default cargo entries to the database.
 Run this with: python manage.py shell < add_default_cargos.py
 Or: python add_default_cargos.py (if Django is configured)
+For staging volumes use: python manage.py seed_inventory
 """
 import os
 import sys
@@ -14,34 +15,22 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 django.setup()
 
 from product.models import Cargo
-
-# Default cargo entries
-DEFAULT_CARGOS = [
-    "Air Freight",
-    "Sea Freight",
-    "Express Courier",
-    "Ground Shipping",
-    "Rail Freight",
-    "Warehouse Storage",
-]
+from product.seeding import DEFAULT_CARGOS
 
 def add_default_cargos():
-    """Add default cargo entries to the database."""
-    created_count = 0
-    existing_count = 0
+    """Add default cargo entries to the database in one bulk insert."""
+    existing = set(Cargo.objects.filter(name__in=DEFAULT_CARGOS).values_list('name', flat=True))
+    Cargo.objects.bulk_create([Cargo(name=name) for name in DEFAULT_CARGOS], ignore_conflicts=True)
 
     for cargo_name in DEFAULT_CARGOS:
-        cargo, created = Cargo.objects.get_or_create(name=cargo_name)
-        if created:
-            created_count += 1
-            print(f"✓ Created cargo: {cargo_name}")
-        else:
-            existing_count += 1
+        if cargo_name in existing:
             print(f"• Cargo already exists: {cargo_name}")
+        else:
+            print(f"✓ Created cargo: {cargo_name}")
 
     print(f"\nSummary:")
-    print(f"- Created: {created_count}")
-    print(f"- Already existed: {existing_count}")
+    print(f"- Created: {len(DEFAULT_CARGOS) - len(existing)}")
+    print(f"- Already existed: {len(existing)}")
     print(f"- Total cargos in database: {Cargo.objects.count()}")
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Size and build time of the offline barcode snapshot (product/barcodes.py).
+
+Seeds a throwaway SQLite database with --products synthetic products (no
+photos), builds a full snapshot, changes --churn of the products (new
+so_numbers, deletions and new barcodes), builds again and reports the
+snapshot and delta sizes next to what the same lookups cost as
+find_so_number round trips.
+
+    python -m benchmarks.barcode_snapshot --products 1000000
+    python -m benchmarks.barcode_snapshot --products 1000000 --save baseline
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def setup_django(workdir):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ['DB_ENGINE'] = 'django.db.backends.sqlite3'
+    # A file, not :memory:, so the snapshot reads through a real cursor
+    os.environ['DB_NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    os.environ['BARCODE_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def raw_size(path):
+    with gzip.open(path, 'rb') as fh:
+        return sum(len(chunk) for chunk in iter(lambda: fh.read(1 << 20), b''))
+
+
+def churn(fraction, seed):
+    """
+    Change `fraction` of the products: half get a new so_number, a quarter are
+    deleted, and as many new barcodes as a quarter are added
+    """
+    import random
+    from product.models import Product
+
+    rng = random.Random(seed)
+    ids = list(Product.objects.values_list('id', flat=True))
+    picked = rng.sample(ids, int(len(ids) * fraction))
+    half, quarter = len(picked) // 2, len(picked) // 4
+    started = time.perf_counter()
+    for i in range(0, half, 5000):
+        Product.objects.filter(id__in=picked[i:min(i + 5000, half)]).update(so_number='SO-CHURN')
+    for i in range(half, half + quarter, 5000):
+        Product.objects.filter(id__in=picked[i:min(i + 5000, half + quarter)]).delete()
+    template = Product.objects.order_by('id').first()
+    new = [
+        Product(barcode=f'NEW{n:09d}', so_number=f'SO-NEW-{n // 10}', date=template.date)
+        for n in range(quarter)
+    ]
+    Product.objects.bulk_create(new, batch_size=5000)
+    Product.objects.filter(barcode__startswith='NEW').update(noted='')  # stamp a change number
+    return {'updated': half, 'deleted': quarter, 'added': quarter, 'seconds': round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--churn', type=float, default=0.01, help='fraction of products changed between builds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/results/barcode-snapshot-NAME.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup_django(workdir)
+        from django.conf import settings
+        from product.barcodes import build_snapshot
+        from product.seeding import seed_inventory
+
+        print(f'Seeding {args.products:,} products...')
+        seeded = seed_inventory(products=args.products, photos_per_product=0, cargos=5, users=1,
+                                seed=args.seed, photo_files=False)
+        print(f"  {seeded['seconds']}s")
+
+        first = build_snapshot(log=print)
+        full = first['snapshots'][-1]
+        full_path = os.path.join(settings.BARCODE_SNAPSHOT_DIR, full['file'])
+        full_raw = raw_size(full_path)
+
+        changed = churn(args.churn, args.seed)
+        print(f"Churn: {changed}")
+        second = build_snapshot(log=print)
+        delta = second['deltas'][str(full['version'])]
+
+    # One find_so_number exchange: JSON body both ways plus typical HTTP headers
+    request_body = len(json.dumps({'action': 'find_so_number', 'barcode': 'BC000000000001'}))
+    response_body = len(json.dumps({'success': True, 'so_number': 'SO-0000000001'}))
+    round_trip = request_body + response_body + 600
+    result = {
+        'products': args.products,
+        'barcodes': full['count'],
+        'build_seconds': full['seconds'],
+        'rebuild_seconds': second['snapshots'][-1]['seconds'],
+        'snapshot_bytes': full['bytes'],
+        'snapshot_raw_bytes': full_raw,
+        'bytes_per_barcode': round(full['bytes'] / max(full['count'], 1), 2),
+        'churn': changed,
+        'delta_changes': delta['changes'],
+        'delta_bytes': delta['bytes'],
+        'round_trip_bytes': round_trip,
+        'scans_per_snapshot': round(full['bytes'] / round_trip),
+        'scans_per_delta': round(delta['bytes'] / round_trip, 1),
+    }
+    print(f"\n{'barcodes':<28}{result['barcodes']:>16,}")
+    print(f"{'full build':<28}{result['build_seconds']:>15}s")
+    print(f"{'snapshot (gzip)':<28}{result['snapshot_bytes']:>16,} B  ({result['bytes_per_barcode']} B/barcode)")
+    print(f"{'snapshot (raw)':<28}{result['snapshot_raw_bytes']:>16,} B")
+    print(f"{'delta':<28}{result['delta_bytes']:>16,} B  ({result['delta_changes']:,} changes)")
+    print(f"{'find_so_number round trip':<28}{round_trip:>16,} B  (snapshot = {result['scans_per_snapshot']:,} scans, "
+          f"delta = {result['scans_per_delta']} scans)")
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f'barcode-snapshot-{args.save}.json'), 'w') as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
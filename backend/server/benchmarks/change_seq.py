@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Throughput of concurrent product writes, which all take a change number
+(product.models.next_change_seq) for delta sync.
+
+Each thread updates its own product in a transaction that stays open for
+--hold-ms after the write, like a request that goes on to save photos or a
+batch that writes more rows. The threads touch different rows, so the only
+thing they can wait on is the change number itself. Runs against the
+configured database; the products it creates are deleted afterwards.
+
+    python -m benchmarks.change_seq --save counter
+    python -m benchmarks.change_seq --compare counter
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    import django
+    django.setup()
+
+
+def writer(product_id, writes, hold, latencies, errors):
+    from django.db import connection, transaction
+    from product.models import Product
+
+    product = Product.objects.get(pk=product_id)
+    try:
+        for _ in range(writes):
+            started = time.perf_counter()
+            with transaction.atomic():
+                product.qty = (product.qty or 0) + 1
+                product.save(update_fields=['qty'])
+                time.sleep(hold)
+            latencies.append(time.perf_counter() - started)
+    except Exception as exc:  # reported, not fatal: the other threads keep going
+        errors.append(repr(exc))
+    finally:
+        connection.close()
+
+
+def run(threads, writes, hold_ms):
+    from django.db import connection
+    from product.models import Product
+
+    products = [
+        Product.objects.create(barcode=f'BENCH-CS-{i}', so_number=f'BENCH-CS-{i}', date=date.today())
+        for i in range(threads)
+    ]
+    latencies, errors = [], []
+    workers = [
+        threading.Thread(target=writer, args=(product.pk, writes, hold_ms / 1000, latencies, errors))
+        for product in products
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+
+    latencies.sort()
+    result = {
+        'vendor': connection.vendor,
+        'threads': threads,
+        'hold_ms': hold_ms,
+        'writes': len(latencies),
+        'errors': len(errors),
+        'writes_per_s': round(len(latencies) / elapsed, 1),
+        'median_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+    print(f"  {threads} thread(s), hold {hold_ms} ms: {result['writes_per_s']} writes/s, "
+          f"median {result['median_ms']} ms, p95 {result['p95_ms']} ms, {len(errors)} error(s)")
+    for error in errors[:3]:
+        print(f'    {error}')
+    return result
+
+
+def compare(baseline, current):
+    print(f"\n{'':<14}{'baseline':>12}{'current':>12}{'change':>10}")
+    for key in ('writes_per_s', 'median_ms', 'p95_ms'):
+        b, c = baseline[key], current[key]
+        print(f"{key:<14}{b:>12}{c:>12}{(c - b) / b * 100:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=50, help='transactions per thread')
+    parser.add_argument('--hold-ms', type=float, default=5.0, help='time each transaction stays open after its write')
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/results/change_seq-NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a saved run')
+    args = parser.parse_args()
+
+    setup_django()
+    result = run(args.threads, args.writes, args.hold_ms)
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f'change_seq-{args.save}.json'), 'w') as fh:
+            json.dump(result, fh, indent=2)
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, f'change_seq-{args.compare}.json')) as fh:
+            compare(json.load(fh), result)
+
+
+if __name__ == '__main__':
+    main()
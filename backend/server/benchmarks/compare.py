@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Compare two benchmarks.load result files (e.g. two commits).
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json
+Negative deltas on latency and positive deltas on throughput are improvements.
+"""
+import argparse
+import json
+
+
+def _delta(old, new):
+    if old in (None, 0) or new is None:
+        return '-'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def _value(value):
+    return '-' if value is None else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args()
+
+    with open(args.baseline) as fh:
+        base = json.load(fh)
+    with open(args.candidate) as fh:
+        cand = json.load(fh)
+
+    print(f"baseline  {base.get('revision')} ({base.get('timestamp')})")
+    print(f"candidate {cand.get('revision')} ({cand.get('timestamp')})")
+    print(f"{'endpoint':<22}{'req/s':>16}{'Δ':>9}{'p50 ms':>16}{'Δ':>9}{'p95 ms':>16}{'Δ':>9}{'p99 ms':>16}{'Δ':>9}")
+    for name in sorted(set(base['endpoints']) | set(cand['endpoints'])):
+        b = base['endpoints'].get(name, {})
+        c = cand['endpoints'].get(name, {})
+        row = f'{name:<22}'
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            pair = f"{_value(b.get(key))} → {_value(c.get(key))}"
+            row += f'{pair:>16}{_delta(b.get(key), c.get(key)):>9}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
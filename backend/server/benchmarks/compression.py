@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Compression levels for server.compression on a real export body.
+
+Renders --products synthetic products the way /product/export/ does (in
+EXPORT_CHUNK_SIZE chunks), then compresses the stream with every installed
+encoding at a range of levels, as CompressionMiddleware would (flushing after
+each chunk). Reports size, CPU time and the time to deliver the body over
+links of --mbps; the level with the lowest CPU + transfer time on the slowest
+link is marked. Runs in-process against an in-memory SQLite database.
+
+    python -m benchmarks.compression --products 20000 --mbps 2 10 100
+    python -m benchmarks.compression --save baseline
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from .micro import RESULTS_DIR, make_products, setup_django
+
+LEVELS = {'gzip': (1, 3, 4, 5, 6, 9), 'br': (1, 3, 4, 5, 6, 9), 'zstd': (1, 3, 6, 9, 12, 19)}
+
+
+def export_chunks(n):
+    from django.conf import settings
+    from product.views import export_chunks
+    from product.models import Product
+    from server.renderers import iter_json_array
+
+    make_products(n, photos=True)
+    return list(iter_json_array(export_chunks([Product.objects.all()], settings.EXPORT_CHUNK_SIZE)))
+
+
+def measure(chunks, encoding, level, rounds):
+    from django.test import override_settings
+    from server.compression import COMPRESSORS, compress_chunks
+
+    setting = COMPRESSORS[encoding][1]
+    timings = []
+    with override_settings(**{setting: level}):
+        for _ in range(rounds):
+            started = time.perf_counter()
+            size = sum(len(out) for out in compress_chunks(chunks, encoding))
+            timings.append(time.perf_counter() - started)
+    return size, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--mbps', type=float, nargs='+', default=[2, 10, 100], help='link speeds in Mbit/s')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/results/compression-NAME.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as media_root:
+        setup_django(media_root)
+        from server.compression import COMPRESSORS
+
+        chunks = export_chunks(args.products)
+        raw = sum(len(chunk) for chunk in chunks)
+        print(f'Export body: {raw:,} bytes in {len(chunks)} chunks ({args.products:,} products)')
+        print(f'Encodings installed: {", ".join(COMPRESSORS)}\n')
+
+        slowest = min(args.mbps)
+        links = ''.join(f'{f"@{m:g}Mbit":>12}' for m in args.mbps)
+        print(f'{"encoding":<10}{"level":>6}{"bytes":>14}{"ratio":>8}{"cpu ms":>10}{"MB/s":>8}{links}')
+        cases = []
+        for encoding in COMPRESSORS:
+            for level in LEVELS[encoding]:
+                size, seconds = measure(chunks, encoding, level, args.rounds)
+                transfer = {m: size * 8 / (m * 1e6) for m in args.mbps}
+                cases.append({
+                    'encoding': encoding, 'level': level, 'bytes': size,
+                    'ratio': round(raw / size, 2), 'cpu_ms': round(seconds * 1000, 1),
+                    'mb_per_s': round(raw / seconds / 1e6, 1),
+                    'total_ms': {str(m): round((seconds + t) * 1000, 1) for m, t in transfer.items()},
+                })
+        best = min(cases, key=lambda c: c['total_ms'][str(slowest)])
+        for case in cases:
+            totals = ''.join(f'{case["total_ms"][str(m)]:>10.0f}ms' for m in args.mbps)
+            mark = '  <- best @%gMbit' % slowest if case is best else ''
+            print(f'{case["encoding"]:<10}{case["level"]:>6}{case["bytes"]:>14,}{case["ratio"]:>8}'
+                  f'{case["cpu_ms"]:>10}{case["mb_per_s"]:>8}{totals}{mark}')
+        identity = ''.join(f'{raw * 8 / (m * 1e6) * 1000:>10.0f}ms' for m in args.mbps)
+        print(f'{"identity":<10}{"":>6}{raw:>14,}{1:>8}{0:>10}{"":>8}{identity}')
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f'compression-{args.save}.json'), 'w') as fh:
+            json.dump({'products': args.products, 'raw_bytes': raw, 'cases': cases}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Reproducible synthetic inventory dataset for benchmarks.
+
+Thin wrapper around `manage.py seed_inventory` (product.seeding) that also
+creates the bench_admin account used by the load driver and writes the
+manifest benchmarks.load reads. The same arguments always give the same data.
+
+    python -m benchmarks.dataset --products 1000000 --photos-per-product 1.5 \\
+        --cargos 20 --users 10 --manifest benchmarks/results/dataset.json
+"""
+import argparse
+import json
+import os
+import sys
+
+BENCH_ADMIN = 'bench_admin'
+BENCH_PASSWORD = 'bench-password'
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    import django
+    django.setup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--photos-per-product', type=float, default=1.0)
+    parser.add_argument('--cargos', type=int, default=10)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--photo-files', action='store_true', help='also write placeholder image files')
+    parser.add_argument('--manifest', default='benchmarks/results/dataset.json')
+    args = parser.parse_args()
+
+    setup_django()
+    from account.models import CustomUser
+    from product.seeding import seed_inventory
+
+    manifest = seed_inventory(
+        products=args.products, photos_per_product=args.photos_per_product, cargos=args.cargos,
+        users=args.users, seed=args.seed, batch_size=args.batch_size, photo_files=args.photo_files,
+        stdout=sys.stdout,
+    )
+    admin, _ = CustomUser.objects.get_or_create(username=BENCH_ADMIN, defaults={'role': 'admin'})
+    admin.set_password(BENCH_PASSWORD)
+    admin.save()
+    manifest.update(admin_username=BENCH_ADMIN, admin_password=BENCH_PASSWORD)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.manifest)), exist_ok=True)
+    with open(args.manifest, 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    print(f"Seeded {manifest['products']:,} products / {manifest['photos']:,} photos in {manifest['seconds']}s "
+          f"-> {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
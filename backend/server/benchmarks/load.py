@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+"""
+Mixed-workload load driver for a locally running server.
+
+Replays a weighted mix of scanner inbound/outbound, find_so_number, list
+paging/search/sort, export and batch status updates against --base-url using
+the dataset described by the manifest from benchmarks.dataset. Reports
+p50/p95/p99 latency and throughput per endpoint and saves them as JSON so two
+commits can be compared with benchmarks.compare.
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --api-key $SCANNER_API_KEY \\
+        --duration 60 --concurrency 16 --output benchmarks/results/$(git rev-parse --short HEAD).json
+Needs only the standard library and Pillow (a server requirement, for the upload photo).
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+from PIL import Image
+
+from product.seeding import barcode_for, so_number_for
+
+# name -> relative weight in the mix
+DEFAULT_MIX = {
+    'scanner_inbound': 10,
+    'scanner_outbound': 5,
+    'find_so_number': 25,
+    'list_page': 25,
+    'list_search': 15,
+    'list_sort': 10,
+    'export': 1,
+    'batch_update_status': 4,
+}
+
+
+def camera_jpeg(size=(2592, 1944), quality=90):
+    """
+    A decodable 5 MP JPEG (~2.4 MB) with sensor-like noise and an EXIF orientation,
+    so inbound uploads exercise photo normalization (server run with PHOTO_NORMALIZE=True)
+    the way a device photo does
+    """
+    gradient = Image.linear_gradient('L').resize(size)
+    mirrored = gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    image = Image.merge('RGB', [gradient, Image.effect_noise(size, 24), mirrored])
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise to display
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+JPEG_BYTES = camera_jpeg()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+class Client:
+    """
+    One keep-alive HTTP connection per worker thread
+    """
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.conn is None:
+                cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self.conn = cls(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def multipart(fields, files=()):
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for name, value in fields.items():
+        chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        chunks.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    chunks.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(chunks), f'multipart/form-data; boundary={boundary}'
+
+
+class Workload:
+    def __init__(self, manifest, api_key, jwt, rng):
+        self.m = manifest
+        self.rng = rng
+        self.key_headers = {'X-API-Key': api_key}
+        self.jwt_headers = {'Authorization': f'Bearer {jwt}'}
+        self.inbound_seq = 0
+
+    def random_index(self):
+        return self.m.get('barcode_offset', 0) + self.rng.randrange(self.m['products'])
+
+    def scanner_inbound(self):
+        self.inbound_seq += 1
+        body, ctype = multipart({
+            'action': 'inbound', 'date': time.strftime('%Y-%m-%d'),
+            'barcode': f'LOAD{uuid.uuid4().hex[:12]}', 'so_number': f'LOAD{self.inbound_seq:08d}',
+            'qty': 1, 'weight': 10, 'vender': 'TGT',
+            'created_by_username': self.rng.choice(self.m['users'] or ['']),
+        }, [('photos', 'load.jpg', JPEG_BYTES)])
+        return 'POST', '/product/scanner/', body, dict(self.key_headers, **{'Content-Type': ctype})
+
+    def scanner_outbound(self):
+        so = so_number_for(self.random_index(), self.m.get('items_per_so', 3))
+        body, ctype = multipart({'action': 'outbound', 'so_number': so})
+        return 'POST', '/product/scanner/', body, dict(self.key_headers, **{'Content-Type': ctype})
+
+    def find_so_number(self):
+        body = json.dumps({'action': 'find_so_number', 'barcode': barcode_for(self.random_index())})
+        return 'POST', '/product/find_so_number/', body, dict(self.key_headers, **{'Content-Type': 'application/json'})
+
+    def list_page(self):
+        pages = max(1, self.m['products'] // 100)
+        # Dashboards mostly look at the first pages
+        page = min(pages, int(self.rng.paretovariate(1.2)))
+        return 'GET', '/product/products/?' + urlencode({'page': page}), None, self.jwt_headers
+
+    def list_search(self):
+        term = barcode_for(self.random_index())[:-3]
+        return 'GET', '/product/products/?' + urlencode({'search': term}), None, self.jwt_headers
+
+    def list_sort(self):
+        field = self.rng.choice(['date', 'barcode', 'so_number', 'id'])
+        order = self.rng.choice(['asc', 'desc'])
+        return 'GET', '/product/products/?' + urlencode({'sortField': field, 'sortOrder': order}), None, self.jwt_headers
+
+    def export(self):
+        term = barcode_for(self.random_index())[:-4]
+        params = {'search': term, 'category': self.rng.choice(self.m['categories'])}
+        return 'GET', '/product/export/?' + urlencode(params), None, self.jwt_headers
+
+    def batch_update_status(self):
+        start = self.rng.randrange(self.m['first_id'], max(self.m['first_id'] + 1, self.m['last_id'] - 50))
+        ids = list(range(start, start + self.rng.randrange(1, 50)))
+        body = json.dumps({'ids': ids, 'current_status': self.rng.choice(['0', '1'])})
+        return 'POST', '/product/batch_update_status/', body, dict(self.jwt_headers, **{'Content-Type': 'application/json'})
+
+
+def get_jwt(base_url, username, password, timeout):
+    client = Client(base_url, timeout)
+    status, data = client.request('POST', '/api/token/', json.dumps({'username': username, 'password': password}),
+                                  {'Content-Type': 'application/json'})
+    if status != 200:
+        raise SystemExit(f'Could not obtain JWT for {username}: HTTP {status} {data[:200]!r}')
+    return json.loads(data)['access']
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with open(args.manifest) as fh:
+        manifest = json.load(fh)
+    jwt = get_jwt(args.base_url, manifest['admin_username'], manifest['admin_password'], args.timeout)
+    mix = dict(DEFAULT_MIX)
+    for override in args.mix or []:
+        name, _, weight = override.partition('=')
+        mix[name] = float(weight)
+    names = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in names]
+
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    warmup_until = time.perf_counter() + args.warmup
+    deadline = warmup_until + args.duration
+
+    def worker(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        workload = Workload(manifest, args.api_key, jwt, rng)
+        client = Client(args.base_url, args.timeout)
+        local_samples = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            name = rng.choices(names, weights)[0]
+            method, path, body, headers = getattr(workload, name)()
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+                ok = status < 500 and status not in (401, 403)
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if start >= warmup_until:
+                local_samples[name].append(elapsed)
+                if not ok:
+                    local_errors[name] += 1
+        with lock:
+            for name in names:
+                samples[name].extend(local_samples[name])
+                errors[name] += local_errors[name]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    endpoints = {}
+    for name in names:
+        values = samples[name]
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'throughput_rps': round(len(values) / args.duration, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+            'p95_ms': round(percentile(values, 95) * 1000, 2) if values else None,
+            'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+            'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else None,
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'base_url': args.base_url,
+        'duration': args.duration,
+        'concurrency': args.concurrency,
+        'seed': args.seed,
+        'mix': mix,
+        'dataset': {k: manifest[k] for k in ('products', 'photos', 'seed')},
+        'total_requests': total,
+        'total_throughput_rps': round(total / args.duration, 2),
+        'endpoints': endpoints,
+    }
+
+
+def print_report(result):
+    print(f"rev={result['revision']} duration={result['duration']}s concurrency={result['concurrency']} "
+          f"total={result['total_requests']} ({result['total_throughput_rps']} req/s)")
+    print(f"{'endpoint':<22}{'reqs':>8}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, e in result['endpoints'].items():
+        print(f"{name:<22}{e['requests']:>8}{e['errors']:>6}{e['throughput_rps']:>9}"
+              f"{e['p50_ms'] or '-':>10}{e['p95_ms'] or '-':>10}{e['p99_ms'] or '-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--api-key', default=os.getenv('SCANNER_API_KEY', ''))
+    parser.add_argument('--manifest', default='benchmarks/results/dataset.json')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mix', action='append', help='override a weight, e.g. export=0 (repeatable)')
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for serializers, sparse fieldsets, JSON rendering/parsing,
+columnar exports, payload coercion, upload helpers and JWT auth.
+
+Runs in-process against an in-memory SQLite database (no server needed), in
+the spirit of pytest-benchmark: each case is timed for several rounds and
+min/median/mean/stddev are reported. Results can be saved as a named baseline
+and later runs compared against it.
+
+    python -m benchmarks.micro --save before          # record a baseline
+    python -m benchmarks.micro --compare before       # table vs. the baseline
+    python -m benchmarks.micro --filter serialize --large   # include 100,000-row cases
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def setup_django(media_root):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ['DB_ENGINE'] = 'django.db.backends.sqlite3'
+    os.environ['DB_NAME'] = ':memory:'
+    os.environ['MEDIA_ROOT'] = media_root
+    os.environ['ALLOWED_HOSTS'] = 'testserver'  # RequestFactory host
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+class Bench:
+    def __init__(self, pattern=None, min_rounds=5, min_time=1.0):
+        self.pattern = pattern
+        self.min_rounds = min_rounds
+        self.min_time = min_time
+        self.results = {}
+
+    def __call__(self, name, fn, setup=None, ops=1):
+        """
+        Time fn() (after an untimed setup() per round); `ops` items are processed per call
+        """
+        if self.pattern and self.pattern not in name:
+            return
+        fn() if setup is None else fn(setup())  # warm-up
+        timings = []
+        started = time.perf_counter()
+        while len(timings) < self.min_rounds or time.perf_counter() - started < self.min_time:
+            arg = setup() if setup is not None else None
+            t0 = time.perf_counter()
+            fn() if setup is None else fn(arg)
+            timings.append(time.perf_counter() - t0)
+            if len(timings) >= 1000:
+                break
+        median = statistics.median(timings)
+        self.results[name] = {
+            'rounds': len(timings),
+            'min_ms': round(min(timings) * 1000, 4),
+            'median_ms': round(median * 1000, 4),
+            'mean_ms': round(statistics.mean(timings) * 1000, 4),
+            'stddev_ms': round(statistics.pstdev(timings) * 1000, 4),
+            'ops_per_sec': round(ops / median, 1) if median else None,
+        }
+        r = self.results[name]
+        print(f"  {name:<46}{r['median_ms']:>12.3f} ms{r['ops_per_sec'] or 0:>14,.0f} ops/s  ({r['rounds']} rounds)")
+
+
+def make_products(n, photos):
+    from product.models import Photo, Product
+    from product.seeding import product_rows, seed_cargos, seed_lookups, seed_users, with_lookup_ids
+    cargo_ids = seed_cargos(3)
+    user_ids = seed_users(3)
+    lookup_ids = seed_lookups()
+    Product.objects.all().delete()
+    batch = []
+    for fields, user_index, cargo_index, _ in product_rows(n, seed=7):
+        batch.append(Product(created_by_id=user_ids[user_index % 3], cargo_id=cargo_ids[cargo_index % 3],
+                             **with_lookup_ids(fields, lookup_ids)))
+    created = Product.objects.bulk_create(batch, batch_size=5000)
+    if photos:
+        Photo.objects.bulk_create(
+            [Photo(product_id=p.id, product_date=p.date, path=f'{p.so_number}_{k}.jpg') for p in created for k in (1, 2)],
+            batch_size=5000,
+        )
+    return list(Product.objects.select_related('created_by', 'cargo').prefetch_related('photos').order_by('id'))
+
+
+def bench_serialization(bench, sizes):
+    from django.test import RequestFactory
+    from product.serializer import ProductSerializer
+    request = RequestFactory().get('/product/products/')
+    for n in sizes:
+        for photos in (False, True):
+            products = make_products(n, photos)
+            label = 'photos' if photos else 'no_photos'
+            bench(f'serialize[{n}-{label}]',
+                  lambda: ProductSerializer(products, many=True, context={'request': request}).data, ops=n)
+
+
+def bench_json(bench, sizes):
+    """
+    DRF's stdlib JSONRenderer/JSONParser vs server.renderers (orjson), on serialized products
+    """
+    from django.test import RequestFactory
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from product.serializer import ProductSerializer
+    from product.views import export_chunks
+    from product.models import Product
+    from server.renderers import FastJSONParser, FastJSONRenderer, iter_json_array
+    request = RequestFactory().get('/product/export/')
+    for n in sizes:
+        products = make_products(n, photos=True)
+        data = ProductSerializer(products, many=True, context={'request': request}).data
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        assert stdlib.render(data) == fast.render(data), 'renderers disagree'
+        body = stdlib.render(data)
+        bench(f'render[{n}-stdlib]', lambda: stdlib.render(data), ops=n)
+        bench(f'render[{n}-orjson]', lambda: fast.render(data), ops=n)
+        bench(f'parse[{n}-stdlib]', lambda: JSONParser().parse(io.BytesIO(body)), ops=n)
+        bench(f'parse[{n}-orjson]', lambda: FastJSONParser().parse(io.BytesIO(body)), ops=n)
+        # Whole export: query + serialize + render, buffered (as before) vs streamed in chunks
+        bench(f'export[{n}-buffered-stdlib]',
+              lambda: stdlib.render(ProductSerializer(Product.objects.all(), many=True).data), ops=n)
+        bench(f'export[{n}-streamed-orjson]',
+              lambda: b''.join(iter_json_array(export_chunks([Product.objects.all()]), fast)), ops=n)
+
+
+def bench_fieldsets(bench, sizes):
+    """
+    Load + serialize a product page in full vs a six-column ?fields= selection (views.sparse_queryset)
+    """
+    from django.http import QueryDict
+    from product.models import Product
+    from product.serializer import ProductSerializer
+    from product.views import requested_fields, sparse_queryset
+    for n in sizes:
+        make_products(n, photos=True)
+        for label, query in (('full', ''), ('six-columns', 'fields=so_number,barcode,date,qty,current_status,client')):
+            fields = requested_fields(QueryDict(query))
+            bench(f'fieldsets[{n}-{label}]',
+                  lambda: ProductSerializer(sparse_queryset(Product.objects.order_by('id'), fields), many=True,
+                                            fields=fields).data, ops=n)
+
+
+def bench_columnar(bench, sizes):
+    """
+    Produce and load a full export: streamed JSON vs the columnar formats (product/columnar.py)
+    """
+    from product import columnar
+    from product.models import Product
+    from product.views import export_chunks
+    from server.renderers import FastJSONRenderer, iter_json_array
+    for n in sizes:
+        make_products(n, photos=False)
+        bodies = {'json': lambda: b''.join(iter_json_array(export_chunks([Product.objects.all()]), FastJSONRenderer()))}
+        for kind in columnar.available_formats():
+            bodies[kind] = lambda kind=kind: b''.join(columnar.export_stream([Product.objects.all()], kind))
+        loaders = {'json': json.loads}
+        if columnar.pyarrow is not None:
+            loaders['arrow'] = lambda body: columnar.pyarrow.ipc.open_stream(body).read_all()
+            loaders['parquet'] = lambda body: columnar.pyarrow.parquet.read_table(columnar.pyarrow.BufferReader(body))
+        if columnar.msgpack is not None:
+            loaders['msgpack'] = lambda body: list(columnar.msgpack.Unpacker(io.BytesIO(body)))
+        for kind, produce in bodies.items():
+            body = produce()
+            bench(f'columnar[{n}-{kind}-export]', produce, ops=n)
+            bench(f'columnar[{n}-{kind}-load]', lambda: loaders[kind](body), ops=n)
+            if f'columnar[{n}-{kind}-export]' in bench.results:
+                print(f'    {kind} body: {len(body):,} bytes')
+
+
+def bulk_payload(n):
+    return [{
+        'so_number': f' SO{i:06d} ', 'barcode': f'BC{i:08d}', 'number': i, 'qty': str(i % 7),
+        'weight': '' if i % 5 == 0 else str(i), 'date': '2024-05-01', 'vender': 'TGT',
+        'client': 'VZ', 'category': 'RAM', 'status': '0', 'note': 'bench',
+    } for i in range(n)]
+
+
+def bench_bulk_validation(bench, n=100):
+    from product.serializer import ProductSerializer
+    from product.views import normalize_product_payload
+    payload = bulk_payload(n)
+
+    def coerce():
+        return [normalize_product_payload(row) for row in payload]
+
+    def coerce_and_validate():
+        for row in payload:
+            serializer = ProductSerializer(data=normalize_product_payload(row))
+            serializer.is_valid()
+
+    bench(f'bulk_payload_coercion[{n}]', coerce, ops=n)
+    bench(f'bulk_payload_validate[{n}]', coerce_and_validate, ops=n)
+
+
+def camera_jpeg(width=4000, height=3000):
+    """
+    A 12 MP JPEG at camera quality: a gradient with sensor-like noise
+    """
+    from PIL import Image
+    noise = Image.effect_noise((width, height), 24)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def bench_uploads(bench, size=1024 * 1024):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import override_settings
+    from product.images import normalize_photo
+    from product.views import save_file_safely, validate_file_upload
+    content = b'\xff\xd8\xff\xe0' + os.urandom(size - 4)
+
+    def new_file():
+        return SimpleUploadedFile('bench.jpg', content, content_type='image/jpeg')
+
+    bench('validate_file_upload[1MB]', lambda f: validate_file_upload(f), setup=new_file)
+    counter = iter(range(10 ** 9))
+    media_root = os.environ['MEDIA_ROOT']
+
+    def save(f):
+        ok, name = save_file_safely(f, 'BENCH', next(counter))
+        if ok:
+            os.remove(os.path.join(media_root, name))
+
+    # Raw write path (random bytes are not a decodable image)
+    with override_settings(PHOTO_NORMALIZE=False):
+        bench('save_file_safely[1MB]', save, setup=new_file)
+
+    if bench.pattern is None or bench.pattern in 'photo_normalize[12MP]':
+        photo = camera_jpeg()
+        with override_settings(PHOTO_NORMALIZE=True, PHOTO_WORKERS=0):
+            stored, _ = normalize_photo(photo)
+            bench('photo_normalize[12MP]', lambda: normalize_photo(photo))
+        print(f'    12 MP upload {len(photo):,} bytes -> stored {len(stored):,} bytes')
+
+    if bench.pattern is None or bench.pattern in 'photo_request[12MP-inline/queued]':
+        # Time the upload request spends on one photo: normalized inline, or stored and queued (JOBS_ENABLED)
+        from jobs.models import Job
+        from jobs.queue import enqueue
+        photo = camera_jpeg()
+
+        def camera_file():
+            return SimpleUploadedFile('IMG_0001.JPG', photo, content_type='image/jpeg')
+
+        def save_and_enqueue(f):
+            save(f)
+            enqueue('product.normalize_photo', {'photo_id': 0})
+
+        with override_settings(PHOTO_NORMALIZE=True, PHOTO_WORKERS=0):
+            bench('photo_request[12MP-inline]', save, setup=camera_file)
+        with override_settings(PHOTO_NORMALIZE=True, JOBS_ENABLED=True):
+            bench('photo_request[12MP-queued]', save_and_enqueue, setup=camera_file)
+        Job.objects.all().delete()
+
+
+def bench_jwt(bench):
+    from django.test import RequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+    from account.authentication import CachedJWTAuthentication
+    from account.cache import user_cache
+    from account.models import CustomUser
+    user, _ = CustomUser.objects.get_or_create(username='bench_jwt', defaults={'role': 'admin'})
+    request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    plain = JWTAuthentication()
+    cached = CachedJWTAuthentication()
+
+    bench('jwt_auth[simplejwt]', lambda: plain.authenticate(request))
+    bench('jwt_auth[cached-cold]', lambda _: cached.authenticate(request), setup=user_cache.clear)
+    bench('jwt_auth[cached-warm]', lambda: cached.authenticate(request))
+
+
+def compare(baseline, current):
+    print(f"\n{'benchmark':<46}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name in sorted(set(baseline) | set(current)):
+        b = baseline.get(name, {}).get('median_ms')
+        c = current.get(name, {}).get('median_ms')
+        change = f'{(c - b) / b * 100:+.1f}%' if b and c is not None else '-'
+        print(f"{name:<46}{b if b is not None else '-':>14}{c if c is not None else '-':>14}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--large', action='store_true', help='include the 100,000-product serialization cases')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds to spend per benchmark')
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/results/micro-NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a saved baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as media_root:
+        setup_django(media_root)
+        bench = Bench(args.filter, min_time=args.min_time)
+        sizes = [100, 1000] + ([100000] if args.large else [])
+        bench_serialization(bench, sizes)
+        bench_json(bench, sizes)
+        bench_fieldsets(bench, sizes)
+        bench_columnar(bench, sizes)
+        bench_bulk_validation(bench)
+        bench_uploads(bench)
+        bench_jwt(bench)
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f'micro-{args.save}.json'), 'w') as fh:
+            json.dump(bench.results, fh, indent=2)
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, f'micro-{args.compare}.json')) as fh:
+            compare(json.load(fh), bench.results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Query timings for the date-bounded access paths, before/after partitioning.
+
+Runs the list, search, export and scanner queries the API issues (built with
+the same helpers as product.views) against the configured database holding a
+benchmarks.dataset / seed_inventory dataset. On Postgres it also reports how
+many relations each plan touches, which shows partition pruning.
+
+    python -m benchmarks.partitions --save plain          # unpartitioned table
+    python manage.py partition_products
+    python -m benchmarks.partitions --compare plain       # same queries, partitioned
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+    import django
+    django.setup()
+
+
+def scanned_relations(connection, queryset):
+    """
+    Names of the tables/partitions a Postgres plan reads (None elsewhere)
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    relations = set()
+
+    def walk(node):
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return sorted(relations)
+
+
+def cases(recent_month):
+    """
+    name -> queryset; recent_month is (first, last) day of the newest month in the data.
+    The *_window cases are what the API reads first with PRODUCT_RECENT_DAYS set
+    (ProductQuerySet.date_window / recent_first), taking the newest date in the data as today.
+    """
+    from django.conf import settings
+    from django.http import QueryDict
+    from product.models import Product
+    from product.views import export_queryset, product_list_queryset
+
+    first, last = recent_month
+    newest = Product.objects.order_by('-date', '-id').values('barcode', 'so_number', 'date').first()
+    month = f'date_from={first}&date_to={last}'
+    recent = newest['date'] - timedelta(days=max(settings.PRODUCT_RECENT_DAYS, 1))
+    default_list = product_list_queryset(QueryDict())
+    default_window = default_list.date_window()
+    return {
+        'list_first_page': product_list_queryset(QueryDict('sortField=date&sortOrder=desc'))[:100],
+        'list_first_page_window': product_list_queryset(QueryDict('sortField=date&sortOrder=desc')).filter(date__gte=recent)[:100],
+        'list_default_page': default_list[:100],
+        'list_default_page_window': (default_list if default_window is None else default_window)[:100],
+        'list_month_page': product_list_queryset(QueryDict(month + '&sortField=date&sortOrder=desc'))[:100],
+        'list_month_count': product_list_queryset(QueryDict(month)).order_by(),
+        'search_month': product_list_queryset(QueryDict(f'search={first:%Y-%m}'))[:100],
+        'export_month': export_queryset(QueryDict(month)),
+        'scanner_barcode_all': Product.objects.filter(barcode=newest['barcode'])[:1],
+        'scanner_barcode_recent': Product.objects.filter(barcode=newest['barcode'], date__gte=first)[:1],
+        'scanner_barcode_window': Product.objects.filter(barcode=newest['barcode'], date__gte=recent)[:1],
+        'outbound_target': Product.objects.filter(so_number=newest['so_number'], date=newest['date'])[:1],
+        'outbound_latest_window': Product.objects.filter(so_number=newest['so_number'], date__gte=recent).order_by('-date')[:1],
+    }
+
+
+def run(repeat):
+    from django.db import connection
+    from django.db.models import Max
+    from product.models import Product
+    from product.partitioning import add_months, is_partitioned
+
+    latest = Product.objects.aggregate(latest=Max('date'))['latest']
+    if latest is None:
+        raise SystemExit('No products; seed a dataset first (python -m benchmarks.dataset)')
+    recent_month = (latest.replace(day=1), add_months(latest, 1) - timedelta(days=1))
+
+    results = {}
+    for name, queryset in cases(recent_month).items():
+        count_only = name.endswith('_count')
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset.count() if count_only else list(queryset._chain())
+            timings.append(time.perf_counter() - started)
+        relations = scanned_relations(connection, queryset)
+        results[name] = {
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'min_ms': round(min(timings) * 1000, 3),
+            'relations': len(relations) if relations is not None else None,
+        }
+        r = results[name]
+        print(f"  {name:<26}{r['median_ms']:>12.3f} ms{r['relations'] if r['relations'] is not None else '-':>8} rel")
+    return {'partitioned': is_partitioned(connection, 'product'), 'cases': results}
+
+
+def compare(baseline, current):
+    print(f"\n{'query':<26}{'baseline ms':>14}{'current ms':>14}{'change':>10}{'relations':>12}")
+    for name in sorted(set(baseline['cases']) | set(current['cases'])):
+        b = baseline['cases'].get(name, {})
+        c = current['cases'].get(name, {})
+        change = f"{(c['median_ms'] - b['median_ms']) / b['median_ms'] * 100:+.1f}%" if b.get('median_ms') and c else '-'
+        relations = f"{b.get('relations', '-')} → {c.get('relations', '-')}"
+        print(f"{name:<26}{b.get('median_ms', '-'):>14}{c.get('median_ms', '-'):>14}{change:>10}{relations:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', metavar='NAME', help='save results as benchmarks/results/partitions-NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a saved run')
+    args = parser.parse_args()
+
+    setup_django()
+    result = run(args.repeat)
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(os.path.join(RESULTS_DIR, f'partitions-{args.save}.json'), 'w') as fh:
+            json.dump(result, fh, indent=2)
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, f'partitions-{args.compare}.json')) as fh:
+            compare(json.load(fh), result)
+
+
+if __name__ == '__main__':
+    main()
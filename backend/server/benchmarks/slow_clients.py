@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Slow-client concurrency benchmark: sync (WSGI) vs async (ASGI) stack.
+
+Opens N scanner uploads that trickle their multipart body over several
+seconds (like a Zebra device on weak Wi-Fi) and, while they are in flight,
+measures how quickly a fast probe request (product list) is answered.
+With sync workers each trickling upload pins a worker, so probes queue up;
+under ASGI the body is received by the event loop and probes stay fast.
+
+Start the two stacks, e.g.
+    gunicorn server.wsgi:application -w 4 -b 127.0.0.1:8001
+    gunicorn server.asgi:application -w 4 -k uvicorn.workers.UvicornWorker -b 127.0.0.1:8002
+then run
+    python -m benchmarks.slow_clients --api-key $SCANNER_API_KEY \\
+        --target sync=http://127.0.0.1:8001/product/scanner/ \\
+        --target async=http://127.0.0.1:8002/product/async/scanner/ \\
+        --probe-path /product/products/?page_size=1
+Only the standard library is used.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def _multipart_body(fields, photo_size):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="photos"; filename="bench.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'.encode()
+        + JPEG_HEADER + b'\0' * max(0, photo_size - len(JPEG_HEADER)) + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return boundary, b''.join(parts)
+
+
+async def _request(url, method='GET', headers=None, body=b'', trickle_seconds=0.0, chunks=20):
+    """
+    Minimal HTTP/1.1 client; when trickle_seconds > 0 the body is sent in
+    `chunks` pieces spread over that many seconds. Returns (status, elapsed).
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    head = [f'{method} {path} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: close',
+            f'Content-Length: {len(body)}']
+    head += [f'{k}: {v}' for k, v in (headers or {}).items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode())
+    if body and trickle_seconds > 0:
+        step = max(1, len(body) // chunks)
+        for i in range(0, len(body), step):
+            writer.write(body[i:i + step])
+            await writer.drain()
+            await asyncio.sleep(trickle_seconds / chunks)
+    elif body:
+        writer.write(body)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    elapsed = time.perf_counter() - start
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        status = 0
+    return status, elapsed
+
+
+async def run_target(name, url, args):
+    base = urlsplit(url)
+    probe_url = f'{base.scheme}://{base.netloc}{args.probe_path}'
+    auth = {'X-API-Key': args.api_key}
+
+    async def slow_upload(i):
+        boundary, body = _multipart_body({
+            'action': 'inbound', 'date': '2024-01-01', 'barcode': f'BENCH-{name}-{i}',
+            'so_number': f'BENCH-{i}', 'qty': 1, 'weight': 1,
+        }, args.photo_size)
+        headers = dict(auth, **{'Content-Type': f'multipart/form-data; boundary={boundary}'})
+        return await _request(url, 'POST', headers, body, trickle_seconds=args.trickle_seconds)
+
+    async def probes():
+        latencies = []
+        await asyncio.sleep(args.trickle_seconds / 4)  # let the slow uploads occupy the server first
+        deadline = time.perf_counter() + args.trickle_seconds / 2
+        while time.perf_counter() < deadline:
+            status, elapsed = await _request(probe_url, headers=auth)
+            latencies.append(elapsed)
+        return latencies
+
+    start = time.perf_counter()
+    uploads = asyncio.gather(*(slow_upload(i) for i in range(args.slow_clients)))
+    probe_latencies, upload_results = await asyncio.gather(probes(), uploads)
+    wall = time.perf_counter() - start
+    ok = sum(1 for status, _ in upload_results if 200 <= status < 300)
+    return {
+        'target': name,
+        'url': url,
+        'slow_clients': args.slow_clients,
+        'uploads_ok': ok,
+        'wall_seconds': round(wall, 3),
+        'upload_p50': round(statistics.median(e for _, e in upload_results), 3),
+        'probe_count': len(probe_latencies),
+        'probe_p50': round(_percentile(probe_latencies, 50) or 0, 4),
+        'probe_p95': round(_percentile(probe_latencies, 95) or 0, 4),
+        'probe_max': round(max(probe_latencies, default=0), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, help='name=scanner URL (repeatable)')
+    parser.add_argument('--api-key', required=True)
+    parser.add_argument('--probe-path', default='/product/products/?page_size=1')
+    parser.add_argument('--slow-clients', type=int, default=32)
+    parser.add_argument('--trickle-seconds', type=float, default=8.0)
+    parser.add_argument('--photo-size', type=int, default=512 * 1024)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for target in args.target:
+        name, _, url = target.partition('=')
+        results.append(asyncio.run(run_target(name, url, args)))
+
+    print(f"{'target':<10}{'uploads':>10}{'wall s':>10}{'probe n':>10}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for r in results:
+        print(f"{r['target']:<10}{r['uploads_ok']:>5}/{r['slow_clients']:<4}{r['wall_seconds']:>10}"
+              f"{r['probe_count']:>10}{r['probe_p50']:>10}{r['probe_p95']:>10}{r['probe_max']:>10}")
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
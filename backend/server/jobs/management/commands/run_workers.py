@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import TASKS
+from jobs.worker import run_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queue (jobs/queue.py) with a pool "
+        "of worker processes and threads, until stopped with SIGTERM/Ctrl-C. "
+        "Requires JOBS_ENABLED=True on the web servers, otherwise jobs run inline "
+        "and nothing is queued."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOBS_WORKER_PROCESSES,
+                            help='worker processes; 1 runs the threads in this process')
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKER_THREADS,
+                            help='threads per process, each running one job at a time')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='seconds to sleep when no job is due')
+        parser.add_argument('--burst', action='store_true', help='exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Job workers: {options['processes']} process(es) x {options['threads']} thread(s); "
+            f"tasks: {', '.join(sorted(TASKS)) or 'none registered'}"
+        )
+        worker = run_pool(
+            options['processes'], options['threads'], options['poll_interval'], burst=options['burst'],
+        )
+        if worker is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f"Stopped: {worker.succeeded:,} job(s) done, {worker.failed:,} failed attempt(s)"
+            ))
@@ -0,0 +1,242 @@
+"""
+Background jobs stored in the application database; no broker to run.
+
+Apps register functions with @task('app.name') in their tasks.py (found at
+startup by JobsConfig). Request handlers call enqueue('app.name', {...}),
+which inserts a Job row (in the caller's transaction, if any) and returns at
+once; `manage.py run_workers` claims due jobs in priority order and calls the
+function with the payload as keyword arguments. The return value (JSON) is
+stored as the job's result.
+
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database has it
+(PostgreSQL), so any number of worker threads and processes can poll the
+table without waiting on each other or taking the same job. On SQLite a
+conditional UPDATE on the status decides which worker gets a job.
+
+A task that raises is retried after JOBS_RETRY_BACKOFF * 2^(attempt-1)
+seconds (with jitter, at most JOBS_RETRY_MAX_DELAY) until max_attempts, then
+marked failed with the traceback. Raise Retry to ask for another attempt after
+a specific delay. While a job runs, a heartbeat thread refreshes its
+started_at every JOBS_HEARTBEAT_INTERVAL seconds; a job whose heartbeat stopped
+for JOBS_TIMEOUT (its worker was killed) is put back in the queue. A worker
+records the outcome only while the job is still locked by it, so a job that
+was requeued and claimed elsewhere is never overwritten. Finished jobs and
+their output files are deleted after JOBS_RETENTION_DAYS.
+
+With JOBS_ENABLED=False (no worker deployed) enqueue() runs the task inline.
+"""
+import logging
+import os
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Priorities: higher runs first
+HIGH = 10
+NORMAL = 0
+LOW = -10
+
+# name -> (function, default priority, default max attempts or None for JOBS_MAX_ATTEMPTS)
+TASKS = {}
+
+
+class Retry(Exception):
+    """
+    Raised by a task to be run again after `delay` seconds (default: the usual backoff)
+    """
+
+    def __init__(self, message='', delay=None):
+        super().__init__(message)
+        self.delay = delay
+
+
+def task(name, priority=NORMAL, max_attempts=None):
+    """
+    Register a function as the task `name`
+    """
+    def register(func):
+        TASKS[name] = (func, priority, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, payload=None, priority=None, delay=0, max_attempts=None, created_by=None):
+    """
+    Queue task `name` with keyword arguments `payload` (JSON-serializable) and return the Job.
+    With JOBS_ENABLED=False the task runs immediately instead and None is returned.
+    """
+    func, default_priority, default_attempts = TASKS[name]
+    payload = payload or {}
+    if not settings.JOBS_ENABLED:
+        func(**payload)
+        return None
+    return Job.objects.create(
+        kind=name,
+        payload=payload,
+        priority=default_priority if priority is None else priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or default_attempts or settings.JOBS_MAX_ATTEMPTS,
+        created_by=created_by if created_by is not None and created_by.is_authenticated else None,
+    )
+
+
+def claim(worker_id):
+    """
+    Mark the next due job as running for `worker_id` and return it, or None when there is none
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'id')
+    running = {'status': Job.RUNNING, 'attempts': F('attempts') + 1, 'started_at': now, 'locked_by': worker_id}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(**running)
+    else:
+        # No row locks (SQLite): whoever flips the status first owns the job
+        for job in due[:10]:
+            if Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(**running):
+                break
+        else:
+            return None
+    job.status, job.attempts, job.started_at, job.locked_by = Job.RUNNING, job.attempts + 1, now, worker_id
+    return job
+
+
+def backoff(attempt):
+    """
+    Seconds to wait before retrying after failed attempt number `attempt` (1-based)
+    """
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempt - 1), settings.JOBS_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def owned(job):
+    """
+    The job's row while it is still running under the worker that claimed it
+    """
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+
+
+class Heartbeat:
+    """
+    Refresh a running job's started_at every JOBS_HEARTBEAT_INTERVAL seconds from a
+    thread (and database connection) of its own, so recover_stale() leaves it alone
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = settings.JOBS_HEARTBEAT_INTERVAL if interval is None else interval
+        self.beats = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f'job-heartbeat-{self.job.pk}', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._stopping.wait(self.interval):
+                try:
+                    if not owned(self.job).update(started_at=timezone.now()):
+                        logger.warning('Job %s is no longer locked by %s', self.job, self.job.locked_by)
+                        return
+                    self.beats += 1
+                except DatabaseError as e:
+                    # Missed beats only matter after JOBS_TIMEOUT; keep trying
+                    logger.warning('Heartbeat of job %s failed: %s', self.job, e)
+        finally:
+            connection.close()
+
+
+def execute(job):
+    """
+    Run a claimed job and record the outcome; True when it succeeded. Nothing
+    is recorded if the job was meanwhile requeued (recover_stale) or taken by
+    another worker.
+    """
+    entry = TASKS.get(job.kind)
+    try:
+        if entry is None:
+            raise LookupError(f'Unknown task {job.kind!r}')
+        with Heartbeat(job):
+            result = entry[0](**job.payload)
+    except Exception as e:
+        now = timezone.now()
+        error = traceback.format_exc()[-settings.JOBS_ERROR_MAX_LENGTH:]
+        if job.attempts < job.max_attempts and not isinstance(e, LookupError):
+            delay = e.delay if isinstance(e, Retry) and e.delay is not None else backoff(job.attempts)
+            recorded = owned(job).update(
+                status=Job.QUEUED, run_at=now + timedelta(seconds=delay), error=error, locked_by='',
+            )
+            if recorded:
+                logger.warning('Job %s attempt %d/%d failed, retrying in %.0fs: %s',
+                               job, job.attempts, job.max_attempts, delay, e)
+        else:
+            recorded = owned(job).update(status=Job.FAILED, finished_at=now, error=error, locked_by='')
+            if recorded:
+                logger.error('Job %s failed after %d attempt(s): %s', job, job.attempts, e)
+        if not recorded:
+            logger.warning('Job %s failed but is no longer locked by %s; outcome discarded: %s',
+                           job, job.locked_by, e)
+        return False
+    if not owned(job).update(status=Job.DONE, result=result, finished_at=timezone.now(), error='', locked_by=''):
+        logger.warning('Job %s finished but is no longer locked by %s; result discarded', job, job.locked_by)
+        return False
+    return True
+
+
+def output_path(name):
+    """
+    Absolute path of a job output file (e.g. an export) in JOBS_OUTPUT_DIR
+    """
+    return os.path.join(settings.JOBS_OUTPUT_DIR, os.path.basename(name))
+
+
+def recover_stale():
+    """
+    Requeue (or fail, when out of attempts) jobs whose worker died mid-run: their
+    heartbeat stopped more than JOBS_TIMEOUT ago. Returns the count.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_TIMEOUT)
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=cutoff)
+    lost = 'Worker stopped before the job finished (JOBS_TIMEOUT)'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), error=lost, locked_by='',
+    )
+    requeued = stale.update(status=Job.QUEUED, run_at=timezone.now(), error=lost, locked_by='')
+    return failed + requeued
+
+
+def prune(days=None):
+    """
+    Delete finished jobs older than `days` (default JOBS_RETENTION_DAYS) and their output files
+    """
+    days = settings.JOBS_RETENTION_DAYS if days is None else days
+    old = Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=timezone.now() - timedelta(days=days))
+    for result in old.exclude(result=None).values_list('result', flat=True).iterator():
+        if isinstance(result, dict) and result.get('file'):
+            try:
+                os.remove(output_path(result['file']))
+            except FileNotFoundError:
+                pass
+    return old.delete()[0]
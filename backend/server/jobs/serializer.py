@@ -0,0 +1,36 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    error = serializers.SerializerMethodField()
+    url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'priority', 'attempts', 'max_attempts', 'run_at',
+            'created_at', 'started_at', 'finished_at', 'result', 'error', 'url', 'download_url',
+        ]
+
+    def _absolute(self, path):
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
+
+    def get_error(self, obj):
+        """
+        Last line of the traceback (the exception); the full text stays in the database
+        """
+        lines = [line for line in obj.error.splitlines() if line.strip()]
+        return lines[-1] if lines else None
+
+    def get_url(self, obj):
+        return self._absolute(reverse('job-detail', args=[obj.pk]))
+
+    def get_download_url(self, obj):
+        if obj.status != Job.DONE or not isinstance(obj.result, dict) or not obj.result.get('file'):
+            return None
+        return self._absolute(reverse('job-download', args=[obj.pk]))
@@ -0,0 +1,182 @@
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import queue
+from .models import Job
+from .worker import Worker
+
+calls = []
+
+
+@queue.task('tests.record')
+def record(value):
+    calls.append(value)
+    return {'value': value}
+
+
+@queue.task('tests.flaky', max_attempts=3)
+def flaky(fail_times):
+    calls.append('flaky')
+    if calls.count('flaky') <= fail_times:
+        raise RuntimeError(f'failure {calls.count("flaky")}')
+    return 'ok'
+
+
+@queue.task('tests.slow')
+def slow(seconds):
+    time.sleep(seconds)
+    calls.append(queue.recover_stale())
+
+
+@override_settings(JOBS_ENABLED=True, JOBS_RETRY_BACKOFF=0)
+class JobQueueTests(TestCase):
+    """
+    enqueue / claim / execute, retries and housekeeping (jobs/queue.py)
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def run_due(self):
+        while (job := queue.claim('test')) is not None:
+            queue.execute(job)
+
+    def test_inline_when_disabled(self):
+        with override_settings(JOBS_ENABLED=False):
+            self.assertIsNone(queue.enqueue('tests.record', {'value': 1}))
+        self.assertEqual((calls, Job.objects.count()), ([1], 0))
+
+    def test_priority_then_due_time(self):
+        queue.enqueue('tests.record', {'value': 'low'}, priority=queue.LOW)
+        queue.enqueue('tests.record', {'value': 'later'}, priority=queue.HIGH, delay=3600)
+        queue.enqueue('tests.record', {'value': 'normal'})
+        queue.enqueue('tests.record', {'value': 'high'}, priority=queue.HIGH)
+        self.run_due()
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+        job = Job.objects.get(payload={'value': 'high'})
+        self.assertEqual((job.status, job.result, job.attempts), (Job.DONE, {'value': 'high'}, 1))
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).payload, {'value': 'later'})
+
+    def test_retries_then_fails(self):
+        ok = queue.enqueue('tests.flaky', {'fail_times': 2})
+        with self.assertLogs('jobs', 'WARNING') as logs:
+            self.run_due()
+        ok.refresh_from_db()
+        self.assertEqual((ok.status, ok.attempts, ok.result, ok.error), (Job.DONE, 3, 'ok', ''))
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING'] * 2)
+        self.assertIn('attempt 1/3 failed, retrying', logs.output[0])
+
+        calls.clear()
+        bad = queue.enqueue('tests.flaky', {'fail_times': 5})
+        with self.assertLogs('jobs', 'WARNING') as logs:
+            self.run_due()
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (Job.FAILED, 3))
+        self.assertIn('RuntimeError: failure 3', bad.error)
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'WARNING', 'ERROR'])
+        self.assertIn('failed after 3 attempt(s): failure 3', logs.output[-1])
+
+        unknown = Job.objects.create(kind='tests.missing')
+        with self.assertLogs('jobs', 'WARNING') as logs:
+            self.run_due()
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.status, unknown.attempts), (Job.FAILED, 1))
+        self.assertIn("Unknown task 'tests.missing'", logs.output[0])
+
+    def test_backoff_grows_and_is_capped(self):
+        with override_settings(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_MAX_DELAY=60):
+            self.assertTrue(8 <= queue.backoff(1) <= 12)
+            self.assertTrue(32 <= queue.backoff(3) <= 48)
+            self.assertTrue(48 <= queue.backoff(10) <= 72)
+
+    def test_stale_jobs_are_recovered_and_old_ones_pruned(self):
+        long_ago = timezone.now() - timedelta(days=30)
+        stale = Job.objects.create(kind='tests.record', status=Job.RUNNING, attempts=1, started_at=long_ago)
+        dead = Job.objects.create(kind='tests.record', status=Job.RUNNING, attempts=3, started_at=long_ago)
+        Job.objects.create(kind='tests.record', status=Job.DONE, finished_at=long_ago)
+        self.assertEqual(queue.recover_stale(), 2)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=dead.pk).status, Job.FAILED)
+        self.assertEqual(queue.prune(), 1)  # the failed one finished just now
+
+    def test_outcome_is_recorded_only_by_the_lock_holder(self):
+        queue.enqueue('tests.record', {'value': 1})
+        queue.enqueue('tests.flaky', {'fail_times': 1})
+        jobs = [queue.claim('a'), queue.claim('a')]
+        # Meanwhile requeued by recover_stale() and claimed by another worker
+        Job.objects.update(locked_by='b')
+        with self.assertLogs('jobs.queue', 'WARNING') as logs:
+            self.assertEqual([queue.execute(job) for job in jobs], [False, False])
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(
+            list(Job.objects.values_list('status', 'locked_by', 'result', 'error')),
+            [(Job.RUNNING, 'b', None, '')] * 2,
+        )
+
+    def test_status_endpoints(self):
+        from account.models import CustomUser
+        owner = CustomUser.objects.create(username='job-owner')
+        other = CustomUser.objects.create(username='job-other')
+        admin = CustomUser.objects.create(username='job-admin', role='admin')
+        job = queue.enqueue('tests.record', {'value': 1}, created_by=owner)
+        client = APIClient()
+
+        client.force_authenticate(owner)
+        data = client.get(f'/product/jobs/{job.pk}/').json()
+        self.assertEqual((data['status'], data['kind'], data['download_url']), ('queued', 'tests.record', None))
+        self.assertEqual(client.get(f'/product/jobs/{job.pk}/download/').status_code, 409)
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/product/jobs/{job.pk}/').status_code, 404)
+        self.assertEqual(client.get('/product/jobs/').json()['results'], [])
+        client.force_authenticate(admin)
+        self.run_due()
+        results = client.get('/product/jobs/?status=done').json()['results']
+        self.assertEqual([(row['id'], row['result']) for row in results], [(job.pk, {'value': 1})])
+
+
+@override_settings(JOBS_ENABLED=True, JOBS_RETRY_BACKOFF=0)
+class WorkerPoolTests(TransactionTestCase):
+    """
+    Worker threads share the queue without running a job twice
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def test_threads_drain_the_queue_once(self):
+        for i in range(40):
+            queue.enqueue('tests.record', {'value': i})
+        # SQLite's shared in-memory test database locks whole tables; row locks need PostgreSQL
+        threads = 4 if connection.features.has_select_for_update_skip_locked else 1
+        worker = Worker(threads=threads, poll_interval=0, burst=True).run()
+        self.assertEqual(sorted(calls), list(range(40)))
+        self.assertEqual((worker.succeeded, worker.failed), (40, 0))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 40)
+
+
+@override_settings(JOBS_ENABLED=True, JOBS_HEARTBEAT_INTERVAL=0.05, JOBS_TIMEOUT=0.2)
+class JobHeartbeatTests(TransactionTestCase):
+    """
+    A job running longer than JOBS_TIMEOUT is kept alive by its heartbeat
+    """
+
+    def setUp(self):
+        calls.clear()
+
+    def test_running_job_is_not_recovered(self):
+        queue.enqueue('tests.slow', {'seconds': 0.5})
+        job = queue.claim('test')
+        self.assertTrue(queue.execute(job))
+        self.assertEqual(calls, [0])  # recover_stale() at the end of the run found nothing stale
+        finished = Job.objects.get(pk=job.pk)
+        self.assertEqual((finished.status, finished.attempts), (Job.DONE, 1))
+        self.assertGreater(finished.started_at, job.started_at + timedelta(seconds=0.3))
+
+        # Without beats the same job would have been taken from its worker
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, started_at=job.started_at)
+        self.assertEqual(queue.recover_stale(), 1)
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from product.views import IsAuthenticatedOrHasAPIKey
+from .models import Job
+from .queue import output_path
+from .serializer import JobSerializer
+
+JOB_LIST_LIMIT = 100
+
+
+def visible_jobs(request):
+    """
+    API-key clients, admins and managers see every job; other users only the ones they started
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and api_key == settings.SCANNER_API_KEY:
+        return Job.objects.all()
+    user = request.user
+    if user.is_authenticated and user.is_admin_or_manager:
+        return Job.objects.all()
+    return Job.objects.filter(created_by=user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def job_list(request):
+    """
+    The newest jobs (at most 100), optionally filtered by ?status= and ?kind=
+    """
+    jobs = visible_jobs(request).order_by('-id')
+    for param in ('status', 'kind'):
+        value = request.query_params.get(param)
+        if value:
+            jobs = jobs.filter(**{param: value})
+    return Response({'results': JobSerializer(jobs[:JOB_LIST_LIMIT], many=True, context={'request': request}).data})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def job_detail(request, pk):
+    job = visible_jobs(request).filter(pk=pk).first()
+    if job is None:
+        return Response({'detail': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(JobSerializer(job, context={'request': request}).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def job_download(request, pk):
+    """
+    The file a finished job wrote (e.g. a background export)
+    """
+    job = visible_jobs(request).filter(pk=pk).first()
+    if job is None:
+        return Response({'detail': 'Job not found.'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status != Job.DONE or not isinstance(job.result, dict) or not job.result.get('file'):
+        return Response({'detail': f'Job is {job.status}; it has no file to download.'},
+                        status=status.HTTP_409_CONFLICT)
+    try:
+        handle = open(output_path(job.result['file']), 'rb')
+    except FileNotFoundError:
+        return Response({'detail': 'The job output has been deleted.'}, status=status.HTTP_410_GONE)
+    return FileResponse(
+        handle, as_attachment=True, filename=job.result.get('filename') or job.result['file'],
+        content_type=job.result.get('content_type') or 'application/octet-stream',
+    )
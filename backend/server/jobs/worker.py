@@ -0,0 +1,155 @@
+"""
+The worker pool behind `manage.py run_workers`: JOBS_WORKER_PROCESSES
+processes of JOBS_WORKER_THREADS threads each. Every thread loops claim ->
+execute and sleeps JOBS_POLL_INTERVAL seconds when nothing is due. Threads
+suit I/O-bound jobs (file writes, exports streaming from the database); add
+processes for CPU-bound ones. SIGTERM/SIGINT let running jobs finish, then
+exit. Once a minute each process also requeues jobs abandoned by a dead worker
+and prunes old finished jobs.
+
+This module is the target of spawned processes, so it must not import models
+before django.setup(); jobs.queue is imported inside the functions.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+HOUSEKEEPING_INTERVAL = 60  # seconds
+BURST_MAX_ERRORS = 5  # consecutive claim failures before a --burst thread gives up
+
+
+class Worker:
+    def __init__(self, threads=None, poll_interval=None, burst=False):
+        self.threads = threads or settings.JOBS_WORKER_THREADS
+        self.poll_interval = settings.JOBS_POLL_INTERVAL if poll_interval is None else poll_interval
+        # Exit once the queue is empty instead of polling (cron, tests)
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._housekeeping_at = 0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True) for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        # Join with a timeout so the main thread keeps handling signals
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+        return self
+
+    def _loop(self):
+        from . import queue
+
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+        errors = 0
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    self._housekeeping()
+                    job = queue.claim(worker_id)
+                    errors = 0
+                except DatabaseError as e:
+                    # Database restarting, SQLite busy...: back off and try again
+                    errors += 1
+                    logger.warning('Job worker could not claim a job (%d): %s', errors, e)
+                    if self.burst and errors >= BURST_MAX_ERRORS:
+                        break
+                    self.stopping.wait(max(self.poll_interval, 0.05) * errors)
+                    continue
+                if job is None:
+                    if self.burst:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                try:
+                    ok = queue.execute(job)
+                except DatabaseError:
+                    # The outcome could not be recorded; recover_stale() requeues the job after JOBS_TIMEOUT
+                    logger.exception('Job %s ran but its status could not be saved', job)
+                    ok = False
+                with self._lock:
+                    if ok:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+        finally:
+            connection.close()
+
+    def _housekeeping(self):
+        from . import queue
+
+        now = time.monotonic()
+        with self._lock:
+            if now < self._housekeeping_at:
+                return
+            self._housekeeping_at = now + HOUSEKEEPING_INTERVAL
+        recovered = queue.recover_stale()
+        pruned = queue.prune()
+        if recovered or pruned:
+            logger.info('Job housekeeping: %d stale job(s) recovered, %d old job(s) pruned', recovered, pruned)
+
+
+def run_process(threads, poll_interval, burst):
+    """
+    Entry point of a spawned worker process
+    """
+    import django
+    django.setup()
+    worker = Worker(threads, poll_interval, burst)
+    worker.install_signal_handlers()
+    worker.run()
+
+
+def run_pool(processes=None, threads=None, poll_interval=None, burst=False):
+    """
+    Run workers until stopped (or, with `burst`, until the queue is empty).
+    One process runs its threads here; more are spawned as child processes.
+    Returns the in-process Worker, or None when children did the work.
+    """
+    processes = processes or settings.JOBS_WORKER_PROCESSES
+    if processes <= 1:
+        worker = Worker(threads, poll_interval, burst)
+        worker.install_signal_handlers()
+        return worker.run()
+
+    # spawn: forking would copy this process's database connections into the children
+    context = multiprocessing.get_context('spawn')
+    children = [
+        context.Process(target=run_process, args=(threads, poll_interval, burst), name=f'job-worker-process-{i}')
+        for i in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    def stop(*args):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        child.join()
+    return None
@@ -0,0 +1,127 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+class ConnectionStats:
+    """
+    Per-process database connection counters.
+    Without pooling every connection_created is a real connect (TCP + auth +
+    backend fork); with the psycopg pool it is a checkout from the pool, and
+    the pool's own stats report physical connects and wait time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_created = {}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self, alias):
+        with self._lock:
+            self.connections_created[alias] = self.connections_created.get(alias, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.requests
+            created = dict(self.connections_created)
+        result = {'requests': requests, 'aliases': {}}
+        for conn in connections.all(initialized_only=True):
+            settings_dict = conn.settings_dict
+            alias_stats = {
+                'vendor': conn.vendor,
+                'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+                'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+                'connections_created': created.get(conn.alias, 0),
+            }
+            # connects per request: ~1.0 means no reuse, ~0 means persistent/pooled
+            alias_stats['churn_per_request'] = round(alias_stats['connections_created'] / requests, 4) if requests else 0.0
+            pool = getattr(conn, 'pool', None)
+            if pool is not None:
+                alias_stats['pool'] = pool_stats(pool)
+            result['aliases'][conn.alias] = alias_stats
+        return result
+
+
+def pool_stats(pool):
+    """
+    Summarize psycopg_pool stats: checkouts, wait time and physical connection churn
+    """
+    raw = pool.get_stats()
+    checkouts = raw.get('requests_num', 0)
+    wait_ms = raw.get('requests_wait_ms', 0)
+    return {
+        'min_size': raw.get('pool_min'),
+        'max_size': raw.get('pool_max'),
+        'size': raw.get('pool_size'),
+        'available': raw.get('pool_available'),
+        'waiting': raw.get('requests_waiting', 0),
+        'checkouts': checkouts,
+        'checkouts_queued': raw.get('requests_queued', 0),
+        'checkout_errors': raw.get('requests_errors', 0),
+        'wait_ms_total': wait_ms,
+        'wait_ms_avg': round(wait_ms / checkouts, 3) if checkouts else 0.0,
+        'connections_opened': raw.get('connections_num', 0),
+        'connect_ms_total': raw.get('connections_ms', 0),
+        'connections_lost': raw.get('connections_lost', 0),
+        'returns_bad': raw.get('returns_bad', 0),
+    }
+
+
+connection_stats = ConnectionStats()
+
+# Query observers of the current request (see observe_queries). A context variable rather than
+# connection.execute_wrapper(): under ASGI a view's queries run in sync_to_async threads, each
+# with its own connection the middleware cannot reach, but the context is copied into them.
+_query_observers = contextvars.ContextVar('query_observers', default=())
+
+
+@contextlib.contextmanager
+def observe_queries(observer):
+    """
+    Call observer.record_query(sql, params, many, seconds) for every query run
+    in this context, including from sync_to_async threads it starts
+    """
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _query_observers.reset(token)
+
+
+def dispatch_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection; times queries while someone observes them
+    """
+    observers = _query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer.record_query(sql, params, many, duration)
+
+
+@receiver(request_started)
+def count_request(sender, **kwargs):
+    connection_stats.record_request()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    connection_stats.record_connection(connection.alias)
+    # The wrapper object outlives reconnects; install the dispatcher once
+    if dispatch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch_query)
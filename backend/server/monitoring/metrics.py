@@ -0,0 +1,297 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+Each thread aggregates into its own shard, so recording a request takes no
+lock; shards are summed when /metrics is scraped. The shards of threads that
+have exited (runserver starts one per request) are folded into a retired total
+and dropped, so their number stays bounded by the live threads. With several worker
+processes, set METRICS_DIR to a directory shared by the workers (e.g. a tmpfs
+path): every process periodically writes its totals there as <pid>.json and
+the scrape merges all live workers.
+"""
+import json
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class RouteStats:
+    __slots__ = ('count', 'buckets', 'duration_sum', 'request_bytes', 'response_bytes',
+                 'statuses', 'db_queries', 'db_seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.duration_sum = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.statuses = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'buckets': list(self.buckets),
+            'duration_sum': self.duration_sum,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'statuses': self.statuses.copy(),
+            'db_queries': self.db_queries,
+            'db_seconds': self.db_seconds,
+        }
+
+
+class _Shard:
+    def __init__(self):
+        self.thread = weakref.ref(threading.current_thread())
+        self.routes = {}
+        self.photos_written = 0
+        self.photo_bytes = 0
+        self.photo_upload_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        # Taken when a new thread records its first sample and when shards are summed
+        self._shards_lock = threading.Lock()
+        self._retired = _empty_totals()  # shards of exited threads
+        self._last_flush = 0.0
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._retire_dead_shards()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_dead_shards(self):
+        """
+        Fold the shards of exited threads into the retired total; caller holds _shards_lock.
+        An exited thread no longer writes to its shard, so reading it here is safe.
+        """
+        live = []
+        for shard in self._shards:
+            thread = shard.thread()
+            if thread is not None and thread.is_alive():
+                live.append(shard)
+            else:
+                _add_shard(self._retired, shard)
+        self._shards = live
+
+    def record_request(self, route, method, status_code, duration, request_bytes, response_bytes,
+                       db_queries=0, db_seconds=0.0):
+        shard = self._shard()
+        key = (route, method)
+        stats = shard.routes.get(key)
+        if stats is None:
+            stats = shard.routes[key] = RouteStats()
+        stats.count += 1
+        stats.duration_sum += duration
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                stats.buckets[i] += 1
+                break
+        stats.request_bytes += request_bytes
+        stats.response_bytes += response_bytes
+        # str keys so totals merge cleanly with snapshots read back from JSON
+        status_code = str(status_code)
+        stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+        stats.db_queries += db_queries
+        stats.db_seconds += db_seconds
+        self._maybe_flush()
+
+    def record_photo(self, size, uploaded_size=None):
+        """
+        A photo of `size` bytes written for an upload of `uploaded_size` bytes (differs when normalized)
+        """
+        shard = self._shard()
+        shard.photos_written += 1
+        shard.photo_bytes += size
+        shard.photo_upload_bytes += size if uploaded_size is None else uploaded_size
+
+    def snapshot(self):
+        """
+        Sum every thread shard of this process into plain dicts (JSON serializable)
+        """
+        totals = _empty_totals()
+        with self._shards_lock:
+            self._retire_dead_shards()
+            shards = list(self._shards)
+            _add_totals(totals, self._retired)
+        for shard in shards:
+            _add_shard(totals, shard)
+        return totals
+
+    def _maybe_flush(self):
+        metrics_dir = getattr(settings, 'METRICS_DIR', '')
+        if not metrics_dir:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+            return
+        self._last_flush = now
+        self.flush(metrics_dir)
+
+    def flush(self, metrics_dir):
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        This process's live totals merged with the last snapshot of every other live worker
+        """
+        merged = self.snapshot()
+        metrics_dir = getattr(settings, 'METRICS_DIR', '')
+        if not metrics_dir or not os.path.isdir(metrics_dir):
+            return merged
+        for name in os.listdir(metrics_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                pid = int(name[:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            path = os.path.join(metrics_dir, name)
+            if not _pid_alive(pid):
+                # Worker is gone; Prometheus treats the drop as a counter reset
+                _remove_quietly(path)
+                continue
+            try:
+                with open(path) as fh:
+                    other = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            merged['photos_written'] += other.get('photos_written', 0)
+            merged['photo_bytes'] += other.get('photo_bytes', 0)
+            merged['photo_upload_bytes'] += other.get('photo_upload_bytes', other.get('photo_bytes', 0))
+            for key, stats in other.get('routes', {}).items():
+                _merge_route(merged['routes'], key, stats)
+        return merged
+
+
+def _empty_totals():
+    return {'routes': {}, 'photos_written': 0, 'photo_bytes': 0, 'photo_upload_bytes': 0}
+
+
+def _add_totals(totals, other):
+    for field in ('photos_written', 'photo_bytes', 'photo_upload_bytes'):
+        totals[field] += other[field]
+    for key, stats in other['routes'].items():
+        _merge_route(totals['routes'], key, stats)
+
+
+def _add_shard(totals, shard):
+    totals['photos_written'] += shard.photos_written
+    totals['photo_bytes'] += shard.photo_bytes
+    totals['photo_upload_bytes'] += shard.photo_upload_bytes
+    for (route, method), stats in shard.routes.copy().items():
+        _merge_route(totals['routes'], f'{route}\t{method}', stats.as_dict())
+
+
+def _merge_route(routes, key, stats):
+    target = routes.get(key)
+    if target is None:
+        routes[key] = {**stats, 'buckets': list(stats['buckets']), 'statuses': dict(stats['statuses'])}
+        return
+    for field in ('count', 'duration_sum', 'request_bytes', 'response_bytes', 'db_queries', 'db_seconds'):
+        target[field] += stats[field]
+    target['buckets'] = [a + b for a, b in zip(target['buckets'], stats['buckets'])]
+    for code, n in stats['statuses'].items():
+        target['statuses'][code] = target['statuses'].get(code, 0) + n
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(data):
+    """
+    Render collected metrics in the Prometheus text exposition format (0.0.4)
+    """
+    lines = []
+
+    def header(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    routes = sorted(data['routes'].items())
+    parsed = []
+    for key, stats in routes:
+        route, method = key.split('\t', 1)
+        parsed.append((f'route="{_label(route)}",method="{_label(method)}"', stats))
+
+    header('http_request_duration_seconds', 'histogram', 'Request latency by route')
+    for labels, stats in parsed:
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, stats['buckets']):
+            cumulative += n
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats["duration_sum"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats["count"]}')
+
+    header('http_requests_total', 'counter', 'Requests by route and status code')
+    for labels, stats in parsed:
+        for code, n in sorted(stats['statuses'].items()):
+            lines.append(f'http_requests_total{{{labels},status="{code}"}} {n}')
+
+    header('http_request_bytes_total', 'counter', 'Request body bytes received by route')
+    for labels, stats in parsed:
+        lines.append(f'http_request_bytes_total{{{labels}}} {stats["request_bytes"]}')
+
+    header('http_response_bytes_total', 'counter', 'Response body bytes sent by route (non-streaming)')
+    for labels, stats in parsed:
+        lines.append(f'http_response_bytes_total{{{labels}}} {stats["response_bytes"]}')
+
+    header('db_queries_total', 'counter', 'SQL queries executed by route')
+    for labels, stats in parsed:
+        lines.append(f'db_queries_total{{{labels}}} {stats["db_queries"]}')
+
+    header('db_query_seconds_total', 'counter', 'Time spent in SQL by route')
+    for labels, stats in parsed:
+        lines.append(f'db_query_seconds_total{{{labels}}} {stats["db_seconds"]:.6f}')
+
+    header('photos_written_total', 'counter', 'Uploaded photos written to MEDIA_ROOT')
+    lines.append(f'photos_written_total {data["photos_written"]}')
+    header('photo_bytes_written_total', 'counter', 'Bytes of uploaded photos written to MEDIA_ROOT')
+    lines.append(f'photo_bytes_written_total {data["photo_bytes"]}')
+    header('photo_upload_bytes_total', 'counter', 'Bytes of photos as uploaded, before normalization')
+    lines.append(f'photo_upload_bytes_total {data["photo_upload_bytes"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
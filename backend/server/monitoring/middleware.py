@@ -0,0 +1,125 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from .db import observe_queries
+from .metrics import registry
+
+
+class QueryCounter:
+    """
+    Query observer (monitoring.db.observe_queries) counting queries and their total time
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def record_query(self, sql, params, many, duration):
+        self.count += 1
+        self.seconds += duration
+
+
+def streams_lazily(response):
+    """
+    True for streaming responses whose body is produced while it is sent (exports,
+    SSE); FileResponse over a file keeps its Content-Length and sendfile path
+    """
+    return response.streaming and getattr(response, 'file_to_stream', None) is None
+
+
+def observe_stream(response, observer, on_close):
+    """
+    Replace a streaming response's content so the queries its iterator runs
+    are reported to `observer`, and call on_close(bytes sent) once the stream is
+    exhausted or closed. Async streams call on_close through sync_to_async.
+    """
+    content = response.streaming_content
+
+    if response.is_async:
+        async def chunks():
+            sent = 0
+            iterator = aiter(content)
+            try:
+                while True:
+                    with observe_queries(observer):
+                        try:
+                            chunk = await anext(iterator)
+                        except StopAsyncIteration:
+                            break
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                await sync_to_async(on_close)(sent)
+    else:
+        def chunks():
+            sent = 0
+            iterator = iter(content)
+            try:
+                while True:
+                    with observe_queries(observer):
+                        try:
+                            chunk = next(iterator)
+                        except StopIteration:
+                            break
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                on_close(sent)
+
+    response.streaming_content = chunks()
+    return response
+
+
+class MetricsMiddleware:
+    """
+    Record latency, sizes, status code and SQL cost of every request per route.
+    Should be first in MIDDLEWARE so the timing covers the whole stack. For
+    streamed bodies (exports) the request is recorded when the stream ends, so
+    latency, bytes and queries include the streaming.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        queries = QueryCounter()
+        with observe_queries(queries):
+            response = self.get_response(request)
+        return self.process_response(request, response, start, queries)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        queries = QueryCounter()
+        with observe_queries(queries):
+            response = await self.get_response(request)
+        return self.process_response(request, response, start, queries)
+
+    def process_response(self, request, response, start, queries):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        try:
+            request_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            request_bytes = 0
+
+        def record(response_bytes):
+            registry.record_request(
+                route, request.method, response.status_code, time.perf_counter() - start,
+                request_bytes, response_bytes, queries.count, queries.seconds,
+            )
+
+        if streams_lazily(response):
+            return observe_stream(response, queries, record)
+        if response.streaming:
+            record(int(response.get('Content-Length') or 0))
+        else:
+            record(len(response.content))
+        return response
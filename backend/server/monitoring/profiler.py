@@ -0,0 +1,173 @@
+"""
+Opt-in SQL profiler (SQL_PROFILER=True).
+
+Every query is timed through monitoring.db.observe_queries and attributed to
+the view that ran it. Responses get Server-Timing and X-DB-Queries headers
+(for streamed bodies these cover the queries run before streaming), queries
+slower than SQL_SLOW_QUERY_MS go to the 'sql.slow' logger (a rotating file, see
+settings.LOGGING) together with their EXPLAIN plan, and per-statement totals
+are kept for /api/diagnostics/.
+"""
+import logging
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .db import observe_queries
+from .middleware import observe_stream, streams_lazily
+
+slow_logger = logging.getLogger('sql.slow')
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql):
+    """
+    Collapse a statement to its shape so identical queries with different
+    parameters aggregate together: literals -> ?, IN lists -> IN (...)
+    """
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryProfile:
+    """
+    Aggregated cost per (view, normalized statement) for this process
+    """
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, normalized, duration):
+        key = (view, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    return
+                entry = self._entries[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            ms = duration * 1000
+            entry['count'] += 1
+            entry['total_ms'] += ms
+            entry['max_ms'] = max(entry['max_ms'], ms)
+
+    def top(self, limit=20):
+        with self._lock:
+            items = [(key, dict(entry)) for key, entry in self._entries.items()]
+        items.sort(key=lambda item: item[1]['total_ms'], reverse=True)
+        return [
+            {'view': view, 'sql': sql, 'count': e['count'],
+             'total_ms': round(e['total_ms'], 3), 'max_ms': round(e['max_ms'], 3),
+             'avg_ms': round(e['total_ms'] / e['count'], 3)}
+            for (view, sql), e in items[:limit]
+        ]
+
+
+query_profile = QueryProfile()
+
+
+class _RequestRecorder:
+    def __init__(self, request, slow_seconds):
+        self.request = request
+        self.slow_seconds = slow_seconds
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = []
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
+
+    def record_query(self, sql, params, many, duration):
+        self.count += 1
+        self.seconds += duration
+        query_profile.record(self.view_name(), normalize_sql(sql), duration)
+        if duration >= self.slow_seconds:
+            self.slow.append((sql, params, many, duration))
+
+    def log_slow(self):
+        # Runs once the request's queries are done, so EXPLAIN is not profiled itself
+        for sql, params, many, duration in self.slow:
+            plan = None if many else explain(sql, params)
+            slow_logger.warning(
+                '%.1fms %s %s\nSQL: %s\nPARAMS: %r%s',
+                duration * 1000, self.request.method, self.view_name(), sql, params,
+                f'\nPLAN:\n{plan}' if plan else '',
+            )
+        self.slow = []
+
+
+def explain(sql, params):
+    """
+    Return the plan for a SELECT, or None for other statements
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {e}'
+
+
+class SQLProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILER', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SQL_SLOW_QUERY_MS', 200) / 1000
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        recorder = _RequestRecorder(request, self.slow_seconds)
+        with observe_queries(recorder):
+            response = self.get_response(request)
+        self.add_headers(response, recorder, start)
+        if streams_lazily(response):
+            return observe_stream(response, recorder, lambda sent: recorder.log_slow())
+        recorder.log_slow()
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = _RequestRecorder(request, self.slow_seconds)
+        with observe_queries(recorder):
+            response = await self.get_response(request)
+        self.add_headers(response, recorder, start)
+        if streams_lazily(response):
+            return observe_stream(response, recorder, lambda sent: recorder.log_slow())
+        if recorder.slow:
+            await sync_to_async(recorder.log_slow)()
+        return response
+
+    def add_headers(self, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.seconds * 1000
+        response['X-DB-Queries'] = str(recorder.count)
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", app;dur={total_ms:.1f}'
+        )
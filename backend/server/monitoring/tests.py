@@ -0,0 +1,130 @@
+import threading
+from datetime import date
+
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import resolve
+from rest_framework.test import APIClient
+
+from product.models import Product
+from .metrics import MetricsRegistry, registry
+
+API_KEY = 'monitoring-test-key'
+
+
+def route_totals(path, method='GET'):
+    stats = registry.snapshot()['routes'].get(f'{resolve(path).route}\t{method}', {})
+    return {key: stats.get(key, 0) for key in ('count', 'response_bytes', 'db_queries')}
+
+
+def delta(before, after):
+    return {key: after[key] - before[key] for key in before}
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+@override_settings(SCANNER_API_KEY=API_KEY, COMPRESSION_ENABLED=False)
+class MetricsMiddlewareTests(TestCase):
+    """
+    MetricsMiddleware records queries and bytes for sync, async and streamed responses
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Product.objects.create(barcode=f'MT{i}', so_number=f'SO-MT{i}', date=date(2024, 5, i + 1))
+
+    def test_sync_view(self):
+        before = route_totals('/product/products/')
+        response = APIClient().get('/product/products/', HTTP_X_API_KEY=API_KEY)
+        change = delta(before, route_totals('/product/products/'))
+        self.assertEqual(change['count'], 1)
+        self.assertEqual(change['response_bytes'], len(response.content))
+        self.assertGreater(change['db_queries'], 0)
+
+    def test_streamed_export_is_recorded_when_the_stream_ends(self):
+        before = route_totals('/product/export/')
+        with override_settings(EXPORT_STREAMING=True, EXPORT_CHUNK_SIZE=2):
+            response = APIClient().get('/product/export/', HTTP_X_API_KEY=API_KEY)
+            self.assertEqual(delta(before, route_totals('/product/export/'))['count'], 0)
+            body = b''.join(response.streaming_content)
+        change = delta(before, route_totals('/product/export/'))
+        self.assertEqual((change['count'], change['response_bytes']), (1, len(body)))
+        # The chunks are queried while streaming
+        self.assertGreaterEqual(change['db_queries'], 3)
+
+    async def test_async_views(self):
+        client = AsyncClient()
+        before = route_totals('/product/async/products/')
+        response = await client.get('/product/async/products/', headers={'X-API-Key': API_KEY})
+        change = delta(before, route_totals('/product/async/products/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((change['count'], change['response_bytes']), (1, len(response.content)))
+        self.assertGreater(change['db_queries'], 0)
+
+        before = route_totals('/product/async/export/')
+        with override_settings(EXPORT_STREAMING=True, EXPORT_CHUNK_SIZE=2):
+            response = await client.get('/product/async/export/', headers={'X-API-Key': API_KEY})
+            body = await read_stream(response)
+        change = delta(before, route_totals('/product/async/export/'))
+        self.assertEqual((change['count'], change['response_bytes']), (1, len(body)))
+        self.assertGreaterEqual(change['db_queries'], 3)
+
+
+class MetricsRegistryTests(TestCase):
+    """
+    Thread shards of MetricsRegistry (monitoring/metrics.py)
+    """
+
+    def test_shards_of_exited_threads_are_retired(self):
+        metrics = MetricsRegistry()
+
+        def request():
+            metrics.record_request('shards/', 'GET', 200, 0.01, 10, 20)
+            metrics.record_photo(5)
+
+        for _ in range(50):
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+            # A new thread's first sample retires the shards of the ones that exited
+            self.assertLessEqual(len(metrics._shards), 1)
+        data = metrics.snapshot()
+        self.assertEqual(metrics._shards, [])
+        stats = data['routes']['shards/\tGET']
+        self.assertEqual((stats['count'], stats['response_bytes'], data['photos_written']), (50, 1000, 50))
+
+        request()  # a live thread's shard is summed with the retired totals
+        data = metrics.snapshot()
+        self.assertEqual((len(metrics._shards), data['routes']['shards/\tGET']['count']), (1, 51))
+
+
+@override_settings(SCANNER_API_KEY=API_KEY, COMPRESSION_ENABLED=False, SQL_PROFILER=True, SQL_SLOW_QUERY_MS=0)
+class SQLProfilerMiddlewareTests(TestCase):
+    """
+    Server-Timing / X-DB-Queries headers and the slow-query log, sync and async
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(barcode='SP1', so_number='SO-SP1', date=date(2024, 5, 1))
+
+    def test_sync_headers_and_slow_log(self):
+        with self.assertLogs('sql.slow', 'WARNING') as logs:
+            response = APIClient().get('/product/products/', HTTP_X_API_KEY=API_KEY)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(len(logs.records), int(response['X-DB-Queries']))
+
+    async def test_async_headers_and_streamed_slow_log(self):
+        client = AsyncClient()
+        with self.assertLogs('sql.slow', 'WARNING'):
+            response = await client.get('/product/async/products/', headers={'X-API-Key': API_KEY})
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+        with override_settings(EXPORT_STREAMING=True):
+            response = await client.get('/product/async/export/', headers={'X-API-Key': API_KEY})
+            with self.assertLogs('sql.slow', 'WARNING') as logs:
+                await read_stream(response)
+        self.assertTrue(any('PLAN:' in record.getMessage() for record in logs.records))
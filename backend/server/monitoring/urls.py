@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import diagnostics
+
+urlpatterns = [
+    path('diagnostics/', diagnostics, name='diagnostics'),
+]
@@ -0,0 +1,83 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response
+
+from account.authentication import CachedJWTAuthentication
+from account.cache import user_cache, username_cache
+from product.cache import barcode_cache
+from product.events import broker
+from product.lookups import lookup_cache
+from .db import connection_stats
+from .metrics import registry, render_prometheus
+from .profiler import query_profile
+
+
+class IsAdminOrManager(BasePermission):
+    """
+    Allow access only to users with the admin or manager role.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.is_admin_or_manager)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOrManager])
+def diagnostics(request):
+    """
+    Runtime counters for this worker process (caches, pools, ...)
+    """
+    return Response({
+        'auth_user_cache': user_cache.stats(),
+        'username_cache': username_cache.stats(),
+        'lookup_cache': lookup_cache.stats(),
+        'barcode_cache': barcode_cache.stats(),
+        'events': broker.stats(),
+        'photos': _photo_stats(),
+        'database': connection_stats.stats(),
+        'sql_profile': query_profile.top() if settings.SQL_PROFILER else None,
+    })
+
+
+def _photo_stats():
+    """
+    Upload normalization savings across all workers (from the metrics registry)
+    """
+    data = registry.collect()
+    return {
+        'normalize': settings.PHOTO_NORMALIZE,
+        'written': data['photos_written'],
+        'uploaded_bytes': data['photo_upload_bytes'],
+        'stored_bytes': data['photo_bytes'],
+        'saved_bytes': data['photo_upload_bytes'] - data['photo_bytes'],
+    }
+
+
+def _metrics_authorized(request):
+    """
+    Accept the static scrape token (METRICS_TOKEN) or a JWT of an admin/manager
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[len('Bearer '):], token):
+        return True
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result) and result[0].is_admin_or_manager
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint (text exposition format)
+    """
+    if not _metrics_authorized(request):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    body = render_prometheus(registry.collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,118 @@
+"""
+Hot/cold split of the product table.
+
+Shipped products whose ex_date is older than ARCHIVE_AFTER_DAYS are moved, with
+their photo rows, into product_archive / photo_archive by
+`manage.py archive_products`. Default list/search queries read only the hot
+table; `include_archived=1` and the export endpoint read both through
+CombinedProducts. Photo files stay where they are.
+"""
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedPhoto, ArchivedProduct, Photo, Product, next_change_seq
+
+
+def archive_cutoff(days):
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    return Product.objects.filter(current_status='1', ex_date__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move one batch of archivable products and their photos; returns (products, photos) moved
+    """
+    product_fields = [field.attname for field in Product._meta.concrete_fields]
+    photo_fields = [field.attname for field in Photo._meta.concrete_fields]
+    with transaction.atomic():
+        # Where the change number is a counter, lock it before any product row, like every other writer
+        next_change_seq()
+        candidates = archivable(cutoff).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Rows a scanner is updating right now are simply picked up next run
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0, 0
+        rows = Product.objects.filter(id__in=ids).values(*product_fields)
+        ArchivedProduct.objects.bulk_create([ArchivedProduct(**row) for row in rows], ignore_conflicts=True)
+        photos = Photo.objects.filter(product_id__in=ids).values(*photo_fields)
+        ArchivedPhoto.objects.bulk_create([ArchivedPhoto(**row) for row in photos], ignore_conflicts=True)
+        photo_count, _ = Photo.objects.filter(product_id__in=ids).delete()
+        # Leaves archived tombstones for delta-sync clients (product/changes.py)
+        Product.objects.filter(id__in=ids).delete(archived=True)
+    return len(ids), photo_count
+
+
+def archive_products(days, batch_size=1000, max_batches=None, pause=0.0, log=None):
+    """
+    Archive in batches until nothing is left (or max_batches); each batch is its own transaction
+    """
+    cutoff = archive_cutoff(days)
+    moved_products = moved_photos = batches = 0
+    while max_batches is None or batches < max_batches:
+        products, photos = archive_batch(cutoff, batch_size)
+        if not products:
+            break
+        batches += 1
+        moved_products += products
+        moved_photos += photos
+        if log:
+            log(f'  batch {batches}: {products} product(s), {photos} photo(s)')
+        if pause:
+            time.sleep(pause)
+    return {'cutoff': cutoff, 'batches': batches, 'products': moved_products, 'photos': moved_photos}
+
+
+class CombinedProducts:
+    """
+    Read-only, sliceable view over the hot and archived querysets (same filters),
+    ordered by `ordering` (the product_ordering() keys). Slices run one UNION ALL
+    over the sort keys, then load the page's rows from each table. Works with
+    Django's Paginator and DRF's PageNumberPagination.
+    """
+
+    def __init__(self, hot, archived, ordering, prepare=None):
+        self.hot = hot
+        self.archived = archived
+        self.ordering = ordering
+        # Applied to each table's page queryset (select_related/prefetch for the serializer)
+        self.prepare = prepare or (lambda queryset: queryset)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.hot.count() + self.archived.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        columns = [key.lstrip('-') for key in self.ordering]
+        if 'id' not in columns:
+            columns.append('id')
+        keys = (
+            self.hot.order_by().values_list(*columns)
+            .union(self.archived.order_by().values_list(*columns), all=True)
+            .order_by(*self.ordering)[index]
+        )
+        id_position = columns.index('id')
+        ids = [row[id_position] for row in keys]
+        # Archived rows keep their original id, so ids are unique across both tables
+        loaded = {obj.id: obj for obj in self.prepare(self.hot.model.objects.filter(id__in=ids))}
+        missing = [pk for pk in ids if pk not in loaded]
+        if missing:
+            loaded.update((obj.id, obj) for obj in self.prepare(self.archived.model.objects.filter(id__in=missing)))
+        return [loaded[pk] for pk in ids if pk in loaded]
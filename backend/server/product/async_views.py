@@ -0,0 +1,400 @@
+"""
+Async (ASGI) versions of the scanner, product list and export endpoints, plus
+the Server-Sent Events product change stream.
+
+These are plain Django async views: under an ASGI server the request body is
+received by the event loop before the view runs, so slow scanner uploads no
+longer pin a worker. Database access uses the async ORM; photo writes run in a
+worker thread so the event loop never blocks on disk I/O.
+Served only when the app runs under ASGI (see server/asgi.py).
+"""
+import asyncio
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from account.authentication import CachedJWTAuthentication
+from server.renderers import FastJSONRenderer, iter_json_array
+from .archive import CombinedProducts
+from .cache import barcode_cache
+from .events import STATUS, UPDATED, broker, emit_change, emit_created, start_listener
+from .models import ArchivedProduct, Product, Photo
+from .serializer import ProductSerializer
+from .views import (
+    FIND_SO_NUMBER_BATCH_MAX, StandardPagination, batch_find_response, combined_list_queryset, create_photo,
+    export_chunks, export_queryset, include_archived, product_facets, product_list_queryset, requested_barcodes,
+    requested_fields, resolve_created_by, save_file_safely, sparse_queryset,
+)
+
+
+def _json(data, status=200):
+    # Same renderer (and bytes) as the DRF endpoints
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def _iterate_in_thread(iterator):
+    """
+    Drive a sync iterator that touches the database from the event loop, one item per thread hop
+    """
+    done = object()
+    while True:
+        item = await sync_to_async(next)(iterator, done)
+        if item is done:
+            break
+        yield item
+
+
+def _has_api_key(request):
+    api_key = request.headers.get('X-API-Key')
+    return bool(api_key) and api_key == settings.SCANNER_API_KEY
+
+
+async def _authenticate_jwt(request):
+    """
+    Run the JWT authentication class; sets request.user and returns True on success
+    """
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    if result is None:
+        return False
+    request.user = result[0]
+    return True
+
+
+async def _authenticate_query_token(request):
+    """
+    JWT from the `token` query param: EventSource cannot set an Authorization header
+    """
+    raw = request.GET.get('token')
+    if not raw:
+        return False
+    auth = CachedJWTAuthentication()
+    try:
+        validated = await sync_to_async(auth.get_validated_token)(raw.encode())
+        request.user = await sync_to_async(auth.get_user)(validated)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    return True
+
+
+async def _authenticated_or_api_key(request):
+    """
+    Async equivalent of IsAuthenticatedOrHasAPIKey
+    """
+    if _has_api_key(request):
+        return True
+    return await _authenticate_jwt(request)
+
+
+def _request_data(request):
+    """
+    The JSON object or form fields of the request; None for a JSON body that is not an object
+    """
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _serialize(queryset_or_list, request=None, many=True, fields=None):
+    """
+    Sync: lookup names may be loaded on a cache miss, so call via sync_to_async/to_thread
+    """
+    context = {'request': request} if request is not None else {}
+    return ProductSerializer(queryset_or_list, many=many, context=context, fields=fields).data
+
+
+async def _save_photos(product, photos, so_number, start_idx=0):
+    """
+    Write uploaded photos off the event loop and create their Photo rows (create_photo,
+    which queues their normalization when it is deferred to the job queue)
+    """
+    failed_uploads = []
+    for idx, img in enumerate(photos, start=1):
+        success, result = await asyncio.to_thread(save_file_safely, img, so_number, start_idx + idx)
+        if success:
+            if product is not None:
+                await sync_to_async(create_photo)(product, result)
+        else:
+            failed_uploads.append({'file': img.name, 'error': result})
+    return failed_uploads
+
+
+async def _fetch_products(queryset, fields=None):
+    """
+    Load products with everything the serializer touches for `fields`, so serialization needs no further queries
+    """
+    return [product async for product in sparse_queryset(queryset, fields)]
+
+
+@csrf_exempt
+@require_POST
+async def scanner_api(request):
+    """
+    Async Zebra device product scan API (same contract as views.scanner_api)
+    """
+    if not _has_api_key(request):
+        return _json({'detail': 'Authentication credentials were not provided.'}, status=403)
+    if request.headers.get('Authorization'):
+        await _authenticate_jwt(request)
+
+    data = _request_data(request)
+    if data is None:
+        return _json({'success': False, 'message': 'JSON object required'}, status=400)
+    action = data.get('action')
+    if not action:
+        return _json({'success': False, 'message': 'Invalid action'}, status=400)
+
+    if action == 'find_so_number':
+        if 'barcodes' in data:
+            barcodes = requested_barcodes(data)
+            if not barcodes or len(barcodes) > FIND_SO_NUMBER_BATCH_MAX:
+                return _json({'success': False, 'message': f'1 to {FIND_SO_NUMBER_BATCH_MAX} barcodes required'}, status=400)
+            return _json(await sync_to_async(batch_find_response)(barcodes))
+        barcode = data.get('barcode', '')
+        if not barcode:
+            return _json({'success': False, 'message': 'barcode required'}, status=400)
+        so_number = await sync_to_async(barcode_cache.resolve)(barcode)
+        if so_number is None:
+            return _json({'success': False, 'message': 'not found'}, status=404)
+        return _json({'success': True, 'so_number': so_number})
+
+    if action == 'inbound':
+        product_data = {
+            'date': data.get('date', ''),
+            'barcode': data.get('barcode', ''),
+            'so_number': data.get('so_number', ''),
+            'number': data.get('number', ''),
+            'vender': data.get('vender', ''),
+            'qty': data.get('qty', ''),
+            'weight': data.get('weight', ''),
+            'current_status': '0',
+            'noted': data.get('noted', ''),
+        }
+        serializer = ProductSerializer(data=product_data)
+        if not await sync_to_async(serializer.is_valid)():
+            return _json({'success': False, 'message': serializer.errors}, status=400)
+
+        created_by_id = await sync_to_async(resolve_created_by)(request, data.get('created_by_username'))
+        product = await sync_to_async(serializer.save)(created_by_id=created_by_id)
+        await sync_to_async(emit_created)(product)
+
+        failed_uploads = await _save_photos(product, request.FILES.getlist('photos'), product_data.get('so_number', 'photo'))
+
+        products = await _fetch_products(Product.objects.filter(pk=product.pk))
+        response_data = {'success': True, 'product': await sync_to_async(_serialize)(products[0], request, many=False)}
+        if failed_uploads:
+            response_data['warning'] = f'{len(failed_uploads)} file(s) failed to upload'
+            response_data['failed_uploads'] = failed_uploads
+        return _json(response_data)
+
+    if action == 'outbound':
+        so_number = data.get('so_number', '')
+        if not so_number:
+            return _json({'success': False, 'message': 'so_number required'}, status=400)
+        products = Product.objects.filter(so_number=so_number)
+        # 照片只存到最新 date 的產品, found among the recent dates whenever there is one
+        recent = await sync_to_async(products.recent_first)()
+        latest_date = (await recent.aaggregate(Max('date')))['date__max']
+        if latest_date is None:
+            return _json({'success': False, 'message': 'not found'}, status=404)
+        today = datetime.now().strftime('%Y-%m-%d')
+        product_ids = [pk async for pk in products.values_list('id', flat=True)]
+        await products.aupdate(ex_date=today, current_status='1')
+        await sync_to_async(emit_change)(STATUS, product_ids, {'current_status': '1', 'ex_date': today})
+
+        target_product = await recent.filter(date=latest_date).afirst()
+        exist_count = 0
+        if target_product:
+            exist_count = await Photo.objects.filter(
+                product=target_product, product_date=latest_date, path__startswith=f"{so_number}_"
+            ).acount()
+        photos = request.FILES.getlist('photos')
+        failed_uploads = await _save_photos(target_product, photos, so_number, exist_count)
+        if target_product and len(failed_uploads) < len(photos):
+            await sync_to_async(emit_change)(
+                UPDATED, [target_product.pk], {'photos': exist_count + len(photos) - len(failed_uploads)}
+            )
+
+        first = await _fetch_products(products.order_by('pk')[:1])
+        response_data = {'success': True, 'product': await sync_to_async(_serialize)(first[0], many=False)}
+        if failed_uploads:
+            response_data['warning'] = f'{len(failed_uploads)} file(s) failed to upload'
+            response_data['failed_uploads'] = failed_uploads
+        return _json(response_data)
+
+    return _json({'success': False, 'message': 'Invalid action'}, status=400)
+
+
+@require_GET
+async def product_list(request):
+    """
+    Async paginated product list (same query params and response shape as ProductListAPIView)
+    """
+    if not await _authenticated_or_api_key(request):
+        return _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        fields = requested_fields(request.GET)
+        queryset = await sync_to_async(product_list_queryset)(request.GET)
+    except ValidationError as exc:
+        return _json(exc.detail, status=400)
+    with_archive = include_archived(request.GET)
+    if request.GET.get('id'):
+        products = await _fetch_products(queryset[:1], fields)
+        if not products and with_archive:
+            products = await _fetch_products(
+                (await sync_to_async(product_list_queryset)(request.GET, ArchivedProduct))[:1], fields,
+            )
+        if products:
+            return _json({'results': [await sync_to_async(_serialize)(products[0], request, many=False, fields=fields)]})
+    elif with_archive:
+        queryset = await sync_to_async(combined_list_queryset)(request.GET)
+        queryset.prepare = lambda table: sparse_queryset(table, fields)
+
+    paginator = StandardPagination()
+    try:
+        page_size = min(int(request.GET.get(paginator.page_size_query_param, paginator.page_size)), paginator.max_page_size)
+        if page_size <= 0:
+            page_size = paginator.page_size
+    except ValueError:
+        page_size = paginator.page_size
+    try:
+        page_number = int(request.GET.get(paginator.page_query_param, 1))
+    except ValueError:
+        page_number = 1
+
+    count = await sync_to_async(queryset.count)() if with_archive else await queryset.acount()
+    num_pages = max(1, -(-count // page_size))
+    if page_number < 1 or page_number > num_pages:
+        return _json({'detail': 'Invalid page.'}, status=404)
+
+    offset = (page_number - 1) * page_size
+    if isinstance(queryset, CombinedProducts):
+        products = await sync_to_async(queryset.__getitem__)(slice(offset, offset + page_size))
+    else:
+        # Date-ordered pages come from the date window first (ProductQuerySet.window_slice)
+        products = await sync_to_async(sparse_queryset(queryset, fields).window_slice)(offset, min(offset + page_size, count))
+
+    # Same link format as PageNumberPagination
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, paginator.page_query_param, page_number + 1) if page_number < num_pages else None
+    if page_number == 1:
+        previous_url = None
+    elif page_number == 2:
+        previous_url = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous_url = replace_query_param(url, paginator.page_query_param, page_number - 1)
+
+    data = {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': await sync_to_async(_serialize)(products, request, fields=fields),
+    }
+    facets = request.GET.get('facets')
+    if facets:
+        try:
+            data['facets'] = await sync_to_async(product_facets)(queryset, facets)
+        except ValidationError as exc:
+            return _json(exc.detail, status=400)
+    return _json(data)
+
+
+@require_GET
+async def export_products(request):
+    """
+    Async export (same filters as get_all_products_for_export)
+    """
+    if not await _authenticated_or_api_key(request):
+        return _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        fields = requested_fields(request.GET)
+        querysets = [await sync_to_async(export_queryset)(request.GET)]
+    except ValidationError as exc:
+        return _json(exc.detail, status=400)
+    if include_archived(request.GET, default=True):
+        querysets.append(await sync_to_async(export_queryset)(request.GET, ArchivedProduct))
+    if settings.EXPORT_STREAMING:
+        # Each chunk is fetched, serialized and rendered in a worker thread
+        return StreamingHttpResponse(
+            _iterate_in_thread(iter_json_array(export_chunks(querysets, fields=fields))),
+            content_type='application/json',
+        )
+    products = []
+    for queryset in querysets:
+        products += await _fetch_products(queryset, fields)
+    # Serializing a large export is CPU-bound; keep it off the event loop
+    data = await asyncio.to_thread(_serialize, products, fields=fields)
+    return _json(data)
+
+
+def _sse(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'
+
+
+def _last_event_id(request):
+    return request.headers.get('Last-Event-ID') or request.GET.get('lastEventId') or None
+
+
+@require_GET
+async def product_events(request):
+    """
+    Server-Sent Events stream of product changes (created / updated / status / deleted).
+
+    Each event carries {type, ids, fields, ts}; its SSE id lets a reconnecting
+    client resume via Last-Event-ID on the same process. If the missed events
+    are gone (evicted, another process or a restart) the client gets a `resync`
+    event and should refetch.
+    """
+    if not (await _authenticated_or_api_key(request) or await _authenticate_query_token(request)):
+        return _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    start_listener()
+    subscription, backlog = broker.subscribe(_last_event_id(request))
+    heartbeat = settings.EVENTS_HEARTBEAT_SECONDS
+
+    async def stream():
+        try:
+            # Reconnect delay for the browser's EventSource
+            yield 'retry: 3000\n\n'
+            if backlog is None:
+                yield _sse(broker.stats()['last_event_id'], 'resync', {})
+            else:
+                for seq, event in backlog:
+                    yield _sse(broker.event_id(seq), event['type'], event)
+            while True:
+                item = await subscription.get(heartbeat)
+                if item is None:
+                    # Keeps proxies from closing an idle connection
+                    yield ': ping\n\n'
+                elif item[0] == 'resync':
+                    yield _sse(broker.stats()['last_event_id'], 'resync', {})
+                else:
+                    seq, event = item
+                    if backlog and seq <= backlog[-1][0]:
+                        continue  # already replayed
+                    yield _sse(broker.event_id(seq), event['type'], event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: flush each event
+    return response
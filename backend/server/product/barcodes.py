@@ -0,0 +1,199 @@
+"""
+Offline barcode -> so_number snapshots for scanner devices.
+
+`manage.py build_barcode_snapshot` streams the product table in barcode order
+into a gzip'd, sorted TSV and writes one delta from each retained older
+snapshot to the new one. Devices download the full file once, then request
+GET /product/barcodes/snapshot/?since=<their version> and apply the (small)
+delta. When no product changed, no new version is built.
+
+File formats (UTF-8, gzip):
+    full   #tgt-barcodes 1 <version>            then  <barcode>\\t<so_number>
+    delta  #tgt-barcodes-delta 1 <from> <to>    then  +<barcode>\\t<so_number> | -<barcode>
+Lines are sorted by barcode in code point (byte) order. A barcode maps to the
+so_number find_so_number returns: that of its lowest-id product.
+"""
+import gzip
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.functions import Collate
+from django.utils import timezone
+
+from .changes import current_seq
+from .models import Product
+
+FORMAT = 1
+MANIFEST = 'manifest.json'
+
+
+def snapshot_dir():
+    return settings.BARCODE_SNAPSHOT_DIR
+
+
+def snapshot_name(version):
+    return f'barcodes-{version}.tsv.gz'
+
+
+def delta_name(old, new):
+    return f'barcodes-{old}-{new}.delta.gz'
+
+
+def snapshot_rows(chunk_size=20000):
+    """
+    (barcode, so_number) for every distinct barcode, in barcode order, streamed
+    with a server-side cursor over the (barcode, id) index
+    """
+    barcode = 'barcode'
+    if connection.vendor == 'postgresql':
+        # diff_rows compares in Python (code point) order; the default collation may not
+        barcode = Collate('barcode', 'C')
+    rows = Product.objects.order_by(barcode, 'id').values_list('barcode', 'so_number').iterator(chunk_size=chunk_size)
+    previous = None
+    for barcode, so_number in rows:
+        if barcode == previous:
+            continue
+        previous = barcode
+        # Tabs/newlines would break the line format; scanners never produce them
+        if '\t' in barcode or '\n' in barcode:
+            continue
+        yield barcode, (so_number or '').replace('\t', ' ').replace('\n', ' ')
+
+
+def _open_write(path, level):
+    return gzip.open(path, 'wt', encoding='utf-8', newline='\n', compresslevel=level)
+
+
+def write_snapshot(path, rows, version, level=9):
+    """
+    Write `rows` (sorted) as a full snapshot; returns the row count
+    """
+    count = 0
+    with _open_write(path, level) as fh:
+        fh.write(f'#tgt-barcodes {FORMAT} {version}\n')
+        for barcode, so_number in rows:
+            fh.write(f'{barcode}\t{so_number}\n')
+            count += 1
+    return count
+
+
+def read_snapshot(path):
+    with gzip.open(path, 'rt', encoding='utf-8', newline='\n') as fh:
+        header = fh.readline().split()
+        if not header or header[0] != '#tgt-barcodes' or int(header[1]) != FORMAT:
+            raise ValueError(f'{path} is not a barcode snapshot')
+        for line in fh:
+            barcode, _, so_number = line.rstrip('\n').partition('\t')
+            yield barcode, so_number
+
+
+def diff_rows(old, new):
+    """
+    Merge-join two barcode-sorted row streams; yields ('+', barcode, so_number)
+    for added/changed barcodes and ('-', barcode, None) for removed ones
+    """
+    old, new = iter(old), iter(new)
+    a, b = next(old, None), next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            yield '-', a[0], None
+            a = next(old, None)
+        elif a is None or b[0] < a[0]:
+            yield '+', b[0], b[1]
+            b = next(new, None)
+        else:
+            if a[1] != b[1]:
+                yield '+', b[0], b[1]
+            a, b = next(old, None), next(new, None)
+
+
+def write_delta(path, changes, old_version, new_version, level=9):
+    """
+    Write diff_rows() output as a delta; returns the number of changes
+    """
+    count = 0
+    with _open_write(path, level) as fh:
+        fh.write(f'#tgt-barcodes-delta {FORMAT} {old_version} {new_version}\n')
+        for op, barcode, so_number in changes:
+            fh.write(f'+{barcode}\t{so_number}\n' if op == '+' else f'-{barcode}\n')
+            count += 1
+    return count
+
+
+def load_manifest(directory=None):
+    path = os.path.join(directory or snapshot_dir(), MANIFEST)
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def _save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def build_snapshot(directory=None, keep=None, force=False, log=None):
+    """
+    Build a new snapshot (versioned by the latest final change number) plus deltas
+    from the retained older snapshots, and prune the rest. Returns the manifest.
+    """
+    directory = directory or snapshot_dir()
+    keep = keep or settings.BARCODE_SNAPSHOT_KEEP
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory) or {'format': FORMAT, 'version': None, 'snapshots': [], 'deltas': {}}
+
+    # Taken before reading: writes racing the scan land in the next version at the latest
+    version = current_seq()
+    if version == manifest['version'] and not force:
+        if log:
+            log(f'Snapshot {version} is current; nothing changed')
+        return manifest
+
+    started = time.perf_counter()
+    path = os.path.join(directory, snapshot_name(version))
+    count = write_snapshot(path + '.tmp', snapshot_rows(), version)
+    os.replace(path + '.tmp', path)
+    entry = {
+        'version': version,
+        'file': snapshot_name(version),
+        'count': count,
+        'bytes': os.path.getsize(path),
+        'seconds': round(time.perf_counter() - started, 3),
+        'generated_at': timezone.now().isoformat(),
+    }
+    if log:
+        log(f"Snapshot {version}: {count:,} barcode(s), {entry['bytes']:,} bytes in {entry['seconds']}s")
+
+    older = [s for s in manifest['snapshots'] if s['version'] != version][-(keep - 1):] if keep > 1 else []
+    deltas = {}
+    for snapshot in older:
+        old_path = os.path.join(directory, snapshot['file'])
+        if not os.path.exists(old_path):
+            continue
+        name = delta_name(snapshot['version'], version)
+        changes = write_delta(
+            os.path.join(directory, name), diff_rows(read_snapshot(old_path), read_snapshot(path)),
+            snapshot['version'], version,
+        )
+        deltas[str(snapshot['version'])] = {
+            'file': name, 'changes': changes, 'bytes': os.path.getsize(os.path.join(directory, name)),
+        }
+        if log:
+            log(f'  delta {snapshot["version"]} -> {version}: {changes:,} change(s)')
+
+    manifest = {'format': FORMAT, 'version': version, 'snapshots': older + [entry], 'deltas': deltas}
+    _save_manifest(directory, manifest)
+
+    # Drop files no longer referenced (older snapshots and deltas to superseded versions)
+    referenced = {s['file'] for s in manifest['snapshots']} | {d['file'] for d in deltas.values()}
+    for name in os.listdir(directory):
+        if name.startswith('barcodes-') and name not in referenced:
+            os.remove(os.path.join(directory, name))
+    return manifest
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+# Barcodes per IN (...) query; stays under SQLite's bound-parameter limit
+QUERY_CHUNK = 500
+
+# Product columns that decide which so_number a barcode resolves to
+KEY_FIELDS = {'barcode', 'so_number', 'date'}
+
+
+class BarcodeCache:
+    """
+    Bounded LRU of barcode -> so_number for the scanner's find_so_number. A
+    barcode resolves to its lowest-id product, looking among products of the
+    last PRODUCT_RECENT_DAYS first (the date predicate lets Postgres prune old
+    partitions). Only hits are cached, so a barcode received a moment ago is
+    never reported missing. Product writes in this process drop the affected
+    entries once they commit (see models.Product / ProductQuerySet); writes in
+    other workers are picked up when an entry's BARCODE_CACHE_TTL runs out.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()  # barcode -> (expires, so_number, product id)
+        self._barcodes = {}            # product id -> barcode, for invalidation by id
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, 'BARCODE_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'BARCODE_CACHE_TTL', 60)
+
+    def _store(self, barcode, so_number, product_id):
+        # Caller holds the lock
+        self._drop(barcode)
+        self._entries[barcode] = (time.monotonic() + self.ttl, so_number, product_id)
+        self._barcodes[product_id] = barcode
+        while len(self._entries) > self.maxsize:
+            old, (_, _, old_id) = self._entries.popitem(last=False)
+            self._barcodes.pop(old_id, None)
+
+    def _drop(self, barcode):
+        # Caller holds the lock
+        entry = self._entries.pop(barcode, None)
+        if entry is not None:
+            self._barcodes.pop(entry[2], None)
+        return entry is not None
+
+    def _query(self, barcodes):
+        """
+        barcode -> (so_number, product id) for the barcodes that exist, one IN query per chunk and pass
+        """
+        from .models import Product, recent_cutoff
+
+        found = {}
+        passes = [{}]
+        cutoff = recent_cutoff()
+        if cutoff is not None:
+            passes.insert(0, {'date__gte': cutoff})
+        for extra in passes:
+            missing = [barcode for barcode in barcodes if barcode not in found]
+            for i in range(0, len(missing), QUERY_CHUNK):
+                rows = (
+                    Product.objects.filter(barcode__in=missing[i:i + QUERY_CHUNK], **extra)
+                    .order_by('barcode', 'id').values_list('barcode', 'so_number', 'id')
+                )
+                for barcode, so_number, product_id in rows:
+                    found.setdefault(barcode, (so_number, product_id))
+        return found
+
+    def resolve_many(self, barcodes):
+        """
+        Resolve barcodes with at most one query per chunk of misses.
+        Returns a dict barcode -> so_number for the barcodes that exist.
+        """
+        resolved = {}
+        missing = []
+        now = time.monotonic()
+        use_cache = self.maxsize > 0 and self.ttl > 0
+        with self._lock:
+            for barcode in dict.fromkeys(b for b in barcodes if b):
+                entry = self._entries.get(barcode) if use_cache else None
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(barcode)
+                    resolved[barcode] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(barcode)
+                    self.misses += 1
+        if missing:
+            found = self._query(missing)
+            with self._lock:
+                for barcode, (so_number, product_id) in found.items():
+                    resolved[barcode] = so_number
+                    if use_cache:
+                        self._store(barcode, so_number, product_id)
+        return resolved
+
+    def resolve(self, barcode):
+        """
+        so_number for one barcode, or None if no product has it
+        """
+        return self.resolve_many([barcode]).get(barcode)
+
+    def invalidate(self, product_ids=(), barcodes=()):
+        """
+        Drop entries resolved to these products or for these barcodes once the
+        current transaction commits
+        """
+        product_ids, barcodes = list(product_ids), list(barcodes)
+
+        def drop():
+            with self._lock:
+                stale = {self._barcodes[pk] for pk in product_ids if pk in self._barcodes} | set(barcodes)
+                self.invalidations += sum(self._drop(barcode) for barcode in stale)
+
+        transaction.on_commit(drop)
+
+    def clear(self):
+        def drop():
+            with self._lock:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._barcodes.clear()
+
+        transaction.on_commit(drop)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+barcode_cache = BarcodeCache()
@@ -0,0 +1,137 @@
+"""
+Delta sync for clients that keep a local copy of the product table.
+
+Every product write stores a change number (models.next_change_seq) in
+product.change_seq; deletes and archiving leave a ProductTombstone with that
+number instead (see ProductQuerySet). Numbers are shared by all rows of one
+bulk update (and, on PostgreSQL, of one transaction), so the cursor is the
+(change_seq, id) of the last row a client has seen.
+
+A cursor must never pass a write that commits later with a lower number. On
+PostgreSQL the number is the writer's transaction id and pages only include
+numbers below change_horizon(), the oldest transaction that may still commit.
+Elsewhere the counter row stays locked until the writer commits, so numbers
+become visible in order.
+"""
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ChangeCounter, Product, ProductTombstone
+
+# Highest tombstone change_seq removed by prune_tombstones(); older cursors must resync
+TOMBSTONE_FLOOR = 'product_tombstone_floor'
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def parse_cursor(value):
+    """
+    '<seq>:<id>' from a previous page, or a bare '<seq>' meaning everything after
+    that change; empty means from the beginning (a full download)
+    """
+    if not value:
+        return -1, 0
+    seq, sep, pk = str(value).partition(':')
+    seq = int(seq)
+    return (seq, int(pk)) if sep else (seq, float('inf'))
+
+
+def format_cursor(seq, pk):
+    return f'{seq}:{pk}'
+
+
+def _after(queryset, seq, pk):
+    if pk == float('inf'):
+        return queryset.filter(change_seq__gt=seq)
+    return queryset.filter(Q(change_seq__gt=seq) | Q(change_seq=seq, id__gt=pk))
+
+
+def changes_page(since, limit):
+    """
+    Up to `limit` changes after the `since` cursor, oldest first. Returns
+    (products, tombstones, cursor, has_more); cursor is where the next page starts.
+    """
+    seq, pk = parse_cursor(since)
+    floor = tombstone_floor()
+    if since and floor and (seq < floor or (seq == floor and pk != float('inf'))):
+        raise CursorExpired(since)
+    # Taken before reading: every number below it is final once the reads start
+    horizon = change_horizon()
+    visible = {} if horizon is None else {'change_seq__lt': horizon}
+    products = list(
+        _after(Product.objects.filter(**visible), seq, pk)
+        .select_related('created_by', 'cargo').prefetch_related('photos')
+        .order_by('change_seq', 'id')[:limit + 1]
+    )
+    tombstones = []
+    if since:
+        # A full download has no local copy to delete from
+        tombstones = list(
+            _after(ProductTombstone.objects.filter(**visible), seq, pk).order_by('change_seq', 'id')[:limit + 1]
+        )
+
+    merged = sorted(products + tombstones, key=lambda obj: (obj.change_seq, obj.id))
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    if merged:
+        cursor = format_cursor(merged[-1].change_seq, merged[-1].id)
+    else:
+        cursor = since or format_cursor(current_seq(horizon), 0)
+    return (
+        [obj for obj in merged if isinstance(obj, Product)],
+        [obj for obj in merged if isinstance(obj, ProductTombstone)],
+        cursor,
+        has_more,
+    )
+
+
+def change_horizon():
+    """
+    PostgreSQL: every change number below this belongs to a finished
+    transaction (or the caller's own). None elsewhere: the counter's lock
+    already makes numbers visible in order.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT product_change_horizon()')
+        return cursor.fetchone()[0]
+
+
+def current_seq(horizon=None):
+    """
+    The latest change number that is final: nothing committed later will get
+    a number at or below it
+    """
+    if connection.vendor != 'postgresql':
+        return ChangeCounter.objects.filter(name='product').values_list('value', flat=True).first() or 0
+    if horizon is None:
+        horizon = change_horizon()
+    latest = [
+        model.objects.filter(change_seq__lt=horizon).aggregate(latest=Max('change_seq'))['latest'] or 0
+        for model in (Product, ProductTombstone)
+    ]
+    return max(latest)
+
+
+def tombstone_floor():
+    return ChangeCounter.objects.filter(name=TOMBSTONE_FLOOR).values_list('value', flat=True).first() or 0
+
+
+def prune_tombstones(days):
+    """
+    Drop tombstones older than `days`; cursors from before them get 410 and must resync
+    """
+    old = ProductTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    floor = old.aggregate(floor=Max('change_seq'))['floor']
+    if floor is None:
+        return 0
+    ChangeCounter.objects.get_or_create(name=TOMBSTONE_FLOOR)
+    ChangeCounter.objects.filter(name=TOMBSTONE_FLOOR, value__lt=floor).update(value=floor)
+    deleted, _ = old.filter(change_seq__lte=floor).delete()
+    return deleted
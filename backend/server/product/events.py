@@ -0,0 +1,351 @@
+"""
+Product change feed for the Server-Sent Events endpoint (async_views.product_events).
+
+Write paths call emit_change(). On PostgreSQL (EVENTS_NOTIFY) the event is sent
+with NOTIFY inside the writing transaction: Postgres delivers it to every
+process's NotifyListener when the transaction commits and drops it on rollback,
+so a write is seen by clients of every worker, including job workers' writes.
+Otherwise the event is published to this process only, after the commit.
+
+Each process's EventBroker fans an event out to its subscribers. Each
+subscriber is an asyncio queue on the server's event loop, so one event costs
+one publish however many dashboards are connected. A short history lets
+clients that reconnect to the same process resume from Last-Event-ID.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+STATUS = 'status'
+DELETED = 'deleted'
+
+# Fields whose change alone is reported as a status change
+STATUS_FIELDS = {'current_status', 'ex_date'}
+
+CHANNEL = 'product_events'
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+
+class Subscription:
+    """
+    One connected client. Events arrive via offer() on the subscriber's loop;
+    if the client falls `maxsize` events behind it gets a single resync marker
+    instead of an unbounded backlog.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.resync_pending = False
+
+    def offer(self, item):
+        # Runs on self.loop
+        if self.resync_pending:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = self.resync_pending = True
+
+    def request_resync(self):
+        # Runs on self.loop
+        self.resync_pending = True
+
+    async def get(self, timeout):
+        """
+        Next (seq, event), ('resync', None) after an overflow or reset, or None on timeout
+        """
+        if self.resync_pending and self.queue.empty():
+            self.resync_pending = False
+            return 'resync', None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """
+    Fan-out of events to this process's subscribers. Event ids are
+    '<epoch>-<seq>': seq counts this process's events, and the random epoch tells
+    an id from another process (or from before a restart) apart, so resuming
+    from one replays nothing wrong.
+    """
+
+    def __init__(self, history=1000, queue_size=500):
+        self.queue_size = queue_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.published = 0
+        self.overflows = 0
+        self.resets = 0
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def parse_event_id(self, value):
+        """
+        seq of one of this broker's event ids, or None for anything else
+        """
+        epoch, _, seq = str(value or '').rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, event):
+        """
+        Thread-safe: called from sync views (worker threads), async views and
+        the NotifyListener thread alike
+        """
+        with self._lock:
+            self._seq += 1
+            item = (self._seq, dict(event, ts=round(time.time(), 3)))
+            self._history.append(item)
+            subscribers = list(self._subscribers)
+            self.published += 1
+        self._call_subscribers(subscribers, 'offer', item)
+
+    def reset(self):
+        """
+        Events may have been missed (the listener reconnected): forget the
+        history so no one resumes across the gap, and tell every subscriber to resync
+        """
+        with self._lock:
+            self._history.clear()
+            # Skip a number, so even the latest id from before the gap cannot resume
+            self._seq += 1
+            subscribers = list(self._subscribers)
+            self.resets += 1
+        self._call_subscribers(subscribers, 'request_resync')
+
+    def _call_subscribers(self, subscribers, method, *args):
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(getattr(subscription, method), *args)
+            except RuntimeError:  # loop closed; the client is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a subscriber on the running loop. Returns (subscription, backlog):
+        the events after last_event_id still in history, or None if they cannot
+        be replayed (evicted, another process's id, or a restart): the client
+        should resync.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            backlog = []
+            if last_event_id is not None:
+                seq = self.parse_event_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._seq + 1
+                if seq is None or seq > self._seq or oldest > seq + 1:
+                    backlog = None
+                else:
+                    backlog = [item for item in self._history if item[0] > seq]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                if subscription.overflowed:
+                    self.overflows += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'last_event_id': self.event_id(self._seq),
+                'history': len(self._history),
+                'overflows': self.overflows,
+                'resets': self.resets,
+                'listening': listener is not None and listener.connected.is_set(),
+            }
+
+
+class NotifyListener(threading.Thread):
+    """
+    Daemon thread that LISTENs on CHANNEL over its own connection and publishes
+    each notification to `broker`. After (re)connecting it resets the broker,
+    since anything sent while it was not listening is lost.
+    """
+    reconnect_delay = 5.0
+
+    def __init__(self, broker, using='default', poll_timeout=5.0):
+        super().__init__(name='product-events-listener', daemon=True)
+        self.broker = broker
+        self.using = using
+        self.poll_timeout = poll_timeout
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def connect(self):
+        # A connection of its own, outside Django's per-thread handling and any pool
+        wrapper = connections[self.using]
+        raw = wrapper.Database.connect(**wrapper.get_connection_params())
+        raw.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return raw
+
+    def payloads(self, raw):
+        """
+        Notification payloads received within poll_timeout
+        """
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        if is_psycopg3:
+            for notify in raw.notifies(timeout=self.poll_timeout):
+                yield notify.payload
+            return
+        if select.select([raw], [], [], self.poll_timeout)[0]:
+            raw.poll()
+            while raw.notifies:
+                yield raw.notifies.pop(0).payload
+
+    def run(self):
+        while not self.stopping.is_set():
+            raw = None
+            try:
+                raw = self.connect()
+                self.broker.reset()
+                self.connected.set()
+                while not self.stopping.is_set():
+                    for payload in self.payloads(raw):
+                        self.broker.publish(json.loads(payload))
+            except Exception:
+                logger.warning('Product event listener lost its connection; reconnecting', exc_info=True)
+                self.stopping.wait(self.reconnect_delay)
+            finally:
+                self.connected.clear()
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+broker = EventBroker()
+listener = None
+_listener_lock = threading.Lock()
+
+
+def uses_notify(using='default'):
+    return settings.EVENTS_NOTIFY and connections[using].vendor == 'postgresql'
+
+
+def start_listener():
+    """
+    Start this process's NotifyListener once; called by the SSE view, so only
+    processes that serve subscribers hold a listening connection
+    """
+    global listener
+    if not uses_notify():
+        return None
+    with _listener_lock:
+        if listener is None or not listener.is_alive():
+            listener = NotifyListener(broker)
+            listener.start()
+    return listener
+
+
+def notify_payloads(event):
+    """
+    JSON payloads for `event`, splitting its ids over several notifications
+    when one would be too large; an event whose fields alone are too large is
+    sent without them
+    """
+    payload = json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))
+    if len(payload.encode()) <= MAX_PAYLOAD_BYTES:
+        return [payload]
+    ids = event['ids']
+    if len(ids) == 1:
+        return notify_payloads({'type': event['type'], 'ids': ids})
+    half = len(ids) // 2
+    return notify_payloads(dict(event, ids=ids[:half])) + notify_payloads(dict(event, ids=ids[half:]))
+
+
+def notify(event, using='default'):
+    """
+    NOTIFY every process's listener; delivered when the current transaction commits
+    """
+    with connections[using].cursor() as cursor:
+        for payload in notify_payloads(event):
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+
+
+def emit_change(kind, ids, fields=None):
+    """
+    Publish {type, ids, fields} once the current transaction commits
+    (immediately in autocommit mode); rolled back writes emit nothing.
+    Runs database queries: async views call it through sync_to_async.
+    """
+    ids = [int(pk) for pk in ids]
+    if not ids:
+        return
+    event = {'type': kind, 'ids': ids}
+    if fields:
+        event['fields'] = fields
+    if uses_notify():
+        notify(event)
+    else:
+        transaction.on_commit(lambda: broker.publish(event))
+
+
+def emit_created(product):
+    emit_change(CREATED, [product.pk], fields={
+        'so_number': product.so_number,
+        'barcode': product.barcode,
+        'date': str(product.date),
+        'current_status': product.current_status,
+    })
+
+
+def serializer_changes(serializer):
+    """
+    API representation of the fields a ProductSerializer save just wrote
+    """
+    instance = serializer.instance
+    changes = {}
+    for name in serializer.validated_data:
+        field = serializer.fields.get(name)
+        if field is None:
+            continue
+        value = field.get_attribute(instance)
+        changes[name] = None if value is None else field.to_representation(value)
+    return changes
+
+
+def emit_update(serializer, extra=None):
+    """
+    updated / status event for a saved ProductSerializer
+    """
+    fields = serializer_changes(serializer)
+    if extra:
+        fields.update(extra)
+    if not fields:
+        return
+    kind = STATUS if set(fields) <= STATUS_FIELDS else UPDATED
+    emit_change(kind, [serializer.instance.pk], fields)
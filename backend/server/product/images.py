@@ -0,0 +1,113 @@
+"""
+Normalization of uploaded photos before they are written to MEDIA_ROOT.
+
+Camera JPEGs (4-12 MB) are decoded, rotated upright from their EXIF
+orientation, downscaled so the long edge is at most PHOTO_MAX_EDGE pixels and
+re-encoded as PHOTO_FORMAT (JPEG or WEBP) at PHOTO_QUALITY. EXIF, GPS and other
+metadata are not carried over. Animated GIFs are stored as uploaded. With
+PHOTO_KEEP_ORIGINAL the uploaded bytes are also kept in PHOTO_ORIGINALS_DIR,
+outside MEDIA_ROOT.
+
+Decoding and encoding run in a pool of PHOTO_WORKERS processes (0 = in the
+calling thread), so a burst of uploads does not hold the web worker's GIL; the
+request thread only waits for its own result.
+"""
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _normalize(data, max_edge, image_format, quality):
+    """
+    Re-encode one image; returns (bytes, extension) or None to keep `data` as it is.
+    Runs in a pool process, so it only takes plain arguments.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        if getattr(image, 'is_animated', False):
+            return None
+        if max_edge and max(image.size) > max_edge:
+            scale = max_edge / max(image.size)
+            # JPEG: decode at 1/2, 1/4 or 1/8 scale straight away when that is still large enough
+            image.draft('RGB', (round(image.width * scale), round(image.height * scale)))
+            # The box is square, so resizing before the EXIF rotation gives the same result, cheaper
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if image_format == 'WEBP' and has_alpha:
+            image = image.convert('RGBA')
+        elif has_alpha:
+            # JPEG has no alpha channel: flatten onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', image.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        out = io.BytesIO()
+        if image_format == 'JPEG':
+            image.save(out, format='JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(out, format='WEBP', quality=quality, method=4)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e)) from e
+    return out.getvalue(), EXTENSIONS[image_format]
+
+
+def _executor():
+    global _pool
+    workers = settings.PHOTO_WORKERS
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker can copy held locks into the child
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def normalize_photo(data):
+    """
+    Normalized (bytes, extension) for an uploaded image, or None when it is stored
+    unchanged (normalization off, or an animated GIF). Raises InvalidImage when the
+    bytes cannot be decoded.
+    """
+    if not settings.PHOTO_NORMALIZE:
+        return None
+    image_format = settings.PHOTO_FORMAT.upper()
+    if image_format not in EXTENSIONS:
+        raise ValueError(f'PHOTO_FORMAT must be one of {", ".join(EXTENSIONS)}')
+    args = (data, settings.PHOTO_MAX_EDGE, image_format, settings.PHOTO_QUALITY)
+    pool = _executor()
+    if pool is None:
+        return _normalize(*args)
+    try:
+        return pool.submit(_normalize, *args).result()
+    except BrokenProcessPool:
+        # A pool process died (e.g. killed for memory); start a fresh pool next time
+        logger.warning('Photo normalization pool broke; normalizing in-process')
+        _reset_pool()
+        return _normalize(*args)
@@ -0,0 +1,178 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+
+class LookupCache:
+    """
+    In-process name <-> id map for the small product lookup tables (Vender,
+    Client, Category; also Cargo names for facets). A table is loaded whole on
+    the first miss and kept for LOOKUP_CACHE_TTL seconds; new names are inserted
+    on demand. The signal handlers in product/signals.py clear a table's entries
+    when one of its rows is edited or deleted in this process; edits in other
+    workers are picked up when the TTL runs out.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        # model -> (expires, {name: id}, {id: name}); the dicts are replaced, never mutated
+        self._tables = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that raced one does not store what it read
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'LOOKUP_CACHE_TTL', 60)
+
+    def _cached(self, model):
+        # Caller holds the lock; returns (ids, names) or None when missing or expired
+        entry = self._tables.get(model)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def _load(self, model):
+        with self._lock:
+            generation = self._generation
+        rows = list(model.objects.values_list('name', 'id'))
+        ids = dict(rows)
+        names = {pk: name for name, pk in rows}
+        with self._lock:
+            if generation == self._generation and self.ttl > 0:
+                self._tables[model] = (time.monotonic() + self.ttl, ids, names)
+        return ids, names
+
+    def _table(self, model):
+        with self._lock:
+            table = self._cached(model)
+        return table if table is not None else self._load(model)
+
+    def id_for(self, model, name):
+        """
+        Return the id of the row with this name, creating it if needed.
+        """
+        with self._lock:
+            table = self._cached(model)
+            pk = table[0].get(name) if table is not None else None
+            if pk is not None:
+                self.hits += 1
+                return pk
+            self.misses += 1
+        pk = model.objects.get_or_create(name=name)[0].pk
+
+        def remember():
+            with self._lock:
+                entry = self._tables.get(model)
+                if entry is not None:
+                    self._tables[model] = (entry[0], {**entry[1], name: pk}, {**entry[2], pk: name})
+
+        # A row created inside a transaction that later rolls back must not be cached
+        transaction.on_commit(remember)
+        return pk
+
+    def ids_for(self, model, names):
+        """
+        Resolve many names at once (bulk loads); returns a dict name -> id.
+        """
+        ids = self._table(model)[0]
+        missing = [name for name in set(names) if name not in ids]
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            ids = self._load(model)[0]
+        return {name: ids[name] for name in names}
+
+    def existing_ids(self, model, names):
+        """
+        Ids of the rows with these names, without creating any (used for filtering)
+        """
+        ids = self._table(model)[0]
+        if any(name not in ids for name in names):
+            ids = self._load(model)[0]
+        return [ids[name] for name in names if name in ids]
+
+    def name_for(self, model, pk):
+        if pk is None:
+            return None
+        with self._lock:
+            table = self._cached(model)
+            name = table[1].get(pk) if table is not None else None
+            if name is not None:
+                self.hits += 1
+                return name
+            self.misses += 1
+        return self._load(model)[1].get(pk)
+
+    def invalidate(self, model):
+        with self._lock:
+            self._generation += 1
+            self._tables.pop(model, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': {model._meta.db_table: len(entry[1]) for model, entry in self._tables.items()},
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+lookup_cache = LookupCache()
+
+
+class LookupNameField(serializers.Field):
+    """
+    Expose a lookup foreign key as its plain string name, as the API did when
+    these columns were CharFields (rows without one read as '', the old column
+    default). Validation only checks the name; the serializer's save() turns it
+    into a row with resolve_lookups(), creating unknown names, so a request that
+    fails validation leaves nothing behind.
+    """
+
+    def __init__(self, model, max_length=None, **kwargs):
+        self.model = model
+        self.max_length = max_length or model._meta.get_field('name').max_length
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        # Read the raw id; the name comes from the cache, not a join
+        pk = getattr(instance, self.source_attrs[-1] + '_id')
+        return '' if pk is None else pk
+
+    def to_representation(self, value):
+        if value == '':
+            return value
+        return lookup_cache.name_for(self.model, value)
+
+    def to_internal_value(self, data):
+        # Trimmed like the CharFields these columns used to be
+        name = str(data).strip()
+        if len(name) > self.max_length:
+            raise serializers.ValidationError(f'Ensure this field has no more than {self.max_length} characters.')
+        return name
+
+    def resolve(self, name):
+        # Blank reads back as '' either way; store NULL rather than a row named ''
+        if not name:
+            return None
+        return self.model(pk=lookup_cache.id_for(self.model, name), name=name)
+
+
+def resolve_lookups(serializer, validated_data):
+    """
+    Replace the validated lookup names in validated_data with their rows; call from create()/update()
+    """
+    for field in serializer.fields.values():
+        if isinstance(field, LookupNameField) and field.source in validated_data:
+            validated_data[field.source] = field.resolve(validated_data[field.source])
+    return validated_data
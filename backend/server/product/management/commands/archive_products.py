@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product.archive import archivable, archive_cutoff, archive_products
+from product.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Move shipped products (current_status='1') whose ex_date is older than "
+        "--days, with their photo rows, into product_archive/photo_archive in "
+        "batches. Photo files are left in place. Also prunes delta-sync tombstones "
+        "older than --tombstone-days."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='archive products shipped more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, help='stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be archived')
+        parser.add_argument('--tombstone-days', type=int, default=settings.CHANGES_RETENTION_DAYS,
+                            help='drop delete/archive records for /product/changes/ older than this')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            cutoff = archive_cutoff(options['days'])
+            self.stdout.write(f"{archivable(cutoff).count():,} product(s) shipped before {cutoff} would be archived")
+            return
+        result = archive_products(
+            options['days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['products']:,} product(s) and {result['photos']:,} photo(s) "
+            f"shipped before {result['cutoff']} in {result['batches']} batch(es)"
+        ))
+        pruned = prune_tombstones(options['tombstone_days'])
+        if pruned:
+            self.stdout.write(f"Pruned {pruned:,} tombstone(s) older than {options['tombstone_days']} days")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product.barcodes import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a new barcode -> so_number snapshot for scanner devices, with deltas "
+        "from the retained older snapshots (run from cron; does nothing if no "
+        "product changed since the last one)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=settings.BARCODE_SNAPSHOT_KEEP,
+                            help='snapshots to retain; devices on any of them get a delta')
+        parser.add_argument('--dir', default=settings.BARCODE_SNAPSHOT_DIR, help='output directory')
+        parser.add_argument('--force', action='store_true', help='rebuild even if nothing changed')
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot(options['dir'], keep=options['keep'], force=options['force'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"Current snapshot: version {manifest['version']}, {len(manifest['deltas'])} delta(s)"
+        ))
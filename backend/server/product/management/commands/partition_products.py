@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from product.partitioning import (
+    PARTITION_KEYS, add_months, convert_table, ensure_partitions, is_partitioned, partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert product (by date) and photo (by product_date) to monthly range "
+        "partitions on Postgres, or create upcoming monthly partitions (--extend, "
+        "run from cron). Conversion locks both tables; stop the app first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--extend', action='store_true', help='only create missing partitions up to --months-ahead')
+        parser.add_argument('--status', action='store_true', help='list partitions and exit')
+        parser.add_argument('--months-ahead', type=int, default=3, help='create partitions this many months past today')
+        parser.add_argument('--keep-old', action='store_true', help='keep the unpartitioned tables as <table>_unpartitioned')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Table partitioning requires PostgreSQL')
+
+        if options['status']:
+            for table in PARTITION_KEYS:
+                names = partitions(connection, table) if is_partitioned(connection, table) else []
+                self.stdout.write(f"{table}: {len(names)} partition(s) {', '.join(names) if names else '(not partitioned)'}")
+            return
+
+        last_month = add_months(date.today(), options['months_ahead'])
+        for table in PARTITION_KEYS:
+            with transaction.atomic():
+                if is_partitioned(connection, table):
+                    created = ensure_partitions(connection, table, date.today(), last_month)
+                    self.stdout.write(f'{table}: created {len(created)} partition(s)')
+                elif options['extend']:
+                    self.stdout.write(f'{table}: not partitioned, skipped')
+                else:
+                    try:
+                        convert_table(connection, table, options['months_ahead'], options['keep_old'], log=self.stdout.write)
+                    except ValueError as exc:
+                        raise CommandError(str(exc))
+                    self.stdout.write(self.style.SUCCESS(f'{table}: partitioned by {PARTITION_KEYS[table]}'))
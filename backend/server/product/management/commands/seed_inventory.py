@@ -0,0 +1,48 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from product.seeding import seed_inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load synthetic cargos, users, products and placeholder photos "
+        "(staging / benchmark data). On Postgres secondary indexes are dropped "
+        "during the load and rebuilt afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--photos-per-product', type=float, default=1.0, help='mean photos per product')
+        parser.add_argument('--cargos', type=int, default=10, help='synthetic cargos in addition to the defaults')
+        parser.add_argument('--users', type=int, default=5, help='operator accounts (seed_op_NNN)')
+        parser.add_argument('--seed', type=int, default=42, help='RNG seed; same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--no-photo-files', action='store_true', help='create Photo rows without writing files')
+        parser.add_argument('--photo-workers', type=int, default=8, help='threads writing placeholder images')
+        parser.add_argument('--keep-indexes', action='store_true', help='do not drop/rebuild indexes on Postgres')
+        parser.add_argument('--manifest', help='write a JSON description of the seeded data here')
+
+    def handle(self, *args, **options):
+        manifest = seed_inventory(
+            products=options['products'],
+            photos_per_product=options['photos_per_product'],
+            cargos=options['cargos'],
+            users=options['users'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            photo_files=not options['no_photo_files'],
+            photo_workers=options['photo_workers'],
+            drop_indexes=not options['keep_indexes'],
+            stdout=self.stdout,
+        )
+        if options['manifest']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['manifest'])), exist_ok=True)
+            with open(options['manifest'], 'w') as fh:
+                json.dump(manifest, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {manifest['products']:,} products, {manifest['photos']:,} photos "
+            f"({manifest['photo_files']:,} files) in {manifest['seconds']}s"
+        ))
@@ -0,0 +1,116 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOOKUP_FIELDS = [('vender', 'Vender'), ('client', 'Client'), ('category', 'Category')]
+
+
+def forwards(apps, schema_editor):
+    """
+    Create one lookup row per distinct value and point products at it
+    (one UPDATE per distinct value, so this stays cheap on large tables).
+    Values are copied exactly (whitespace included); NULL stays NULL and empty
+    strings keep their own row.
+    """
+    Product = apps.get_model('product', 'Product')
+    for field, model_name in LOOKUP_FIELDS:
+        Lookup = apps.get_model('product', model_name)
+        values = (
+            Product.objects.exclude(**{f'{field}__isnull': True})
+            .order_by().values_list(field, flat=True).distinct()
+        )
+        names = sorted(set(values))
+        Lookup.objects.bulk_create([Lookup(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(Lookup.objects.values_list('name', 'id'))
+        for value in values:
+            Product.objects.filter(**{field: value}).update(**{f'{field}_ref_id': ids[value]})
+
+
+def backwards(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    for field, model_name in LOOKUP_FIELDS:
+        Lookup = apps.get_model('product', model_name)
+        for pk, name in Lookup.objects.values_list('id', 'name'):
+            Product.objects.filter(**{f'{field}_ref_id': pk}).update(**{field: name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0018_cargo_product_cargo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'db_table': 'category',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'db_table': 'client',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Vender',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'db_table': 'vender',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='vender_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.vender'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='client_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.client'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='product.category'),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(model_name='product', name='vender'),
+        migrations.RemoveField(model_name='product', name='client'),
+        migrations.RemoveField(model_name='product', name='category'),
+        migrations.RenameField(model_name='product', old_name='vender_ref', new_name='vender'),
+        migrations.RenameField(model_name='product', old_name='client_ref', new_name='client'),
+        migrations.RenameField(model_name='product', old_name='category_ref', new_name='category'),
+        migrations.AlterField(
+            model_name='product',
+            name='vender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='product.vender'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='product.client'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='product.category'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_product_date(apps, schema_editor):
+    Photo = apps.get_model('product', 'Photo')
+    Product = apps.get_model('product', 'Product')
+    Photo.objects.filter(product_date__isnull=True).update(
+        product_date=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('date')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0020_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='product_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_product_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0021_photo_product_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedProduct',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('number', models.CharField(blank=True, default='', max_length=50, null=True)),
+                ('barcode', models.CharField(max_length=50)),
+                ('qty', models.IntegerField(blank=True, default=0, null=True)),
+                ('date', models.DateField()),
+                ('so_number', models.CharField(max_length=100)),
+                ('weight', models.IntegerField(blank=True, default=0, null=True)),
+                ('noted', models.TextField(blank=True, default='', max_length=300, null=True)),
+                ('current_status', models.CharField(blank=True, default='1', max_length=1, null=True)),
+                ('ex_date', models.DateField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cargo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_products', to='product.cargo')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_products', to='product.category')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_products', to='product.client')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_products', to=settings.AUTH_USER_MODEL)),
+                ('vender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_products', to='product.vender')),
+            ],
+            options={
+                'db_table': 'product_archive',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPhoto',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('path', models.ImageField(upload_to='')),
+                ('product_date', models.DateField(blank=True, editable=False, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='product.archivedproduct')),
+            ],
+            options={
+                'db_table': 'photo_archive',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedproduct',
+            index=models.Index(fields=['date', 'id'], name='product_archive_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedproduct',
+            index=models.Index(fields=['ex_date', 'id'], name='product_archive_exdate_id_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.1.6 on 2026-10-19 11:20
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    ChangeCounter = apps.get_model('product', 'ChangeCounter')
+    ChangeCounter.objects.get_or_create(name='product')
+
+
+def create_functions(apps, schema_editor):
+    """
+    PostgreSQL only: product_change_seq() is the writing transaction's id and
+    product_change_horizon() the lowest id of a transaction, other than the
+    caller's, that may still commit.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE OR REPLACE FUNCTION product_change_seq() RETURNS bigint LANGUAGE sql VOLATILE AS $$
+                SELECT pg_current_xact_id()::text::bigint
+            $$
+            """
+        )
+        # A snapshot's xmin may be the caller's own transaction, whose writes it
+        # sees; when the caller is the newest transaction, xmax is its own id
+        cursor.execute(
+            """
+            CREATE OR REPLACE FUNCTION product_change_horizon() RETURNS bigint LANGUAGE sql VOLATILE AS $$
+                WITH s AS (SELECT pg_current_snapshot() AS snap, pg_current_xact_id_if_assigned() AS own)
+                SELECT LEAST(
+                    (SELECT MIN(x::text::bigint) FROM s, pg_snapshot_xip(s.snap) AS x WHERE x IS DISTINCT FROM s.own),
+                    (SELECT pg_snapshot_xmax(s.snap)::text::bigint
+                            + CASE WHEN s.own = pg_snapshot_xmax(s.snap) THEN 1 ELSE 0 END FROM s)
+                )
+            $$
+            """
+        )
+
+
+def drop_functions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP FUNCTION IF EXISTS product_change_seq()')
+        cursor.execute('DROP FUNCTION IF EXISTS product_change_horizon()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0022_archive_tables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'change_counter',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('change_seq', models.BigIntegerField()),
+                ('archived', models.BooleanField(default=False)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'product_tombstone',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedproduct',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['change_seq', 'id'], name='product_change_seq_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producttombstone',
+            index=models.Index(fields=['change_seq', 'id'], name='product_tombstone_seq_id_idx'),
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+        migrations.RunPython(create_functions, drop_functions),
+    ]
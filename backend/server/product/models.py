@@ -1,6 +1,12 @@
-from django.db import models
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connections, models, transaction
 from django.utils import timezone
 from django.conf import settings
+
+from .cache import KEY_FIELDS, barcode_cache
 # Create your models here.
 
 
@@ -14,15 +20,199 @@ class Cargo(models.Model):
         return self.name
 
 
+class LookupValue(models.Model):
+    """
+    Small dictionary table for a repeated product attribute; products store the
+    integer id and the API exposes the name (see product/lookups.py).
+    """
+    name = models.CharField(max_length=50, unique=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Vender(LookupValue):
+    class Meta(LookupValue.Meta):
+        db_table = "vender"
+
+
+class Client(LookupValue):
+    class Meta(LookupValue.Meta):
+        db_table = "client"
+
+
+class Category(LookupValue):
+    class Meta(LookupValue.Meta):
+        db_table = "category"
+
+
+class ChangeCounter(models.Model):
+    """
+    Named, monotonically increasing counter. Off PostgreSQL, product writes take
+    the next value of 'product' inside their own transaction, so the row lock
+    orders change numbers by commit (see next_change_seq and product/changes.py).
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "change_counter"
+
+    @classmethod
+    def next(cls, name, using=None):
+        """
+        Increment and return the counter; call inside a transaction, which then
+        holds the row lock until it commits
+        """
+        manager = cls.objects.db_manager(using)
+        if not manager.filter(name=name).update(value=models.F('value') + 1):
+            manager.get_or_create(name=name)
+            manager.filter(name=name).update(value=models.F('value') + 1)
+        return manager.filter(name=name).values_list('value', flat=True).get()
+
+
+def next_change_seq(using=None):
+    """
+    Change number for a product write; call inside the writing transaction.
+
+    On PostgreSQL it is the writing transaction's id (product_change_seq(),
+    migration 0023), so concurrent writers take no lock; readers only trust
+    numbers below product_change_horizon(), where every transaction has
+    finished. Elsewhere it is ChangeCounter('product'), whose row lock makes
+    writers commit in number order.
+    """
+    connection = connections[using or 'default']
+    if connection.vendor != 'postgresql':
+        return ChangeCounter.next('product', using)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT product_change_seq()')
+        return cursor.fetchone()[0]
+
+
+# Seconds the oldest product date is reused for the windows of date-ascending lists
+OLDEST_DATE_TTL = 300
+_oldest_date = {'expires': 0.0, 'value': None}
+_oldest_date_lock = threading.Lock()
+
+
+def recent_cutoff():
+    """
+    First day of the last PRODUCT_RECENT_DAYS (None when 0). Scanner lookups and
+    list pages look there before reading the whole table: with monthly partitions
+    (product/partitioning.py) the date predicate reads only the newest partitions.
+    """
+    days = settings.PRODUCT_RECENT_DAYS
+    return timezone.localdate() - timedelta(days=days) if days > 0 else None
+
+
+def oldest_product_date():
+    with _oldest_date_lock:
+        if _oldest_date['expires'] > time.monotonic():
+            return _oldest_date['value']
+    value = Product.objects.aggregate(oldest=models.Min('date'))['oldest']
+    with _oldest_date_lock:
+        _oldest_date.update(expires=time.monotonic() + OLDEST_DATE_TTL, value=value)
+    return value
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Stamps a fresh change_seq on every bulk update and leaves a tombstone for
+    every bulk delete, so the changes endpoint sees writes made with
+    QuerySet.update()/delete() as well as Model.save()/delete().
+    """
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            kwargs['change_seq'] = next_change_seq(self.db)
+            if KEY_FIELDS & set(kwargs):
+                # Rare (bulk edits of barcodes/so_numbers); status updates leave the cache alone
+                barcode_cache.clear()
+            return super().update(**kwargs)
+
+    def touch(self):
+        """
+        Mark the products changed without modifying them (e.g. their photos changed)
+        """
+        return self.update()
+
+    def recent_first(self):
+        """
+        These products received in the last PRODUCT_RECENT_DAYS if there are any,
+        else all of them (an extra query only on a miss)
+        """
+        cutoff = recent_cutoff()
+        if cutoff is not None:
+            recent = self.filter(date__gte=cutoff)
+            if recent.exists():
+                return recent
+        return self
+
+    def date_window(self):
+        """
+        For a queryset ordered by date, a date-bounded part holding every row that
+        sorts before the rest: descending, the last PRODUCT_RECENT_DAYS; ascending,
+        PRODUCT_RECENT_DAYS from the oldest product (its date cached OLDEST_DATE_TTL
+        seconds; any bound gives a valid window, a stale one just holds fewer or more
+        rows). None otherwise.
+        """
+        order = self.query.order_by
+        days = settings.PRODUCT_RECENT_DAYS
+        if days <= 0 or not order or order[0] not in ('date', '-date'):
+            return None
+        if order[0] == '-date':
+            return self.filter(date__gte=recent_cutoff())
+        oldest = oldest_product_date()
+        if oldest is None:
+            return None
+        return self.filter(date__lt=oldest + timedelta(days=days))
+
+    def window_slice(self, start, stop):
+        """
+        list(self[start:stop]), read from date_window() when the slice lies inside it;
+        the unbounded query runs only when the window holds too few rows
+        """
+        window = self.date_window()
+        if window is not None:
+            rows = list(window[start:stop])
+            if len(rows) == stop - start:
+                return rows
+        return list(self[start:stop])
+
+    def delete(self, archived=False):
+        with transaction.atomic(using=self.db):
+            seq = next_change_seq(self.db)
+            ids = list(self.values_list('id', flat=True))
+            barcode_cache.invalidate(product_ids=ids)
+            ProductTombstone.objects.using(self.db).bulk_create(
+                [ProductTombstone(id=pk, change_seq=seq, archived=archived) for pk in ids],
+                update_conflicts=True, unique_fields=['id'], update_fields=['change_seq', 'archived', 'deleted_at'],
+            )
+            return models.QuerySet.delete(self.model._base_manager.using(self.db).filter(id__in=ids))
+
+
+# Columns the list endpoint sorts (see product.views.SORTABLE_FIELDS); each gets a (column, id)
+# index so an ordered page is an index scan + LIMIT. The vender/client/category filters get none:
+# every index slows each product write, and those filters are combined with date ranges.
+SORT_INDEX_FIELDS = [
+    'date', 'ex_date', 'so_number', 'barcode', 'number', 'qty', 'weight',
+    'current_status', 'cargo', 'created_by',
+]
+
+
 class Product(models.Model):
     # 移除 id 定義，讓 Django 自動處理
     number = models.CharField(max_length=50, default='', blank=True, null=True)
     barcode = models.CharField(max_length=50)  # 必填
     qty = models.IntegerField(default=0, blank=True, null=True)
     date = models.DateField()  # 必填
-    vender = models.CharField(max_length=10, default='', blank=True, null=True)
-    client = models.CharField(max_length=10, default='', blank=True, null=True)
-    category = models.CharField(max_length=20, default='', blank=True, null=True)
+    vender = models.ForeignKey(Vender, on_delete=models.PROTECT, null=True, blank=True, related_name='products', db_index=False)
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, null=True, blank=True, related_name='products', db_index=False)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, null=True, blank=True, related_name='products', db_index=False)
     so_number = models.CharField(max_length=100)  # 必填
     weight = models.IntegerField(default=0, blank=True, null=True)
     noted = models.TextField(max_length=300, default='', blank=True, null=True)
@@ -34,7 +224,8 @@ class Product(models.Model):
         null=True,
         blank=True,
         related_name='products',
-        verbose_name='Created By'
+        verbose_name='Created By',
+        db_index=False,  # covered by product_created_by_id_idx
     )
     cargo = models.ForeignKey(
         Cargo,
@@ -42,21 +233,127 @@ class Product(models.Model):
         null=True,
         blank=True,
         related_name='products',
-        verbose_name='Cargo'
+        verbose_name='Cargo',
+        db_index=False,  # covered by product_cargo_id_idx
     )
+    # next_change_seq() of the last write; the delta-sync cursor
+    change_seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         db_table = "product"
+        indexes = [
+            models.Index(fields=[field, 'id'], name=f'product_{field}_id_idx')
+            for field in SORT_INDEX_FIELDS
+        ] + [models.Index(fields=['change_seq', 'id'], name='product_change_seq_id_idx')]
 
     def __str__(self):
         return self.number
 
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or 'default'
+        with transaction.atomic(using=using):
+            self.change_seq = next_change_seq(using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'change_seq'}
+            super().save(*args, **kwargs)
+            barcode_cache.invalidate(product_ids=[self.pk], barcodes=[self.barcode])
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or 'default'
+        with transaction.atomic(using=using):
+            seq = next_change_seq(using)
+            ProductTombstone.objects.using(using).update_or_create(id=self.pk, defaults={'change_seq': seq})
+            barcode_cache.invalidate(product_ids=[self.pk])
+            return super().delete(*args, **kwargs)
+
+
+class ProductTombstone(models.Model):
+    """
+    Id and change_seq of a product removed from the `product` table (deleted, or
+    moved to the archive), so delta-sync clients can drop their copy.
+    """
+    id = models.BigIntegerField(primary_key=True)  # the product's id
+    change_seq = models.BigIntegerField()
+    archived = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "product_tombstone"
+        indexes = [models.Index(fields=['change_seq', 'id'], name='product_tombstone_seq_id_idx')]
+
 class Photo(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="photos")
     path = models.ImageField(upload_to='')
+    # Copy of product.date: the partition key when photo is partitioned (product/partitioning.py)
+    product_date = models.DateField(null=True, blank=True, editable=False)
 
     class Meta:
         db_table = "photo"
 
+    def save(self, *args, **kwargs):
+        if self.product_date is None and self.product_id is not None:
+            self.product_date = self.product.date
+        with transaction.atomic(using=kwargs.get('using') or 'default'):
+            # Photos are part of the product's representation
+            Product.objects.filter(pk=self.product_id).touch()
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or 'default'):
+            Product.objects.filter(pk=self.product_id).touch()
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"Photo for {self.product.number} at {self.path}"
+
+
+class ArchivedProduct(models.Model):
+    """
+    Shipped product moved out of the hot `product` table by
+    `manage.py archive_products` (product/archive.py). Keeps the original id
+    and columns so archived rows serialize exactly like live ones.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    number = models.CharField(max_length=50, default='', blank=True, null=True)
+    barcode = models.CharField(max_length=50)
+    qty = models.IntegerField(default=0, blank=True, null=True)
+    date = models.DateField()
+    vender = models.ForeignKey(Vender, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_products')
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_products')
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_products')
+    so_number = models.CharField(max_length=100)
+    weight = models.IntegerField(default=0, blank=True, null=True)
+    noted = models.TextField(max_length=300, default='', blank=True, null=True)
+    current_status = models.CharField(max_length=1, default='1', blank=True, null=True)
+    ex_date = models.DateField(blank=True, null=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_products'
+    )
+    cargo = models.ForeignKey(Cargo, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_products')
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "product_archive"
+        indexes = [
+            models.Index(fields=['date', 'id'], name='product_archive_date_id_idx'),
+            models.Index(fields=['ex_date', 'id'], name='product_archive_exdate_id_idx'),
+        ]
+
+    def __str__(self):
+        return self.number
+
+
+class ArchivedPhoto(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(ArchivedProduct, on_delete=models.CASCADE, related_name="photos")
+    path = models.ImageField(upload_to='')
+    product_date = models.DateField(null=True, blank=True, editable=False)
+
+    class Meta:
+        db_table = "photo_archive"
+
+    def __str__(self):
+        return f"Archived photo for {self.product.number} at {self.path}"
@@ -0,0 +1,237 @@
+"""
+Optional monthly range partitioning of product (by date) and photo (by
+product_date) on PostgreSQL, driven by `manage.py partition_products`.
+
+A partitioned table keeps its name, columns and secondary indexes, so Django
+sees no difference. Postgres requires the partition key in every unique
+constraint, so the primary key becomes (id, <key>). That has two effects:
+- ids come from a plain sequence;
+- a foreign key into the table must include the key. photo carries
+  product_date for this, so photo -> product becomes
+  (product_id, product_date) -> product (id, date), MATCH FULL and
+  ON UPDATE CASCADE, so a product's date change moves its photos along.
+  A table referencing a converted table without such a <table>_<key> column
+  stops the conversion. Foreign keys into a partitioned table need
+  PostgreSQL 12; date changes that move a row to another partition run the
+  ON UPDATE action only from PostgreSQL 15, which is therefore required.
+Rows outside the created months land in <table>_default until `--extend`
+creates their month.
+"""
+from datetime import date
+
+# table -> partition key column, in conversion order (photo references product)
+PARTITION_KEYS = {'product': 'date', 'photo': 'product_date'}
+
+# Cross-partition updates run foreign key ON UPDATE actions from this version on
+MIN_SERVER_VERSION = 150000
+
+
+def add_months(day, months):
+    years, month = divmod(day.month - 1 + months, 12)
+    return date(day.year + years, month + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(connection, table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+            """,
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(connection, table):
+    """
+    Names of the partitions of `table`, oldest first
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace
+            ORDER BY c.relname
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_month_partition(connection, table, month):
+    """
+    Create the partition for `month`, moving any rows for it out of the default
+    partition first (Postgres refuses to attach a range the default still holds).
+    Must run inside a transaction.
+    """
+    q = connection.ops.quote_name
+    column = PARTITION_KEYS[table]
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    default = q(f'{table}_default')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE _partition_moved AS SELECT * FROM {default} WHERE {q(column)} >= %s AND {q(column)} < %s',
+            [start, end],
+        )
+        cursor.execute(f'DELETE FROM {default} WHERE {q(column)} >= %s AND {q(column)} < %s', [start, end])
+        cursor.execute(
+            f"CREATE TABLE {q(partition_name(table, month))} PARTITION OF {q(table)} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+        cursor.execute(f'INSERT INTO {q(table)} SELECT * FROM _partition_moved')
+        cursor.execute('DROP TABLE _partition_moved')
+
+
+def ensure_partitions(connection, table, first_month, last_month):
+    """
+    Create every missing monthly partition in [first_month, last_month]; returns the names created
+    """
+    existing = set(partitions(connection, table))
+    created = []
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        name = partition_name(table, month)
+        if name not in existing:
+            create_month_partition(connection, table, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def convert_table(connection, table, months_ahead=3, keep_old=False, log=print):
+    """
+    Rebuild an ordinary table as a monthly range-partitioned table with the same
+    name, columns, indexes and outgoing foreign keys. Foreign keys into it are
+    recreated over (<fk>, <table>_<key>), after that column is brought in line
+    with the referenced rows. Holds an ACCESS EXCLUSIVE lock for the whole copy,
+    so run it in a maintenance window. Must run inside a transaction.
+    """
+    q = connection.ops.quote_name
+    column = PARTITION_KEYS[table]
+    old = f'{table}_unpartitioned'
+    if connection.pg_version < MIN_SERVER_VERSION:
+        raise ValueError('Table partitioning requires PostgreSQL 15 or later')
+    with connection.cursor() as cursor:
+        # Check Django's deferred foreign keys now: ALTER TABLE refuses tables with pending trigger events
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE {q(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT COUNT(*) FROM {q(table)} WHERE {q(column)} IS NULL')
+        if cursor.fetchone()[0]:
+            raise ValueError(f'{table}.{column} has NULL values; the partition key must be set on every row')
+
+        # Secondary indexes, to be recreated on the partitioned table
+        cursor.execute(
+            """
+            SELECT i.indexname, i.indexdef FROM pg_indexes i
+            WHERE i.schemaname = current_schema() AND i.tablename = %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_constraint c
+                  WHERE c.conindid = (quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass
+              )
+            """,
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_constraint c WHERE c.conrelid = %s::regclass AND c.contype = 'f' AND c.conparentid = 0
+            """,
+            [table],
+        )
+        outgoing = cursor.fetchall()
+        # Foreign keys into this table must include the partition key: (id) alone is no longer unique
+        cursor.execute(
+            """
+            SELECT c.conname, c.conrelid::regclass::text, a.attname, EXISTS (
+                SELECT 1 FROM pg_attribute k
+                WHERE k.attrelid = c.conrelid AND k.attname = %s AND NOT k.attisdropped
+            )
+            FROM pg_constraint c JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+            WHERE c.confrelid = %s::regclass AND c.contype = 'f' AND c.conparentid = 0
+            """,
+            [f'{table}_{column}', table],
+        )
+        incoming = cursor.fetchall()
+        key_column = f'{table}_{column}'
+        for name, referencing, fk_column, has_key in incoming:
+            if not has_key:
+                raise ValueError(
+                    f'{referencing}.{fk_column} references {table} but has no {key_column} column; '
+                    f'its foreign key could not be kept on the partitioned table'
+                )
+        for name, referencing, fk_column, _ in incoming:
+            cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {q(name)}')
+            cursor.execute(
+                f'UPDATE {referencing} r SET {q(key_column)} = t.{q(column)} FROM {q(table)} t '
+                f'WHERE t.id = r.{q(fk_column)} AND r.{q(key_column)} IS DISTINCT FROM t.{q(column)}'
+            )
+            if cursor.rowcount:
+                log(f'Set {referencing}.{key_column} on {cursor.rowcount:,} row(s) to match {table}.{column}')
+
+        cursor.execute(f'SELECT MIN({q(column)}), COALESCE(MAX(id), 0) FROM {q(table)}')
+        first_day, max_id = cursor.fetchone()
+
+        # Move the old table aside and free the names the new one needs
+        cursor.execute(f'ALTER TABLE {q(table)} RENAME TO {q(old)}')
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [old])
+        for (pkey,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {q(old)} RENAME CONSTRAINT {q(pkey)} TO {q(old + "_pkey")}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {q(name)} RENAME TO {q(name[:59] + "_old")}')
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'", [old]
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f'ALTER TABLE {q(old)} ALTER COLUMN id DROP IDENTITY')
+        else:
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [old, 'id'])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE {q(old)} ALTER COLUMN id DROP DEFAULT')
+            if sequence:
+                cursor.execute(f'DROP SEQUENCE {sequence}')
+
+        cursor.execute(
+            f'CREATE TABLE {q(table)} (LIKE {q(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+            f'PARTITION BY RANGE ({q(column)})'
+        )
+        cursor.execute(f'ALTER TABLE {q(table)} ALTER COLUMN {q(column)} SET NOT NULL')
+        cursor.execute(f'ALTER TABLE {q(table)} ADD PRIMARY KEY (id, {q(column)})')
+        sequence = q(f'{table}_id_seq')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {q(table)}.id')
+        cursor.execute(f"SELECT setval('{table}_id_seq', %s, %s)", [max(max_id, 1), max_id > 0])
+        cursor.execute(f"ALTER TABLE {q(table)} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        cursor.execute(f'CREATE TABLE {q(table + "_default")} PARTITION OF {q(table)} DEFAULT')
+
+    today = date.today()
+    created = ensure_partitions(connection, table, first_day or today, add_months(today, months_ahead))
+    log(f'Created {len(created)} monthly partition(s) of {table}')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {q(table)} SELECT * FROM {q(old)}')
+        log(f'Copied {cursor.rowcount:,} row(s) into partitioned {table}')
+        for name, definition in indexes:
+            # indexdef still names the original table, which is now the partitioned one
+            cursor.execute(definition)
+        for name, definition in outgoing:
+            cursor.execute(f'ALTER TABLE {q(table)} ADD CONSTRAINT {q(name)} {definition}')
+        for name, referencing, fk_column, _ in incoming:
+            cursor.execute(
+                f'ALTER TABLE {referencing} ADD CONSTRAINT {q(name)} '
+                f'FOREIGN KEY ({q(fk_column)}, {q(key_column)}) REFERENCES {q(table)} (id, {q(column)}) '
+                f'MATCH FULL ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED'
+            )
+            log(f'Recreated foreign key {name} as {referencing} ({fk_column}, {key_column}) -> {table} (id, {column})')
+        cursor.execute(f'ANALYZE {q(table)}')
+        if keep_old:
+            log(f'Kept the previous table as {old}')
+        else:
+            cursor.execute(f'DROP TABLE {q(old)}')
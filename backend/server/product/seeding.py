@@ -0,0 +1,297 @@
+"""
+Fast synthetic data loading for staging and benchmark databases.
+
+Used by `manage.py seed_inventory`, benchmarks.dataset and add_default_cargos.py.
+Row generation is deterministic for a given seed; models are imported lazily
+so the naming helpers can be used without configuring Django.
+"""
+import io
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+DEFAULT_CARGOS = [
+    "Air Freight",
+    "Sea Freight",
+    "Express Courier",
+    "Ground Shipping",
+    "Rail Freight",
+    "Warehouse Storage",
+]
+VENDERS = ['TGT', 'ACME', 'NOVA', 'ZEN', 'ORB', 'KITE', 'LUX', 'PIKE']
+CLIENTS = ['VZ', 'R2', 'N1', 'AMZ', 'WMT', 'BBY']
+CATEGORIES = ['RAM', 'CPU', 'SSD', 'HDD', 'GPU', 'PSU', 'MB', 'WIP']
+NOTES = ['', '', '', 'fragile', 'damaged box', 'recount']
+SEED_PASSWORD = 'seed-password'
+SEED_PHOTO_DIR = 'seed'
+ITEMS_PER_SO = 3
+
+
+def barcode_for(i):
+    return f'BC{i:010d}'
+
+
+def so_number_for(i, items_per_so=ITEMS_PER_SO):
+    return f'SO{i // items_per_so:09d}'
+
+
+def operator_username(i):
+    return f'seed_op_{i:03d}'
+
+
+def cargo_name(i):
+    return f'Seed Cargo {i:03d}'
+
+
+def product_rows(count, seed=42, start_date=date(2022, 1, 1), days=1000, shipped_ratio=0.7,
+                 photos_per_product=1.0, offset=0):
+    """
+    Yield (fields, user_index, cargo_index, photo_count) per product in a stable order.
+    `offset` shifts barcodes/so_numbers so repeated seeds do not collide.
+    """
+    rng = random.Random(seed)
+    whole = int(photos_per_product)
+    fraction = photos_per_product - whole
+    for n in range(count):
+        i = offset + n
+        received = start_date + timedelta(days=(n * days) // max(count, 1))
+        shipped = rng.random() < shipped_ratio
+        fields = {
+            'number': f'N{rng.randrange(10 ** 6):06d}',
+            'barcode': barcode_for(i),
+            'qty': rng.randrange(1, 50),
+            'date': received,
+            'vender': rng.choice(VENDERS),
+            'client': rng.choice(CLIENTS),
+            'category': rng.choice(CATEGORIES),
+            'so_number': so_number_for(i),
+            'weight': rng.randrange(1, 500),
+            'noted': rng.choice(NOTES),
+            'current_status': '1' if shipped else '0',
+            'ex_date': received + timedelta(days=rng.randrange(1, 90)) if shipped else None,
+        }
+        photo_count = whole + (1 if rng.random() < fraction else 0)
+        yield fields, rng.randrange(10 ** 6), rng.randrange(10 ** 6), photo_count
+
+
+def placeholder_jpeg():
+    """
+    Bytes of a small valid JPEG (Pillow is already required by Photo.path)
+    """
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 200, 200)).save(buffer, format='JPEG', quality=50)
+    return buffer.getvalue()
+
+
+def seed_cargos(extra=0):
+    """
+    Insert DEFAULT_CARGOS plus `extra` synthetic cargos; returns all their ids
+    """
+    from .models import Cargo
+    names = DEFAULT_CARGOS + [cargo_name(i) for i in range(extra)]
+    Cargo.objects.bulk_create([Cargo(name=name) for name in names], ignore_conflicts=True)
+    return list(Cargo.objects.filter(name__in=names).order_by('id').values_list('id', flat=True))
+
+
+def seed_lookups():
+    """
+    Insert the vender/client/category vocabularies; returns {field: {name: id}}
+    """
+    from .lookups import lookup_cache
+    from .models import Category, Client, Vender
+    return {
+        'vender': lookup_cache.ids_for(Vender, VENDERS),
+        'client': lookup_cache.ids_for(Client, CLIENTS),
+        'category': lookup_cache.ids_for(Category, CATEGORIES),
+    }
+
+
+def with_lookup_ids(fields, lookup_ids):
+    """
+    Replace the lookup names produced by product_rows with *_id columns
+    """
+    for field, ids in lookup_ids.items():
+        fields[f'{field}_id'] = ids[fields.pop(field)]
+    return fields
+
+
+def seed_users(count, password=SEED_PASSWORD):
+    """
+    Insert operator users (role n_user) sharing one pre-computed password hash
+    """
+    from django.contrib.auth.hashers import make_password
+    from account.models import CustomUser
+    hashed = make_password(password)
+    names = [operator_username(i) for i in range(count)]
+    CustomUser.objects.bulk_create(
+        [CustomUser(username=name, password=hashed, role='n_user') for name in names],
+        ignore_conflicts=True,
+    )
+    return list(CustomUser.objects.filter(username__in=names).order_by('id').values_list('id', flat=True))
+
+
+class PostgresBulkLoad:
+    """
+    Drop secondary indexes on the given tables for the duration of a load and
+    rebuild them afterwards (one sorted build instead of per-row maintenance).
+    No-op on other databases.
+    """
+
+    def __init__(self, connection, tables, stdout=None):
+        self.connection = connection
+        self.tables = tables
+        self.stdout = stdout
+        self.dropped = []
+
+    def _log(self, message):
+        if self.stdout:
+            self.stdout.write(message + '\n')
+
+    def __enter__(self):
+        if self.connection.vendor != 'postgresql' or not self.tables:
+            return self
+        with self.connection.cursor() as cursor:
+            # Indexes backing a PK/unique constraint stay; they guard correctness
+            cursor.execute(
+                """
+                SELECT i.indexname, i.indexdef FROM pg_indexes i
+                WHERE i.schemaname = current_schema() AND i.tablename = ANY(%s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM pg_constraint c
+                      WHERE c.conindid = (quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass
+                  )
+                """,
+                [list(self.tables)],
+            )
+            self.dropped = cursor.fetchall()
+            for name, _ in self.dropped:
+                cursor.execute(f'DROP INDEX IF EXISTS {self.connection.ops.quote_name(name)}')
+            cursor.execute('SET synchronous_commit TO off')
+        self._log(f'Dropped {len(self.dropped)} secondary index(es) on {", ".join(self.tables)}')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.connection.vendor != 'postgresql' or not self.tables:
+            return False
+        with self.connection.cursor() as cursor:
+            cursor.execute('SET synchronous_commit TO DEFAULT')
+            for name, definition in self.dropped:
+                started = time.perf_counter()
+                cursor.execute(definition)
+                self._log(f'Rebuilt {name} in {time.perf_counter() - started:.1f}s')
+            for table in self.tables:
+                cursor.execute(f'ANALYZE {self.connection.ops.quote_name(table)}')
+        return False
+
+
+def reset_sequence(connection, model):
+    """
+    Move the id sequence past explicitly assigned ids (Postgres only)
+    """
+    if connection.vendor != 'postgresql':
+        return
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {connection.ops.quote_name(table)}), 1))",
+            [table],
+        )
+
+
+def write_photo_files(paths, media_root, content):
+    """
+    Write `content` to every path (relative to media_root)
+    """
+    for path in paths:
+        with open(os.path.join(media_root, path), 'wb') as fh:
+            fh.write(content)
+    return len(paths)
+
+
+def seed_inventory(products, photos_per_product=1.0, cargos=10, users=5, seed=42, batch_size=10000,
+                   photo_files=True, photo_workers=8, drop_indexes=True, media_root=None, stdout=None):
+    """
+    Bulk-load a synthetic inventory and return a manifest describing it
+    """
+    from django.db import connection, transaction
+    from .models import Photo, Product
+
+    started = time.perf_counter()
+    cargo_ids = seed_cargos(cargos)
+    user_ids = seed_users(users)
+    lookup_ids = seed_lookups()
+    media_root = media_root or os.getenv('MEDIA_ROOT', r'D:\workplace\Images')
+
+    # Explicit ids let photos reference products without a RETURNING round trip
+    next_id = (Product.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    next_photo_id = (Photo.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    first_id = next_id
+    offset = Product.objects.filter(barcode__startswith='BC').count()
+    photo_total = 0
+
+    tables = [Product._meta.db_table, Photo._meta.db_table] if drop_indexes else []
+    content = placeholder_jpeg() if photo_files else None
+    if photo_files:
+        os.makedirs(os.path.join(media_root, SEED_PHOTO_DIR), exist_ok=True)
+    pending_files = []
+
+    # Image files are written by the pool while the next batches are inserted
+    with ThreadPoolExecutor(max_workers=max(1, photo_workers)) as pool, PostgresBulkLoad(connection, tables, stdout):
+        batch, photos, photo_paths = [], [], []
+
+        def flush():
+            nonlocal photo_total
+            with transaction.atomic():
+                Product.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+                Photo.objects.bulk_create(photos, batch_size=batch_size, ignore_conflicts=True)
+            photo_total += len(photos)
+            if photo_files:
+                for i in range(0, len(photo_paths), 500):
+                    pending_files.append(pool.submit(write_photo_files, photo_paths[i:i + 500], media_root, content))
+            batch.clear()
+            photos.clear()
+            photo_paths.clear()
+
+        rows = product_rows(products, seed=seed, photos_per_product=photos_per_product, offset=offset)
+        for n, (fields, user_index, cargo_index, photo_count) in enumerate(rows, start=1):
+            product_id = next_id
+            next_id += 1
+            batch.append(Product(
+                id=product_id,
+                created_by_id=user_ids[user_index % len(user_ids)] if user_ids else None,
+                cargo_id=cargo_ids[cargo_index % len(cargo_ids)] if cargo_ids else None,
+                **with_lookup_ids(fields, lookup_ids),
+            ))
+            for k in range(1, photo_count + 1):
+                path = f"{SEED_PHOTO_DIR}/{fields['so_number']}_{product_id}_{k}.jpg"
+                photos.append(Photo(id=next_photo_id, product_id=product_id, product_date=fields['date'], path=path))
+                photo_paths.append(path)
+                next_photo_id += 1
+            if len(batch) >= batch_size:
+                flush()
+                if stdout and n % (batch_size * 10) == 0:
+                    stdout.write(f'  {n:,} products ({time.perf_counter() - started:.0f}s)\n')
+        if batch:
+            flush()
+        files_written = sum(future.result() for future in pending_files)
+
+    reset_sequence(connection, Product)
+    reset_sequence(connection, Photo)
+
+    return {
+        'products': products,
+        'first_id': first_id,
+        'last_id': next_id - 1,
+        'barcode_offset': offset,
+        'photos': photo_total,
+        'photo_files': files_written,
+        'cargos': cargo_ids,
+        'users': [operator_username(i) for i in range(users)],
+        'seed': seed,
+        'items_per_so': ITEMS_PER_SO,
+        'categories': CATEGORIES,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
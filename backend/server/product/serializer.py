@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.conf import settings
-from .models import Product, Photo, Cargo
+from .models import Product, Photo, Cargo, Vender, Client, Category
+from .lookups import LookupNameField, resolve_lookups
+from .media import signed_photo_path
+from account.cache import username_cache
 import os
 
 
@@ -21,24 +24,25 @@ class PhotoSerializer(serializers.ModelSerializer):
         """
         Return the full URL to access the photo.
         Uses PUBLIC_DOMAIN from settings or falls back to request host.
+        With MEDIA_PROTECTED this is a signed URL of the authenticated file endpoint.
         """
         if not obj.path:
             return None
+        media_path = signed_photo_path(obj.id) if settings.MEDIA_PROTECTED else obj.path.url
 
         # Get the public domain from environment or use request host
         public_domain = os.getenv('PUBLIC_DOMAIN', '')
 
         if public_domain:
             # Use the configured public domain
-            media_path = obj.path.url  # e.g., /media/so123_1.png
             return f"{public_domain}{media_path}"
         else:
             # Fallback to request-based URL building
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.path.url)
+                return request.build_absolute_uri(media_path)
             else:
-                return obj.path.url
+                return media_path
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -47,9 +51,9 @@ class ProductSerializer(serializers.ModelSerializer):
     cargo_name = serializers.SerializerMethodField(read_only=True)
 
     number = serializers.CharField(required=False, allow_blank=True, allow_null=True)
-    vender = serializers.CharField(required=False, allow_blank=True, allow_null=True)
-    client = serializers.CharField(required=False, allow_blank=True, allow_null=True)
-    category = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    vender = LookupNameField(Vender, required=False, allow_null=True)
+    client = LookupNameField(Client, required=False, allow_null=True)
+    category = LookupNameField(Category, required=False, allow_null=True)
     so_number = serializers.CharField(required=True, allow_blank=False, allow_null=False)
     barcode = serializers.CharField(required=True, allow_blank=False, allow_null=False)
     date = serializers.DateField(required=True, allow_null=False)
@@ -64,11 +68,38 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = '__all__'
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        fields: names to keep (see views.requested_fields); None keeps them all
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def create(self, validated_data):
+        return super().create(resolve_lookups(self, validated_data))
+
+    def update(self, instance, validated_data):
+        old_date = instance.date
+        instance = super().update(instance, resolve_lookups(self, validated_data))
+        if instance.date != old_date:
+            # Keep the photo partition key in step with the product
+            Photo.objects.filter(product=instance).update(product_date=instance.date)
+        return instance
+
     def get_created_by_username(self, obj):
         """
         Return the username of the user who created this product.
         Returns 'Unknown' if no user is assigned.
         """
+        if obj.created_by_id is None:
+            return 'Unknown'
+        # Scanner operators are few; avoid loading the user row when the name is already cached
+        if not Product.created_by.is_cached(obj):
+            username = username_cache.username_for(obj.created_by_id)
+            if username:
+                return username
         if obj.created_by:
             return obj.created_by.username
         return 'Unknown'
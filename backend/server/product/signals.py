@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .lookups import lookup_cache
+from .models import Cargo, Category, Client, Product, Vender
+
+
+def invalidate_lookup_cache(sender, **kwargs):
+    """
+    Renames and deletes of lookup rows (admin, shell) must not serve stale names
+    """
+    lookup_cache.invalidate(sender)
+
+
+for _model in (Vender, Client, Category, Cargo):
+    post_save.connect(invalidate_lookup_cache, sender=_model, dispatch_uid=f'lookup-save-{_model.__name__}')
+    post_delete.connect(invalidate_lookup_cache, sender=_model, dispatch_uid=f'lookup-delete-{_model.__name__}')
+
+
+# Deleting a cargo or user nulls Product.cargo / created_by with a plain UPDATE
+# (on_delete=SET_NULL) that stamps no change number; stamp the products first, in
+# the same transaction, so delta-sync clients pick the change up
+
+def touch_cargo_products(sender, instance, **kwargs):
+    Product.objects.filter(cargo=instance).touch()
+
+
+def touch_created_products(sender, instance, **kwargs):
+    Product.objects.filter(created_by=instance).touch()
+
+
+pre_delete.connect(touch_cargo_products, sender=Cargo, dispatch_uid='changes-cargo-delete')
+pre_delete.connect(touch_created_products, sender=settings.AUTH_USER_MODEL, dispatch_uid='changes-user-delete')
@@ -0,0 +1,76 @@
+"""
+Background jobs of the product app (jobs/queue.py), queued by the views:
+
+    product.normalize_photo  re-encode an upload stored as is (create_photo)
+    product.delete_files     remove photo files of deleted photos/products
+    product.export           ?background=1 on /product/export/ and /product/export/columnar/
+    product.bulk_create      large POST /product/products/ lists
+"""
+import os
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.http import QueryDict
+
+from jobs.queue import HIGH, LOW, NORMAL, output_path, task
+from server.renderers import iter_json_array
+from .columnar import FORMATS as COLUMNAR_FORMATS, export_stream
+from . import views
+
+
+@task('product.normalize_photo', priority=HIGH)
+def normalize_photo(photo_id):
+    return views.normalize_stored_photo(photo_id)
+
+
+@task('product.delete_files', priority=LOW)
+def delete_files(names):
+    return views.delete_photo_files(names)
+
+
+@task('product.export', priority=NORMAL)
+def export(params, kind='json'):
+    """
+    Write an export to JOBS_OUTPUT_DIR; the job's download_url serves it
+    """
+    query = QueryDict(mutable=True)
+    for key, values in params.items():
+        query.setlist(key, values)
+    querysets = views.export_querysets(query)
+    if kind == 'json':
+        chunks = iter_json_array(views.export_chunks(querysets, fields=views.requested_fields(query)))
+        content_type, extension = 'application/json', 'json'
+    else:
+        chunks = export_stream(querysets, kind)
+        content_type, extension = COLUMNAR_FORMATS[kind]
+
+    os.makedirs(settings.JOBS_OUTPUT_DIR, exist_ok=True)
+    name = f'export-{uuid.uuid4().hex}.{extension}'
+    path = output_path(name)
+    size = 0
+    # Written under a temporary name so a retry never serves half a file
+    with open(path + '.part', 'wb') as fh:
+        for chunk in chunks:
+            size += fh.write(chunk)
+    os.replace(path + '.part', path)
+    return {
+        'file': name, 'filename': f'products-{datetime.now():%Y%m%d}.{extension}',
+        'content_type': content_type, 'bytes': size,
+    }
+
+
+@task('product.bulk_create', priority=NORMAL)
+def bulk_create(rows, user_id=None):
+    with transaction.atomic():
+        created, errors = views.create_products(rows, user_id=user_id)
+    result = {
+        'success': not errors,
+        'created_count': len(created),
+        'total_count': len(rows),
+        'created_ids': created,
+    }
+    if errors:
+        result['errors'] = errors
+    return result
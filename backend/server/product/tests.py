@@ -1,3 +1,1385 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time as clock
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.functional import lazy
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from account.models import CustomUser
+from jobs.queue import claim, execute
+from server.renderers import FastJSONParser, FastJSONRenderer, iter_json_array
+from . import archive, barcodes, changes, columnar, events, partitioning
+from . import models as product_models
+from .cache import barcode_cache
+from .lookups import LookupCache, lookup_cache
+from .media import signed_photo_path
+from .models import (
+    ArchivedPhoto, ArchivedProduct, Cargo, Category, Client, Photo, Product, ProductTombstone, Vender,
+)
+from .serializer import ProductSerializer
+from .views import create_photo, normalize_product_payload, save_file_safely
+
+
+class LookupFieldTests(TestCase):
+    """
+    vender / client / category stored in lookup tables, exposed by name (product/lookups.py)
+    """
+
+    def setUp(self):
+        # Ids cached by earlier tests point at rows their rollback removed
+        for model in (Vender, Client, Category):
+            lookup_cache.invalidate(model)
+
+    def test_names_round_trip_and_missing_ones_read_as_empty(self):
+        serializer = ProductSerializer(data={'barcode': 'LK1', 'so_number': 'SO-LK1', 'date': '2024-05-01',
+                                             'vender': ' ACME ', 'client': ''})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        product = serializer.save()
+        self.assertEqual(product.vender.name, 'ACME')
+        data = ProductSerializer(Product.objects.get(pk=product.pk)).data
+        self.assertEqual((data['vender'], data['client'], data['category']), ('ACME', '', ''))
+        # Blank names are stored as NULL, not as a lookup row named ''
+        self.assertIsNone(product.client_id)
+        self.assertFalse(Client.objects.filter(name='').exists())
+
+        # Renaming the lookup row is seen on the next read
+        vender = product.vender
+        vender.name = 'ACME Ltd'
+        vender.save()
+        self.assertEqual(ProductSerializer(Product.objects.get(pk=product.pk)).data['vender'], 'ACME Ltd')
+
+    def test_invalid_requests_create_no_lookup_rows(self):
+        serializer = ProductSerializer(data={'barcode': 'LK2', 'so_number': 'SO-LK2', 'date': 'not a date',
+                                             'vender': 'ORPHAN', 'client': 'ORPHAN', 'category': 'ORPHAN'})
+        self.assertFalse(serializer.is_valid())
+        for model in (Vender, Client, Category):
+            self.assertFalse(model.objects.filter(name='ORPHAN').exists())
+
+        serializer = ProductSerializer(data={'barcode': 'LK2', 'so_number': 'SO-LK2', 'date': '2024-05-01',
+                                             'vender': 'V' * 51})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('vender', serializer.errors)
+
+    def test_bulk_payload_blank_lookups_are_null(self):
+        data = normalize_product_payload({'barcode': 'LK4', 'so_number': 'SO-LK4', 'date': '2024-05-01', 'vender': ' '})
+        self.assertEqual((data['vender'], data['client'], data['category']), (None, None, None))
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = LookupCache(ttl=60)
+        vender = Vender.objects.create(name='TTL-OLD')
+        with mock.patch('product.lookups.time.monotonic', return_value=1000.0):
+            self.assertEqual(cache.name_for(Vender, vender.pk), 'TTL-OLD')
+        # Renamed by another worker: no signal reaches this process
+        Vender.objects.filter(pk=vender.pk).update(name='TTL-NEW')
+        with mock.patch('product.lookups.time.monotonic', return_value=1059.0), self.assertNumQueries(0):
+            self.assertEqual(cache.name_for(Vender, vender.pk), 'TTL-OLD')
+            self.assertEqual(cache.ids_for(Vender, ['TTL-OLD']), {'TTL-OLD': vender.pk})
+        with mock.patch('product.lookups.time.monotonic', return_value=1061.0), self.assertNumQueries(1):
+            self.assertEqual(cache.name_for(Vender, vender.pk), 'TTL-NEW')
+
+    def test_update_resolves_names_at_save(self):
+        product = Product.objects.create(barcode='LK3', so_number='SO-LK3', date=date(2024, 5, 1))
+        serializer = ProductSerializer(product, data={'category': 'RAM'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertFalse(Category.objects.filter(name='RAM').exists())
+        serializer.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).category.name, 'RAM')
+
+
+class LookupMigrationTests(TransactionTestCase):
+    """
+    0019_lookup_tables moves the old text columns into lookup tables
+    """
+    before = [('product', '0018_cargo_product_cargo')]
+    after = [('product', '0019_lookup_tables')]
+
+    def tearDown(self):
+        # Back to the latest schema for the tests that follow
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_values_are_copied_exactly(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldProduct = executor.loader.project_state(self.before).apps.get_model('product', 'Product')
+        rows = [('ACME', 'C1', 'RAM'), (' ACME ', 'C1', ''), ('ACME', None, 'RAM'), ('', 'C2', None)]
+        for i, (vender, client, category) in enumerate(rows):
+            OldProduct.objects.create(barcode=f'MG{i}', so_number=f'SO-MG{i}', date=date(2024, 5, 1),
+                                      vender=vender, client=client, category=category)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        NewProduct = apps.get_model('product', 'Product')
+        self.assertEqual(
+            sorted(apps.get_model('product', 'Vender').objects.values_list('name', flat=True)), ['', ' ACME ', 'ACME']
+        )
+        self.assertEqual(sorted(apps.get_model('product', 'Category').objects.values_list('name', flat=True)), ['', 'RAM'])
+        migrated = [
+            NewProduct.objects.values_list('vender__name', 'client__name', 'category__name').get(barcode=f'MG{i}')
+            for i in range(len(rows))
+        ]
+        self.assertEqual(migrated, [tuple(row) for row in rows])
+
+
+class ListSortTests(TestCase):
+    """
+    sortField / sortOrder whitelist of the product list (views.SORTABLE_FIELDS)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='sort-admin', role='admin'))
+        # Ids and names in opposite orders, so sorting by id would give the wrong answer
+        zulu, alpha = Cargo.objects.create(name='ZULU'), Cargo.objects.create(name='ALPHA')
+        walt, anna = CustomUser.objects.create(username='walt'), CustomUser.objects.create(username='anna')
+        self.ids = [
+            Product.objects.create(barcode='S1', so_number='SO-S1', date=date(2024, 5, 3), qty=2, cargo=zulu, created_by=walt).id,
+            Product.objects.create(barcode='S2', so_number='SO-S2', date=date(2024, 5, 1), qty=2, cargo=alpha, created_by=anna).id,
+            Product.objects.create(barcode='S3', so_number='SO-S3', date=date(2024, 5, 2), qty=1, cargo=zulu, created_by=anna).id,
+        ]
+
+    def listed(self, query):
+        response = self.client.get(f'/product/products/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['barcode'] for row in response.json()['results']]
+
+    def test_default_and_column_sorts(self):
+        self.assertEqual(self.listed(''), ['S2', 'S3', 'S1'])
+        self.assertEqual(self.listed('sortField=date&sortOrder=desc'), ['S1', 'S3', 'S2'])
+        # Ties are broken by id, in the same direction
+        self.assertEqual(self.listed('sortField=qty'), ['S3', 'S1', 'S2'])
+        self.assertEqual(self.listed('sortField=qty&sortOrder=desc'), ['S2', 'S1', 'S3'])
+
+    def test_related_names_sort_by_name(self):
+        self.assertEqual(self.listed('sortField=cargo_name'), ['S2', 'S1', 'S3'])
+        self.assertEqual(self.listed('sortField=cargo_name&sortOrder=desc'), ['S3', 'S1', 'S2'])
+        self.assertEqual(self.listed('sortField=created_by_username'), ['S2', 'S3', 'S1'])
+
+    def test_archive_is_merged_in_the_same_order(self):
+        product = Product.objects.get(barcode='S2')
+        ArchivedProduct.objects.create(id=product.id + 100, barcode='S4', so_number='SO-S4', date=date(2024, 5, 4),
+                                       cargo=product.cargo, created_by=product.created_by)
+        self.assertEqual(self.listed('sortField=cargo_name&include_archived=1'), ['S2', 'S4', 'S1', 'S3'])
+
+    def test_unsupported_sorts_are_rejected(self):
+        for query in ('sortField=vender', 'sortField=noted', 'sortField=date&sortOrder=up'):
+            response = self.client.get(f'/product/products/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class FacetTests(TestCase):
+    """
+    Structured filters and ?facets= counts on the product list (views.filter_products / product_facets)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='facet-admin', role='admin'))
+        ram, cpu = Category.objects.create(name='RAM'), Category.objects.create(name='CPU')
+        self.sea = Cargo.objects.create(name='SEA')
+        rows = [('0', ram, self.sea), ('0', ram, None), ('1', cpu, self.sea), ('0', None, None)]
+        for i, (current_status, category, cargo) in enumerate(rows):
+            Product.objects.create(barcode=f'F{i}', so_number=f'SO-F{i}', date=date(2024, 5, i + 1),
+                                   current_status=current_status, category=category, cargo=cargo)
+        ArchivedProduct.objects.create(id=1000, barcode='FA', so_number='SO-FA', date=date(2023, 1, 1),
+                                       current_status='1', category=cpu)
+
+    def get(self, query):
+        response = self.client.get(f'/product/products/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_counts_cover_the_filtered_set(self):
+        data = self.get('facets=status,category,cargo&page_size=1')
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['facets']['status'], [{'value': '0', 'count': 3}, {'value': '1', 'count': 1}])
+        self.assertEqual(sorted((e['value'], e['count']) for e in data['facets']['category']),
+                         [('', 1), ('CPU', 1), ('RAM', 2)])
+        self.assertCountEqual(data['facets']['cargo'],
+                              [{'value': self.sea.id, 'name': 'SEA', 'count': 2}, {'value': None, 'name': None, 'count': 2}])
+
+        data = self.get('facets=category&status=0&date_from=2024-05-02')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(sorted((e['value'], e['count']) for e in data['facets']['category']), [('', 1), ('RAM', 1)])
+
+    def test_filters_by_name_and_archive(self):
+        self.assertEqual(self.get('category=RAM&category=CPU')['count'], 3)
+        self.assertEqual(self.get('category=GPU')['count'], 0)
+        data = self.get('category=CPU&include_archived=1&facets=status')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['facets']['status'], [{'value': '1', 'count': 2}])
+
+    def test_unknown_facets_and_bad_filters_are_rejected(self):
+        for query in ('facets=status,price', 'cargo=SEA', 'date_from=05/01/2024'):
+            self.assertEqual(self.client.get(f'/product/products/?{query}').status_code, 400, query)
+
+
+class SearchTests(TestCase):
+    """
+    ?search= on the list and export endpoints (views.search_products)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='search-admin', role='admin'))
+        Product.objects.create(barcode='MAY-1', so_number='SO-1', date=date(2024, 5, 31))
+        Product.objects.create(barcode='JUN-1', so_number='SO-2', date=date(2024, 6, 1))
+        Product.objects.create(barcode='LBL-2024-05', so_number='SO-3', date=date(2023, 1, 1))
+        Product.objects.create(barcode='OTHER', so_number='SO-4', date=date(2023, 1, 2), number='2024-05-31')
+
+    def found(self, search):
+        response = self.client.get('/product/products/', {'search': search})
+        return sorted(row['barcode'] for row in response.json()['results'])
+
+    def test_date_searches_also_match_text(self):
+        self.assertEqual(self.found('2024-05'), ['LBL-2024-05', 'MAY-1', 'OTHER'])
+        self.assertEqual(self.found('2024-05-31'), ['MAY-1', 'OTHER'])
+        self.assertEqual(self.found('2024-06-01'), ['JUN-1'])
+
+    def test_text_searches(self):
+        self.assertEqual(self.found('jun'), ['JUN-1'])
+        self.assertEqual(self.found('2023-01'), ['LBL-2024-05', 'OTHER'])
+        # Not a real date: falls back to matching the text of the date
+        self.assertEqual(self.found('2024-13'), [])
+        self.assertEqual(self.found('-06-'), ['JUN-1'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Table partitioning requires PostgreSQL')
+class PartitioningTests(TestCase):
+    """
+    manage.py partition_products converts product and photo in place (product/partitioning.py).
+    The DDL is transactional, so each test's conversion is rolled back with it.
+    """
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(barcode=f'PART{i}', so_number=f'SO-PART{i}', date=date(2024, 1 + i, 15))
+            for i in range(3)
+        ]
+        for product in self.products:
+            Photo.objects.create(product=product, path=f'{product.barcode}.jpg')
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('partition_products', *args, stdout=out)
+        return out.getvalue()
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s', [table])
+            return {row[0] for row in cursor.fetchall()}
+
+    def primary_key(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT a.attname FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = %s::regclass AND i.indisprimary ORDER BY a.attnum
+                """,
+                [table],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_conversion_keeps_rows_indexes_and_ids(self):
+        indexes = {table: self.index_names(table) for table in partitioning.PARTITION_KEYS}
+        # A photo whose product_date drifted is realigned before the foreign key includes it
+        Photo.objects.filter(product=self.products[0]).update(product_date=date(2020, 1, 1))
+        output = self.run_command('--months-ahead', '1')
+
+        self.assertIn('Set photo.product_date on 1 row(s)', output)
+        self.assertIn('-> product (id, date)', output)
+        for table, column in partitioning.PARTITION_KEYS.items():
+            self.assertTrue(partitioning.is_partitioned(connection, table))
+            self.assertEqual(self.primary_key(table), ['id', column])
+            # Secondary indexes come back under their own names; the new pkey is (id, key)
+            secondary = {name for name in indexes[table] if not name.endswith('_pkey')}
+            self.assertTrue(secondary)
+            self.assertLessEqual(secondary, self.index_names(table))
+        names = partitioning.partitions(connection, 'product')
+        self.assertEqual(names[:3], ['product_default', 'product_p202401', 'product_p202402'])
+        self.assertEqual(partitioning.partitions(connection, 'photo')[1], 'photo_p202401')
+
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(
+            sorted(Photo.objects.values_list('product_id', 'product_date')),
+            [(product.pk, product.date) for product in self.products],
+        )
+        # New rows take ids after the copied ones and route to their month
+        product = Product.objects.create(barcode='PART-NEW', so_number='SO-PART-NEW', date=date(2024, 2, 1))
+        photo = Photo.objects.create(product=product, path='new.jpg')
+        self.assertGreater(product.pk, max(p.pk for p in self.products))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM photo WHERE id = %s', [photo.pk])
+            self.assertEqual(cursor.fetchone()[0], 'photo_p202402')
+        product.delete()
+        self.assertFalse(Photo.objects.filter(pk=photo.pk).exists())
+
+    def test_photo_foreign_key_survives_conversion(self):
+        self.run_command('--months-ahead', '1')
+        product = self.products[0]
+        # A date change moving the product to another partition carries its photos along
+        Product.objects.filter(pk=product.pk).update(date=date(2024, 3, 1))
+        self.assertEqual(Photo.objects.get(product=product).product_date, date(2024, 3, 1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(
+                    "INSERT INTO photo (product_id, product_date, path) VALUES (%s, %s, 'x.jpg')",
+                    [product.pk, date(2024, 4, 1)],
+                )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute('DELETE FROM product WHERE id = %s', [product.pk])
+
+    def test_reference_without_the_partition_key_stops_the_conversion(self):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE part_ref (id serial PRIMARY KEY, product_id bigint REFERENCES product (id))')
+        with self.assertRaisesMessage(CommandError, 'part_ref.product_id references product but has no product_date'):
+            self.run_command()
+        self.assertFalse(partitioning.is_partitioned(connection, 'product'))
+
+    def test_extend_moves_rows_out_of_the_default_partition(self):
+        self.run_command('--months-ahead', '0')
+        far = date.today().replace(day=1) + timedelta(days=160)
+        stray = Product.objects.create(barcode='PART-FAR', so_number='SO-PART-FAR', date=far)
+        self.assertEqual(Product.objects.raw('SELECT id FROM product_default')[0].pk, stray.pk)
+
+        output = self.run_command('--extend', '--months-ahead', '6')
+        self.assertIn('product: created 6 partition(s)', output)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM product WHERE id = %s', [stray.pk])
+            self.assertEqual(cursor.fetchone()[0], partitioning.partition_name('product', far.replace(day=1)))
+        self.assertIn('product: ', self.run_command('--status'))
+        # Already partitioned: a second conversion only extends
+        self.assertIn('created 0 partition(s)', self.run_command('--months-ahead', '6'))
+
+
+class ArchiveTests(TestCase):
+    """
+    Moving long-shipped products to product_archive (product/archive.py)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='archive-admin', role='admin'))
+        self.cutoff = date(2024, 1, 1)
+        self.old = [
+            Product.objects.create(barcode=f'OLD{i}', so_number=f'SO-OLD{i}', date=date(2023, 1, 1),
+                                   current_status='1', ex_date=date(2023, 6, i + 1), qty=i)
+            for i in range(3)
+        ]
+        Photo.objects.create(product=self.old[0], path='old-0a.jpg')
+        Photo.objects.create(product=self.old[0], path='old-0b.jpg')
+        # Shipped after the cutoff, and in stock with an old ex_date: both stay
+        Product.objects.create(barcode='RECENT', so_number='SO-RECENT', date=date(2023, 1, 1),
+                               current_status='1', ex_date=date(2024, 2, 1))
+        Product.objects.create(barcode='INSTOCK', so_number='SO-INSTOCK', date=date(2023, 1, 1),
+                               current_status='0', ex_date=date(2023, 6, 1))
+
+    def test_batches_move_rows_and_photos(self):
+        self.assertEqual(archive.archive_batch(self.cutoff, 2), (2, 2))
+        self.assertEqual(archive.archive_batch(self.cutoff, 2), (1, 0))
+        self.assertEqual(archive.archive_batch(self.cutoff, 2), (0, 0))
+
+        self.assertEqual(sorted(Product.objects.values_list('barcode', flat=True)), ['INSTOCK', 'RECENT'])
+        moved = ArchivedProduct.objects.get(pk=self.old[2].pk)
+        self.assertEqual(
+            (moved.barcode, moved.qty, moved.ex_date, moved.change_seq),
+            ('OLD2', 2, date(2023, 6, 3), self.old[2].change_seq),
+        )
+        self.assertEqual(
+            sorted(ArchivedPhoto.objects.filter(product_id=self.old[0].pk).values_list('path', flat=True)),
+            ['old-0a.jpg', 'old-0b.jpg'],
+        )
+        self.assertFalse(Photo.objects.exists())
+        self.assertEqual(
+            sorted(ProductTombstone.objects.values_list('id', 'archived')),
+            [(product.pk, True) for product in self.old],
+        )
+
+    def test_archive_products_runs_until_done(self):
+        days = (timezone.localdate() - self.cutoff).days
+        result = archive.archive_products(days, batch_size=2, max_batches=1)
+        self.assertEqual((result['batches'], result['products'], result['photos']), (1, 2, 2))
+        result = archive.archive_products(days, batch_size=2)
+        self.assertEqual((result['cutoff'], result['batches'], result['products']), (self.cutoff, 1, 1))
+
+    def test_readers_see_archived_rows_only_when_asked(self):
+        archive.archive_batch(self.cutoff, 10)
+
+        listed = self.client.get('/product/products/').json()
+        self.assertEqual(listed['count'], 2)
+        listed = self.client.get('/product/products/', {'include_archived': 1}).json()
+        self.assertEqual(listed['count'], 5)
+        archived = next(row for row in listed['results'] if row['barcode'] == 'OLD0')
+        self.assertEqual(len(archived['photos']), 2)
+
+        # Every change (one test transaction shares one change number on PostgreSQL)
+        delta = self.client.get('/product/changes/', {'since': '0'}).json()
+        self.assertEqual(sorted(row['barcode'] for row in delta['changes']), ['INSTOCK', 'RECENT'])
+        self.assertEqual(
+            sorted((row['id'], row['archived']) for row in delta['deleted']),
+            [(product.pk, True) for product in self.old],
+        )
+
+
+class ChangesTests(TransactionTestCase):
+    """
+    Delta sync over /product/changes/ (product/changes.py). Each write commits
+    on its own, as in production: on PostgreSQL a transaction's writes share one number.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='changes-admin', role='admin'))
+        self.products = [
+            Product.objects.create(barcode=f'CH{i}', so_number=f'SO-CH{i}', date=date(2024, 5, 1)) for i in range(3)
+        ]
+        self.ids = [product.pk for product in self.products]
+
+    def sync(self, since='', limit=100):
+        response = self.client.get('/product/changes/', {'since': since, 'limit': limit})
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return [row['barcode'] for row in data['changes']], [row['id'] for row in data['deleted']], data
+
+    def test_pages_then_deltas(self):
+        first, _, page = self.sync(limit=2)
+        self.assertEqual((first, page['has_more']), (['CH0', 'CH1'], True))
+        rest, _, page = self.sync(page['cursor'], limit=2)
+        self.assertEqual((rest, page['has_more']), (['CH2'], False))
+        cursor = page['cursor']
+        self.assertEqual(self.sync(cursor)[:2], ([], []))
+
+        self.products[0].qty = 5
+        self.products[0].save()
+        Product.objects.filter(pk__in=self.ids[1:]).update(current_status='1')
+        changed, _, page = self.sync(cursor)
+        self.assertEqual(changed, ['CH0', 'CH1', 'CH2'])
+        # A bulk update stamps one number on all its rows
+        self.assertEqual(page['changes'][1]['change_seq'], page['changes'][2]['change_seq'])
+        self.assertGreater(page['changes'][1]['change_seq'], page['changes'][0]['change_seq'])
+
+        cursor = page['cursor']
+        self.products[1].delete()
+        Product.objects.filter(pk=self.ids[2]).delete(archived=True)
+        changed, deleted, page = self.sync(cursor)
+        self.assertEqual((changed, deleted), ([], self.ids[1:]))
+        self.assertEqual([row['archived'] for row in page['deleted']], [False, True])
+        # A bare number means everything after that change
+        self.assertEqual(self.sync(cursor.split(':')[0])[1], deleted)
+        # Full downloads carry no tombstones
+        self.assertEqual(self.sync()[:2], (['CH0'], []))
+
+    def test_deleting_a_cargo_stamps_its_products(self):
+        cargo = Cargo.objects.create(name='CHANGES-CARGO')
+        Product.objects.filter(pk=self.ids[0]).update(cargo=cargo)
+        cursor = self.sync()[2]['cursor']
+        cargo.delete()
+        changed, _, page = self.sync(cursor)
+        self.assertEqual((changed, page['changes'][0]['cargo']), (['CH0'], None))
+
+    def test_deleting_a_user_stamps_the_products_they_created(self):
+        user = CustomUser.objects.create(username='changes-clerk')
+        Product.objects.filter(pk=self.ids[1]).update(created_by=user)
+        cursor = self.sync()[2]['cursor']
+        user.delete()
+        changed, _, page = self.sync(cursor)
+        self.assertEqual((changed, page['changes'][0]['created_by']), (['CH1'], None))
+
+    def test_pruned_tombstones_expire_older_cursors(self):
+        cursor = self.sync()[2]['cursor']
+        self.products[0].delete()
+        ProductTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=100))
+        self.products[1].delete()
+        self.assertEqual(changes.prune_tombstones(90), 1)
+        self.assertEqual(list(ProductTombstone.objects.values_list('id', flat=True)), [self.ids[1]])
+
+        response = self.client.get('/product/changes/', {'since': cursor})
+        self.assertEqual((response.status_code, response.json()['resync']), (410, True))
+        floor = changes.tombstone_floor()
+        self.assertEqual(self.client.get('/product/changes/', {'since': f'{floor}:1'}).status_code, 410)
+        self.assertEqual(self.sync(str(floor))[1], [self.ids[1]])
+        self.assertEqual(self.client.get('/product/changes/', {'since': 'x:y'}).status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', 'the change horizon is PostgreSQL only')
+    def test_writes_still_in_flight_hold_back_later_ones(self):
+        cursor = self.sync()[2]['cursor']
+        written, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    product = Product.objects.get(pk=self.ids[0])
+                    product.qty = 1
+                    product.save()
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_writer)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(5))
+            # Numbered after the open transaction and committed first
+            self.products[1].qty = 2
+            self.products[1].save()
+            self.assertEqual(self.sync(cursor)[0], [])
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(self.sync(cursor)[0], ['CH0', 'CH1'])
+
+
+async def next_event(subscription, timeout=1):
+    await asyncio.sleep(0)  # run the callbacks publish()/reset() scheduled on this loop
+    return await subscription.get(timeout)
+
+
+class EventBrokerTests(TestCase):
+    """
+    Subscriptions, Last-Event-ID backlog, overflow and resync (product/events.py)
+    """
+
+    async def test_subscribers_get_published_events(self):
+        broker = events.EventBroker()
+        subscription, backlog = broker.subscribe()
+        self.assertEqual(backlog, [])
+        broker.publish({'type': events.CREATED, 'ids': [1]})
+        seq, event = await next_event(subscription)
+        self.assertEqual((seq, event['type'], event['ids']), (1, 'created', [1]))
+        self.assertIn('ts', event)
+        self.assertIsNone(await next_event(subscription, timeout=0.01))
+
+        self.assertEqual(broker.stats()['subscribers'], 1)
+        broker.unsubscribe(subscription)
+        self.assertEqual((broker.stats()['subscribers'], broker.stats()['published']), (0, 1))
+
+    async def test_backlog_after_last_event_id(self):
+        broker = events.EventBroker(history=3)
+        for pk in range(1, 6):
+            broker.publish({'type': events.UPDATED, 'ids': [pk]})
+
+        def backlog(last_event_id):
+            subscription, items = broker.subscribe(last_event_id)
+            broker.unsubscribe(subscription)
+            return None if items is None else [seq for seq, _ in items]
+
+        self.assertEqual(backlog(broker.event_id(3)), [4, 5])
+        self.assertEqual(backlog(broker.event_id(2)), [3, 4, 5])
+        self.assertEqual(backlog(broker.event_id(5)), [])
+        # Evicted, in the future, another process's or a bare number: resync
+        for last_event_id in (broker.event_id(1), broker.event_id(9), 'a1b2c3d4-3', '3', 'junk'):
+            self.assertIsNone(backlog(last_event_id), last_event_id)
+
+    async def test_overflow_sends_one_resync(self):
+        broker = events.EventBroker(queue_size=2)
+        subscription, _ = broker.subscribe()
+        for pk in range(4):
+            broker.publish({'type': events.UPDATED, 'ids': [pk]})
+        self.assertEqual((await next_event(subscription))[0], 1)
+        self.assertEqual((await next_event(subscription))[0], 2)
+        self.assertEqual(await next_event(subscription), ('resync', None))
+        self.assertIsNone(await next_event(subscription, timeout=0.01))
+
+        broker.publish({'type': events.UPDATED, 'ids': [9]})
+        self.assertEqual((await next_event(subscription))[0], 5)
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker.stats()['overflows'], 1)
+
+    async def test_reset_resyncs_subscribers_and_old_ids(self):
+        broker = events.EventBroker()
+        broker.publish({'type': events.UPDATED, 'ids': [1]})
+        subscription, _ = broker.subscribe()
+        last_seen = broker.stats()['last_event_id']
+        broker.reset()
+        self.assertEqual(await next_event(subscription), ('resync', None))
+        # Even the latest id from before the gap cannot resume
+        self.assertIsNone(broker.subscribe(last_seen)[1])
+        self.assertEqual(broker.subscribe(broker.stats()['last_event_id'])[1], [])
+
+    @override_settings(EVENTS_NOTIFY=False)
+    def test_in_process_events_are_published_on_commit(self):
+        published = events.broker.stats()['published']
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            events.emit_change(events.DELETED, ['7'])
+        self.assertEqual(events.broker.stats()['published'], published)
+        callbacks[0]()
+        self.assertEqual(events.broker._history[-1][1]['ids'], [7])
+
+    def test_large_events_are_split_into_notifications(self):
+        event = {'type': events.STATUS, 'ids': list(range(3000)), 'fields': {'current_status': '1'}}
+        sent = events.notify_payloads(event)
+        self.assertGreater(len(sent), 1)
+        self.assertLessEqual(max(len(payload.encode()) for payload in sent), events.MAX_PAYLOAD_BYTES)
+        payloads = [json.loads(payload) for payload in sent]
+        self.assertEqual([pk for payload in payloads for pk in payload['ids']], event['ids'])
+        self.assertEqual({payload['fields']['current_status'] for payload in payloads}, {'1'})
+
+        huge = {'type': events.UPDATED, 'ids': [1], 'fields': {'noted': 'x' * 9000}}
+        self.assertEqual([json.loads(payload) for payload in events.notify_payloads(huge)], [{'type': 'updated', 'ids': [1]}])
+
+
+@override_settings(SCANNER_API_KEY='events-key', EVENTS_HEARTBEAT_SECONDS=0.05, EVENTS_NOTIFY=False)
+class ProductEventStreamTests(TestCase):
+    """
+    GET /product/events/ (async_views.product_events)
+    """
+
+    async def open_stream(self, **headers):
+        response = await AsyncClient().get('/product/events/', headers={'X-API-Key': 'events-key', **headers})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return aiter(response.streaming_content)
+
+    async def read(self, chunks):
+        chunk = await anext(chunks)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    async def test_stream_replays_then_follows(self):
+        self.assertEqual((await AsyncClient().get('/product/events/')).status_code, 401)
+        events.broker.publish({'type': events.CREATED, 'ids': [1]})
+        first = events.broker.stats()['last_event_id']
+        events.broker.publish({'type': events.DELETED, 'ids': [2]})
+
+        chunks = await self.open_stream(**{'Last-Event-ID': first})
+        try:
+            self.assertEqual(await self.read(chunks), 'retry: 3000\n\n')
+            replayed = await self.read(chunks)
+            self.assertIn('event: deleted\n', replayed)
+            self.assertIn(f"id: {events.broker.stats()['last_event_id']}\n", replayed)
+
+            self.assertEqual(await self.read(chunks), ': ping\n\n')
+            events.broker.publish({'type': events.STATUS, 'ids': [3], 'fields': {'current_status': '1'}})
+            live = await self.read(chunks)
+            self.assertIn('event: status\n', live)
+            self.assertEqual(json.loads(live.split('data: ', 1)[1])['fields'], {'current_status': '1'})
+        finally:
+            await chunks.aclose()
+
+    async def test_unknown_last_event_id_gets_a_resync(self):
+        chunks = await self.open_stream(**{'Last-Event-ID': 'gone-12'})
+        try:
+            await self.read(chunks)
+            self.assertIn('event: resync\n', await self.read(chunks))
+        finally:
+            await chunks.aclose()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY requires PostgreSQL')
+@override_settings(EVENTS_NOTIFY=True)
+class NotifyListenerTests(TransactionTestCase):
+    """
+    Events reach other processes' brokers through LISTEN/NOTIFY once the write commits
+    """
+
+    def setUp(self):
+        self.broker = events.EventBroker()
+        self.listener = events.NotifyListener(self.broker, poll_timeout=0.05)
+        self.listener.reconnect_delay = 0.05
+        self.listener.start()
+        self.addCleanup(self.listener.join)
+        self.addCleanup(self.listener.stop)
+        self.assertTrue(self.listener.connected.wait(5))
+
+    def received(self, count):
+        deadline = clock.monotonic() + 5
+        while self.broker.stats()['published'] < count and clock.monotonic() < deadline:
+            clock.sleep(0.01)
+        return [event for _, event in self.broker._history]
+
+    def test_committed_events_are_delivered_and_rolled_back_ones_are_not(self):
+        with transaction.atomic():
+            events.emit_change(events.STATUS, [1, 2], {'current_status': '1', 'ex_date': date(2024, 5, 1)})
+            # Nothing before the commit
+            clock.sleep(0.2)
+            self.assertEqual(self.broker.stats()['published'], 0)
+        try:
+            with transaction.atomic():
+                events.emit_change(events.DELETED, [3])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        events.emit_change(events.CREATED, [4])
+
+        received = self.received(2)
+        self.assertEqual([(event['type'], event['ids']) for event in received], [('status', [1, 2]), ('created', [4])])
+        self.assertEqual(received[0]['fields'], {'current_status': '1', 'ex_date': '2024-05-01'})
+
+    def test_a_lost_connection_resyncs(self):
+        with self.assertLogs('product.events', 'WARNING'):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE query LIKE %s AND pid <> pg_backend_pid()',
+                    [f'LISTEN {events.CHANNEL}%'],
+                )
+            deadline = clock.monotonic() + 5
+            while self.broker.stats()['resets'] < 2 and clock.monotonic() < deadline:
+                clock.sleep(0.01)
+        self.assertEqual(self.broker.stats()['resets'], 2)
+        self.assertTrue(self.listener.connected.wait(5))
+        events.emit_change(events.CREATED, [5])
+        self.assertEqual(self.received(1)[-1]['ids'], [5])
+
+
+class BarcodeSnapshotTests(TransactionTestCase):
+    """
+    Offline barcode snapshots and deltas (product/barcodes.py) and
+    /product/barcodes/snapshot/. Each write commits on its own so versions advance.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_patch = override_settings(BARCODE_SNAPSHOT_DIR=self.directory, SCANNER_API_KEY='snapshot-key')
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.first = Product.objects.create(barcode='BS1', so_number='SO-BS1', date=date(2024, 5, 1))
+        # A repeated barcode maps to its lowest-id product, as in find_so_number
+        Product.objects.create(barcode='BS1', so_number='SO-BS1-later', date=date(2024, 5, 2))
+        self.second = Product.objects.create(barcode='BS2', so_number='SO-BS2', date=date(2024, 5, 1))
+
+    def read(self, name):
+        with gzip.open(os.path.join(self.directory, name), 'rt', encoding='utf-8') as fh:
+            return fh.read().splitlines()
+
+    def get(self, since=None):
+        params = {} if since is None else {'since': since}
+        return self.client.get('/product/barcodes/snapshot/', params, HTTP_X_API_KEY='snapshot-key')
+
+    def test_snapshots_deltas_and_pruning(self):
+        first = barcodes.build_snapshot(keep=2)
+        version = first['version']
+        self.assertEqual(self.read(barcodes.snapshot_name(version)),
+                         [f'#tgt-barcodes 1 {version}', 'BS1\tSO-BS1', 'BS2\tSO-BS2'])
+        self.assertEqual((first['snapshots'][0]['count'], first['deltas']), (2, {}))
+        # Nothing changed: no new version
+        self.assertEqual(barcodes.build_snapshot(keep=2)['version'], version)
+
+        Product.objects.filter(pk=self.second.pk).update(so_number='SO-BS2-moved')
+        self.first.delete()  # BS1 now resolves to the later product
+        Product.objects.create(barcode='BS0', so_number='SO-BS0', date=date(2024, 5, 1))
+        Product.objects.create(barcode='BS3', so_number='SO-BS3', date=date(2024, 5, 1))
+        Product.objects.filter(barcode='BS3').delete()
+        second = barcodes.build_snapshot(keep=2)
+        self.assertGreater(second['version'], version)
+        delta = second['deltas'][str(version)]
+        self.assertEqual(self.read(delta['file']), [
+            f'#tgt-barcodes-delta 1 {version} {second["version"]}',
+            '+BS0\tSO-BS0', '+BS1\tSO-BS1-later', '+BS2\tSO-BS2-moved',
+        ])
+        self.assertEqual(delta['changes'], 3)
+
+        Product.objects.filter(barcode='BS0').delete()
+        third = barcodes.build_snapshot(keep=2)
+        self.assertEqual([s['version'] for s in third['snapshots']], [second['version'], third['version']])
+        self.assertEqual(self.read(third['deltas'][str(second['version'])]['file'])[1:], ['-BS0'])
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([
+            barcodes.MANIFEST, barcodes.snapshot_name(second['version']), barcodes.snapshot_name(third['version']),
+            barcodes.delta_name(second['version'], third['version']),
+        ]))
+
+    def test_endpoint_serves_full_delta_or_not_modified(self):
+        self.assertEqual(self.get().status_code, 404)
+        out = io.StringIO()
+        call_command('build_barcode_snapshot', stdout=out)
+        old = str(barcodes.load_manifest()['version'])
+        self.assertIn(f'Current snapshot: version {old}, 0 delta(s)', out.getvalue())
+
+        response = self.get()
+        self.assertEqual((response.status_code, response['X-Snapshot-Kind']), (200, 'full'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()[1:],
+                         ['BS1\tSO-BS1', 'BS2\tSO-BS2'])
+        response = self.get(old)
+        self.assertEqual((response.status_code, response['X-Snapshot-Version']), (304, old))
+
+        Product.objects.create(barcode='BS4', so_number='SO-BS4', date=date(2024, 5, 1))
+        call_command('build_barcode_snapshot', stdout=io.StringIO())
+        new = str(barcodes.load_manifest()['version'])
+        response = self.get(old)
+        self.assertEqual(
+            (response['X-Snapshot-Kind'], response['X-Snapshot-From'], response['X-Snapshot-Version']),
+            ('delta', old, new),
+        )
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()[1:],
+                         ['+BS4\tSO-BS4'])
+        # A version the server no longer has deltas from gets the full file
+        self.assertEqual(self.get('1').get('X-Snapshot-Kind'), 'full')
+        self.assertEqual(self.client.get('/product/barcodes/snapshot/').status_code, 401)
+
+
+@override_settings(SCANNER_API_KEY='cache-key', PRODUCT_RECENT_DAYS=0)
+class BarcodeCacheTests(TestCase):
+    """
+    Batch find_so_number through the shared barcode cache (product/cache.py)
+    """
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            barcode_cache.clear()
+        self.product = Product.objects.create(barcode='BC1', so_number='SO-BC1', date=date(2024, 5, 1))
+        Product.objects.create(barcode='BC1', so_number='SO-BC1-later', date=date(2024, 5, 2))
+        Product.objects.create(barcode='BC2', so_number='SO-BC2', date=date(2024, 5, 1))
+
+    def find(self, barcodes):
+        return APIClient().post('/product/find_so_number/', {'action': 'find_so_number', 'barcodes': barcodes},
+                                format='json', HTTP_X_API_KEY='cache-key')
+
+    def test_batch_uses_one_query_then_the_cache(self):
+        with self.assertNumQueries(1):
+            data = self.find(['BC1', 'BC2', 'BC1', 'NOPE']).json()
+        self.assertEqual(data, {'success': True, 'results': {'BC1': 'SO-BC1', 'BC2': 'SO-BC2'}, 'not_found': ['NOPE']})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.find('BC2, BC1').json()['results'], {'BC2': 'SO-BC2', 'BC1': 'SO-BC1'})
+
+        # A committed write drops the entries of the products it touched
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(so_number='SO-BC1-new')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.find(['BC1', 'BC2']).json()['results'], {'BC1': 'SO-BC1-new', 'BC2': 'SO-BC2'})
+
+    def test_batch_size_is_bounded(self):
+        self.assertEqual(self.find([]).status_code, 400)
+        self.assertEqual(self.find([f'B{i}' for i in range(1001)]).status_code, 400)
+
+    def test_non_object_json_bodies_are_rejected(self):
+        for body in ('["BC1"]', '"BC1"', '1', 'null'):
+            response = APIClient().post('/product/find_so_number/', body, content_type='application/json',
+                                        HTTP_X_API_KEY='cache-key')
+            self.assertEqual(response.status_code, 400, body)
+
+    async def test_async_non_object_json_bodies_are_rejected(self):
+        for body in ('["BC1"]', '"BC1"', '1', 'null'):
+            response = await AsyncClient().post('/product/async/scanner/', body, content_type='application/json',
+                                                headers={'X-API-Key': 'cache-key'})
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(json.loads(response.content)['message'], 'JSON object required')
+
+
+@override_settings(SCANNER_API_KEY='recent-key', PRODUCT_RECENT_DAYS=30)
+class RecentWindowTests(TestCase):
+    """
+    Scanner lookups and date-ordered list pages read a PRODUCT_RECENT_DAYS date window first
+    """
+
+    def setUp(self):
+        product_models._oldest_date['expires'] = 0
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='recent-key')
+        today = timezone.localdate()
+        self.old = [
+            Product.objects.create(barcode=f'RO{i}', so_number='SO-R', date=date(2024, 5, 1) + timedelta(days=i))
+            for i in range(3)
+        ]
+        self.new = [
+            Product.objects.create(barcode=f'RN{i}', so_number='SO-R' if i == 0 else f'SO-RN{i}', date=today - timedelta(days=i))
+            for i in range(3)
+        ]
+
+    def date_filters(self, queries):
+        return [query['sql'] for query in queries if '"date" >=' in query['sql'] or '"date" <' in query['sql']]
+
+    def listed(self, url, page_size, pages):
+        with override_settings(PRODUCT_RECENT_DAYS=0):
+            expected = [row['barcode'] for row in self.client.get(f'{url}&page_size=99').json()['results']]
+        listed = []
+        for page in range(1, pages + 1):
+            response = self.client.get(f'{url}&page_size={page_size}&page={page}')
+            self.assertEqual(response.status_code, 200, response.content)
+            listed += [row['barcode'] for row in response.json()['results']]
+        self.assertEqual(listed, expected)
+        return listed
+
+    def test_pages_match_the_unbounded_list(self):
+        for url in ('/product/products/?sortField=date&sortOrder=desc', '/product/products/?',
+                    '/product/async/products/?sortOrder=desc', '/product/async/products/?sortField=qty'):
+            self.listed(url, 2, 3)
+        self.assertEqual(self.listed('/product/products/?sortOrder=desc', 4, 2)[:2], ['RN0', 'RN1'])
+
+    def test_first_page_reads_only_the_window(self):
+        with self.assertNumQueries(2) as queries:  # count, then the page
+            response = self.client.get('/product/products/?sortOrder=desc&page_size=3&fields=barcode')
+        self.assertEqual([row['barcode'] for row in response.json()['results']], ['RN0', 'RN1', 'RN2'])
+        self.assertEqual(len(self.date_filters(queries.captured_queries)), 1)
+        # A page running past the window is read again without it
+        with self.assertNumQueries(3):
+            self.client.get('/product/products/?sortOrder=desc&page_size=4&fields=barcode')
+
+    def test_scanner_lookups_try_recent_products_first(self):
+        recent = Product.objects.filter(so_number='SO-R').recent_first()
+        self.assertEqual(list(recent), [self.new[0]])
+        self.assertEqual(Product.objects.filter(barcode='RO1').recent_first().get(), self.old[1])
+
+        response = self.client.post('/product/scanner/', {'action': 'outbound', 'so_number': 'SO-R'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        # Every product of the order ships, not only the recent ones
+        self.assertEqual(set(Product.objects.filter(so_number='SO-R').values_list('current_status', flat=True)), {'1'})
+
+
+class FastJSONEquivalenceTests(TestCase):
+    """
+    server.renderers must produce exactly what DRF's JSON renderer/parser produce
+    """
+
+    def sample(self):
+        lazy_text = lazy(lambda: 'lazy ünïcode', str)()
+        return {
+            'date': date(2024, 5, 1),
+            'datetime': datetime(2024, 5, 1, 12, 30, 45, 123456),
+            'aware': datetime(2024, 5, 1, 12, 30, 45, 123456, tzinfo=dt_timezone.utc),
+            'offset': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=8))),
+            'time': time(8, 15, 0, 999999),
+            'duration': timedelta(hours=1, seconds=1.5),
+            'decimal': Decimal('12.50'),
+            'lazy': lazy_text,
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'text': '庫存 \u2028 line\u2029 "quoted" \\ \t\n\x01 \x7f',
+            'numbers': [0, -1, 2 ** 63 - 1, 1.5, 0.1, 0.0001, 1e15, True, False, None],
+            'bytes': b'abc',
+            'tuple': (1, 'two'),
+            'nested': [{'a': [], 'b': {}}, {3: 'int key'}],
+        }
+
+    def test_render_matches_drf(self):
+        data = self.sample()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_render_falls_back_for_big_integers_exponents_and_indent(self):
+        for data in ({'big': 2 ** 70}, {'small': 1e-7, 'large': 1e22, 'decimal': Decimal('1E+20')}):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        context = {'indent': 4}
+        self.assertEqual(
+            FastJSONRenderer().render(self.sample(), 'application/json', context),
+            JSONRenderer().render(self.sample(), 'application/json', context),
+        )
+
+    def test_parse_matches_drf(self):
+        body = '{"a": [1, 2.5, "ü\\u2028", null, true], "big": 123456789012345678901234567890}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_streamed_array_matches_buffered(self):
+        rows = [self.sample() for _ in range(5)]
+        streamed = b''.join(iter_json_array([rows[:2], [], rows[2:]]))
+        self.assertEqual(streamed, JSONRenderer().render(rows))
+        self.assertEqual(b''.join(iter_json_array([])), JSONRenderer().render([]))
+
+    def test_streamed_export_matches_buffered(self):
+        for i in range(7):
+            Product.objects.create(barcode=f'EQ{i}', so_number=f'SO-EQ{i % 3}', date=date(2024, 5, i + 1),
+                                   weight=i, noted='備註 \u2028')
+        client = APIClient()
+        client.force_authenticate(self._user())
+        with override_settings(EXPORT_STREAMING=True, EXPORT_CHUNK_SIZE=3):
+            streamed = client.get('/product/export/', HTTP_ACCEPT='application/json')
+            streamed_body = b''.join(streamed.streaming_content)
+        with override_settings(EXPORT_STREAMING=False):
+            buffered = client.get('/product/export/', HTTP_ACCEPT='application/json')
+        self.assertEqual(streamed_body, buffered.content)
+        self.assertEqual(len(buffered.json()), 7)
+
+    def _user(self):
+        return CustomUser.objects.create(username='renderer-test', role='admin')
+
+
+class CompressionTests(TestCase):
+    """
+    server.compression.CompressionMiddleware
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='compression-test', role='admin'))
+        for i in range(40):
+            Product.objects.create(barcode=f'CMP{i}', so_number=f'SO-CMP{i}', date=date(2024, 5, 1), noted='note ' * 20)
+
+    def test_streamed_export_is_gzipped_incrementally(self):
+        with override_settings(EXPORT_STREAMING=True, EXPORT_CHUNK_SIZE=7):
+            identity = b''.join(self.client.get('/product/export/').streaming_content)
+            response = self.client.get('/product/export/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), identity)
+
+    @override_settings(SCANNER_API_KEY='compression-key')
+    async def test_async_stream_is_gzipped(self):
+        client = AsyncClient()
+        headers = {'X-API-Key': 'compression-key'}
+        with override_settings(EXPORT_STREAMING=True, EXPORT_CHUNK_SIZE=7):
+            identity = await client.get('/product/async/export/', headers=headers)
+            identity = b''.join([chunk async for chunk in identity.streaming_content])
+            response = await client.get('/product/async/export/', headers={**headers, 'Accept-Encoding': 'gzip'})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(gzip.decompress(body), identity)
+
+    def test_negotiation(self):
+        from server.compression import negotiate
+        self.assertEqual(negotiate('gzip, deflate, br', ['gzip']), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, identity'))
+        self.assertIsNone(negotiate('*, gzip;q=0'))
+        self.assertEqual(negotiate('*;q=0.5'), negotiate('gzip'))
+        self.assertIsNone(negotiate(''))
+
+    def test_small_and_binary_responses_are_left_alone(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from server.compression import CompressionMiddleware
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        for response in (HttpResponse(b'{}', content_type='application/json'),
+                         HttpResponse(b'x' * 4096, content_type='application/gzip'),
+                         HttpResponse(b'x' * 4096, content_type='image/jpeg')):
+            self.assertFalse(CompressionMiddleware(lambda r: response)(request).has_header('Content-Encoding'))
+        body = b'{"a": 1}' * 512
+        response = CompressionMiddleware(lambda r: HttpResponse(body, content_type='application/json'))(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+
+@override_settings(PRODUCT_RECENT_DAYS=0)  # query counts without the date window (RecentWindowTests)
+class SparseFieldsetTests(TestCase):
+    """
+    ?fields= / ?exclude= / ?include= on the list, detail and export endpoints
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='fieldset-test', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cargo = Cargo.objects.create(name='SEA-1')
+        for i in range(5):
+            product = Product.objects.create(barcode=f'SP{i}', so_number=f'SO-SP{i}', date=date(2024, 5, 1),
+                                             cargo=cargo, created_by=self.user, noted='long note')
+            Photo.objects.create(product=product, path=f'SO-SP{i}_1.jpg')
+
+    def test_fields_prune_columns_and_prefetches(self):
+        with self.assertNumQueries(2):  # count + page; no photos, cargo or user queries
+            response = self.client.get('/product/products/?fields=barcode,so_number')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'barcode', 'so_number'})
+
+        with self.assertNumQueries(3):  # + photos prefetch
+            response = self.client.get('/product/products/?fields=barcode&include=photos,cargo_name,created_by_username')
+        row = response.json()['results'][0]
+        self.assertEqual(set(row), {'id', 'barcode', 'photos', 'created_by_username', 'cargo_name'})
+        self.assertEqual((row['cargo_name'], row['created_by_username'], len(row['photos'])), ('SEA-1', 'fieldset-test', 1))
+
+    def test_exclude_and_full_representation(self):
+        full = self.client.get('/product/products/').json()['results'][0]
+        self.assertIn('photos', full)
+        with self.assertNumQueries(2):
+            response = self.client.get('/product/products/?exclude=photos,noted,cargo_name,created_by_username')
+        self.assertEqual(set(response.json()['results'][0]),
+                         set(full) - {'photos', 'noted', 'cargo_name', 'created_by_username'})
+
+    def test_export_detail_and_unknown_fields(self):
+        with override_settings(EXPORT_STREAMING=True):
+            response = self.client.get('/product/export/?fields=barcode&include_archived=0')
+            rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([set(row) for row in rows], [{'id', 'barcode'}] * 5)
+        product = Product.objects.first()
+        response = self.client.get(f'/product/products/?id={product.id}&fields=so_number')
+        self.assertEqual(response.json()['results'], [{'id': product.id, 'so_number': product.so_number}])
+        response = self.client.get('/product/products/?fields=barcode,price&include=noted')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'include'})
+
+
+class ColumnarExportTests(TestCase):
+    """
+    /product/export/columnar/ (product/columnar.py)
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        user = CustomUser.objects.create(username='columnar-test', role='admin')
+        self.client.force_authenticate(user)
+        for i in range(5):
+            Product.objects.create(barcode=f'COL{i}', so_number=f'SO-COL{i}', date=date(2024, 5, i + 1), weight=i,
+                                   created_by=user)
+        self.expected = json.loads(b''.join(self.client.get('/product/export/').streaming_content))
+
+    def fetch(self, kind):
+        with override_settings(COLUMNAR_BATCH_SIZE=2):
+            response = self.client.get(f'/product/export/columnar/?as={kind}')
+            self.assertEqual(response.status_code, 200)
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)  # one write per batch
+        return b''.join(chunks)
+
+    def assertMatchesJSONExport(self, rows):
+        keys = ('id', 'barcode', 'so_number', 'date', 'weight', 'created_by_username', 'change_seq')
+        expected = sorted(tuple(row[key] for key in keys) for row in self.expected)
+        self.assertEqual(sorted(tuple(str(row[key]) if key == 'date' else row[key] for key in keys) for row in rows),
+                         expected)
+
+    @skipUnless(columnar.msgpack, 'msgpack is not installed')
+    def test_msgpack(self):
+        import msgpack
+        unpacker = msgpack.Unpacker(io.BytesIO(self.fetch('msgpack')))
+        header = next(unpacker)
+        self.assertEqual((header['format'], header['version']), ('tgt-products', 1))
+        self.assertMatchesJSONExport([dict(zip(header['columns'], row)) for row in unpacker])
+
+    @skipUnless(columnar.pyarrow, 'pyarrow is not installed')
+    def test_arrow_and_parquet(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+        self.assertMatchesJSONExport(pyarrow.ipc.open_stream(self.fetch('arrow')).read_all().to_pylist())
+        self.assertMatchesJSONExport(pyarrow.parquet.read_table(io.BytesIO(self.fetch('parquet'))).to_pylist())
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/product/export/columnar/?as=csv').status_code, 406)
+
+
+class TemporaryMediaMixin:
+    """
+    Each test gets an empty MEDIA_ROOT of its own, removed afterwards
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.temporary_dir()
+        settings_patch = override_settings(MEDIA_ROOT=self.media_root)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def temporary_dir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        return path
+
+
+@override_settings(PHOTO_NORMALIZE=True)
+class PhotoNormalizationTests(TemporaryMediaMixin, TestCase):
+    """
+    Upload normalization in save_file_safely (product/images.py)
+    """
+
+    def upload(self, name, image, **save_kwargs):
+        buffer = io.BytesIO()
+        image.save(buffer, **save_kwargs)
+        return SimpleUploadedFile(name, buffer.getvalue()), buffer.getvalue()
+
+    def stored(self, filename):
+        path = os.path.join(self.media_root, filename)
+        return Image.open(path), os.path.getsize(path)
+
+    def camera_jpeg(self):
+        image = Image.effect_noise((3000, 2000), 40).convert('RGB')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise to display
+        exif[0x010F] = 'CameraMaker'
+        return self.upload('IMG_0001.JPG', image, format='JPEG', quality=95, exif=exif.tobytes())
+
+    def test_camera_jpeg_is_downscaled_rotated_and_stripped(self):
+        upload, original = self.camera_jpeg()
+        originals = self.temporary_dir()
+        with override_settings(PHOTO_WORKERS=0, PHOTO_MAX_EDGE=1024, PHOTO_KEEP_ORIGINAL=True,
+                               PHOTO_ORIGINALS_DIR=originals):
+            ok, filename = save_file_safely(upload, 'SO 1', 1)
+        self.assertTrue(ok, filename)
+        self.assertEqual(filename, 'SO_1_1.jpg')
+        image, size = self.stored(filename)
+        self.assertEqual(image.size, (683, 1024))  # upright: portrait after the EXIF rotation
+        self.assertEqual(dict(image.getexif()), {})
+        self.assertLess(size, len(original) / 4)
+        # The original keeps its EXIF/GPS, so it is never written under MEDIA_ROOT
+        self.assertEqual(os.listdir(self.media_root), ['SO_1_1.jpg'])
+        with open(os.path.join(originals, 'SO_1_1.jpg'), 'rb') as fh:
+            self.assertEqual(fh.read(), original)
+
+    def test_webp_keeps_alpha_and_invalid_images_are_rejected(self):
+        upload, _ = self.upload('logo.png', Image.new('RGBA', (300, 200), (255, 0, 0, 128)), format='PNG')
+        with override_settings(PHOTO_WORKERS=0, PHOTO_FORMAT='WEBP'):
+            ok, filename = save_file_safely(upload, 'SO2', 1)
+            self.assertEqual(save_file_safely(SimpleUploadedFile('x.jpg', b'\xff\xd8\xff' + b'0' * 100), 'SO2', 2),
+                             (False, 'Invalid image file format'))
+        self.assertEqual(filename, 'SO2_1.webp')
+        image, _ = self.stored(filename)
+        self.assertEqual((image.format, image.mode, image.size), ('WEBP', 'RGBA', (300, 200)))
+
+    def test_process_pool_and_disabled(self):
+        upload, original = self.camera_jpeg()
+        with override_settings(PHOTO_WORKERS=1):
+            ok, filename = save_file_safely(upload, 'SO3', 1)
+        self.assertEqual(self.stored(filename)[0].size, (1365, 2048))
+        upload.seek(0)
+        with override_settings(PHOTO_NORMALIZE=False):
+            ok, filename = save_file_safely(upload, 'SO3', 2)
+        self.assertEqual((filename, self.stored(filename)[1]), ('SO3_2.jpg', len(original)))
+
+
+@override_settings(MEDIA_PROTECTED=True, MEDIA_DELIVERY='django')
+class ProtectedMediaTests(TemporaryMediaMixin, TestCase):
+    """
+    /product/photos/<id>/file/ and signed photo URLs (product/media.py)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.body = bytes(range(256)) * 40
+        with open(os.path.join(self.media_root, 'SO-M1_1.jpg'), 'wb') as fh:
+            fh.write(self.body)
+        self.user = CustomUser.objects.create(username='media-test', role='admin')
+        product = Product.objects.create(barcode='M1', so_number='SO-M1', date=date(2024, 5, 1))
+        self.photo = Photo.objects.create(product=product, path='SO-M1_1.jpg')
+        self.client = APIClient()
+
+    def signed_url(self):
+        self.client.force_authenticate(self.user)
+        row = self.client.get('/product/products/').json()['results'][0]
+        self.client.force_authenticate(None)
+        return row['photos'][0]['url'].replace('http://testserver', '')
+
+    def test_signed_url_full_and_range(self):
+        url = self.signed_url()
+        self.assertTrue(url.startswith(f'/product/photos/{self.photo.id}/file/?exp='))
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, self.body))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, f'bytes 100-199/{len(self.body)}'))
+        self.assertEqual(b''.join(response.streaming_content), self.body[100:200])
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-10:])
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.body)}'))
+
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_unsigned_tampered_and_expired_urls_are_refused(self):
+        url = self.signed_url()
+        self.assertEqual(self.client.get(f'/product/photos/{self.photo.id}/file/').status_code, 401)
+        self.assertEqual(self.client.get(url.replace('sig=', 'sig=0')).status_code, 401)
+        other = url.replace(f'/photos/{self.photo.id}/', f'/photos/{self.photo.id + 1}/')
+        self.assertEqual(self.client.get(other).status_code, 401)
+        self.assertEqual(self.client.get(signed_photo_path(self.photo.id, now=1_000_000)).status_code, 401)
+        # A JWT / API key still works without a signature
+        with override_settings(SCANNER_API_KEY='test-key'):
+            response = self.client.get(f'/product/photos/{self.photo.id}/file/', HTTP_X_API_KEY='test-key')
+        self.assertEqual(response.status_code, 200)
+
+    def test_offloaded_delivery(self):
+        url = self.signed_url()
+        with override_settings(MEDIA_DELIVERY='x-accel', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.client.get(url)
+        self.assertEqual((response['X-Accel-Redirect'], response['Content-Type'], response.content),
+                         ('/protected-media/SO-M1_1.jpg', 'image/jpeg', b''))
+        with override_settings(MEDIA_DELIVERY='x-sendfile'):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'SO-M1_1.jpg'))
+
+
+@override_settings(JOBS_ENABLED=True, PHOTO_NORMALIZE=True, PHOTO_WORKERS=0)
+class BackgroundJobTests(TemporaryMediaMixin, TestCase):
+    """
+    Work handed to the job queue by the views (product/tasks.py)
+    """
+
+    def setUp(self):
+        super().setUp()
+        settings_patch = override_settings(JOBS_OUTPUT_DIR=self.temporary_dir())
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        # Ids cached by earlier tests point at rows their rollback removed
+        for model in (Vender, Client, Category):
+            lookup_cache.invalidate(model)
+        self.user = CustomUser.objects.create(username='jobs-test', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def run_jobs(self):
+        while (job := claim('test')) is not None:
+            self.assertTrue(execute(job), job.error)
+
+    def test_photo_normalized_and_deleted_by_jobs(self):
+        product = Product.objects.create(barcode='J1', so_number='SO-J1', date=date(2024, 5, 1))
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 1000), (200, 10, 10)).save(buffer, format='PNG')
+        ok, filename = save_file_safely(SimpleUploadedFile('scan.png', buffer.getvalue()), 'SO-J1', 1)
+        self.assertEqual((ok, filename), (True, 'SO-J1_1.png'))  # stored as uploaded
+        photo = create_photo(product, filename)
+
+        self.run_jobs()
+        photo.refresh_from_db()
+        self.assertEqual(photo.path.name, 'SO-J1_1.jpg')
+        self.assertEqual(sorted(os.listdir(self.media_root)), ['SO-J1_1.jpg'])
+        self.assertEqual(Image.open(os.path.join(self.media_root, 'SO-J1_1.jpg')).size, (2048, 683))
+
+        self.assertEqual(self.client.delete(f'/product/products/{product.pk}/').status_code, 204)
+        self.assertEqual(os.listdir(self.media_root), ['SO-J1_1.jpg'])  # until the worker runs
+        self.run_jobs()
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    async def test_async_upload_queues_normalization(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 1000), (10, 200, 10)).save(buffer, format='PNG')
+        with override_settings(SCANNER_API_KEY='jobs-key'):
+            response = await AsyncClient().post('/product/async/scanner/', {
+                'action': 'inbound', 'date': '2024-05-01', 'barcode': 'JA1', 'so_number': 'SO-JA1', 'qty': 1, 'weight': 1,
+                'photos': SimpleUploadedFile('scan.png', buffer.getvalue()),
+            }, headers={'X-API-Key': 'jobs-key'})
+        self.assertEqual(response.status_code, 200, response.content)
+        photo = await Photo.objects.aget(product__barcode='JA1')
+        self.assertEqual(photo.path.name, 'SO-JA1_1.png')  # stored as uploaded, normalized by the job
+
+        await sync_to_async(self.run_jobs)()
+        await photo.arefresh_from_db()
+        self.assertEqual(photo.path.name, 'SO-JA1_1.jpg')
+        self.assertEqual(sorted(os.listdir(self.media_root)), ['SO-JA1_1.jpg'])
+
+    def test_background_export_matches_inline(self):
+        for i in range(3):
+            Product.objects.create(barcode=f'JE{i}', so_number=f'SO-JE{i}', date=date(2024, 5, 1))
+        inline = self.client.get('/product/export/?fields=barcode&include_archived=0')
+        inline = json.loads(b''.join(inline.streaming_content))
+
+        response = self.client.get('/product/export/?fields=barcode&include_archived=0&background=1')
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(response['Location']).json()
+        self.assertEqual((job['kind'], job['status']), ('product.export', 'queued'))
+        self.run_jobs()
+        job = self.client.get(response['Location']).json()
+        download = self.client.get(job['download_url'])
+        self.assertEqual(json.loads(b''.join(download.streaming_content)), inline)
+        self.assertIn('attachment', download['Content-Disposition'])
+
+    def test_large_bulk_create_is_queued(self):
+        rows = [{'barcode': f'JB{i}', 'so_number': f'SO-JB{i}', 'date': '2024-05-01'} for i in range(3)]
+        rows.append({'barcode': 'JB-bad', 'date': '2024-05-01'})
+        with override_settings(JOBS_BULK_CREATE_THRESHOLD=2):
+            response = self.client.post('/product/products/', rows, format='json')
+        self.assertEqual((response.status_code, response.json()['total_count']), (202, 4))
+        self.assertEqual(Product.objects.count(), 0)
+        self.run_jobs()
+        result = self.client.get(response['Location']).json()['result']
+        self.assertEqual((result['success'], result['created_count'], len(result['errors'])), (False, 3, 1))
+        self.assertEqual(set(Product.objects.values_list('created_by', flat=True)), {self.user.pk})
@@ -1,12 +1,22 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('products/', views.ProductListAPIView.as_view(), name='product-list'),
     path('products/<int:pk>/', views.product_detail, name='product-detail'),
     path('export/', views.get_all_products_for_export, name='export-products'),
+    path('export/columnar/', views.export_columnar, name='export-columnar'),
     path('batch_update_status/', views.batch_update_status, name='batch-update-status'),
     path('scanner/', views.scanner_api, name='scanner-api'),
     path('find_so_number/', views.scanner_api, name='scanner_api'),
     path('cargos/', views.cargo_list, name='cargo-list'),
+    path('lookups/', views.lookup_values, name='lookup-values'),
+    path('changes/', views.product_changes, name='product-changes'),
+    path('barcodes/snapshot/', views.barcode_snapshot, name='barcode-snapshot'),
+    path('photos/<int:pk>/file/', views.photo_file, name='photo-file'),
+    # Async variants, intended for the ASGI deployment (server.asgi)
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/export/', async_views.export_products, name='async-export-products'),
+    path('async/scanner/', async_views.scanner_api, name='async-scanner-api'),
+    path('events/', async_views.product_events, name='product-events'),
 ]
@@ -2,16 +2,36 @@
 from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
-from .models import Product, Photo, Cargo
+from .models import Product, ProductQuerySet, Photo, Cargo, Vender, Client, Category, ArchivedProduct, ArchivedPhoto
+from .archive import CombinedProducts
+from .barcodes import load_manifest, snapshot_dir
+from .changes import CursorExpired, changes_page
+from .columnar import FORMATS as COLUMNAR_FORMATS, available_formats, export_stream
+from .events import DELETED, STATUS, UPDATED, emit_change, emit_created, emit_update
 from .serializer import ProductSerializer, PhotoSerializer, CargoSerializer
 from rest_framework import generics
-from django.db.models import Sum, Q, Max, Max
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from server.renderers import iter_json_array
+from django.core.paginator import Paginator
+from django.db.models import Sum, Q, Max, Max, Count
 from rest_framework.pagination import PageNumberPagination
 from django.db import transaction
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.functional import cached_property
+from account.cache import username_cache
+from .cache import barcode_cache
+from .images import InvalidImage, normalize_photo
+from .lookups import lookup_cache
+from .media import file_response, valid_signature
+from jobs.queue import enqueue
+from jobs.serializer import JobSerializer
+from monitoring.metrics import registry as metrics_registry
 import os
 import re
 
@@ -113,6 +133,16 @@ class IsAuthenticatedOrHasAPIKey(BasePermission):
         # Fall back to JWT authentication
         return IsAuthenticated().has_permission(request, view)
 
+class IsAuthenticatedOrSignedPhotoURL(IsAuthenticatedOrHasAPIKey):
+    """
+    Photo files: a JWT or API Key as elsewhere, or the signed ?exp=&sig= of the
+    photo URL returned by the API (product/media.py), which <img> tags can send.
+    """
+    def has_permission(self, request, view):
+        if valid_signature(view.kwargs.get('pk'), request.query_params):
+            return True
+        return super().has_permission(request, view)
+
 def save_file_safely(file, so_number, idx):
     """
     Safely save uploaded file with validation
@@ -123,18 +153,58 @@ def save_file_safely(file, so_number, idx):
     if not is_valid:
         return False, error_msg
 
+    # Downscale / re-encode / strip metadata (product/images.py); None = store as uploaded.
+    # With the job queue on, the upload is stored as is and create_photo() queues this step.
+    original = None
+    normalized = None
+    if settings.PHOTO_NORMALIZE and not settings.JOBS_ENABLED:
+        original = b''.join(file.chunks())
+        try:
+            normalized = normalize_photo(original)
+        except InvalidImage:
+            return False, 'Invalid image file format'
+
     # Sanitize filename
     original_ext = os.path.splitext(file.name)[1].lower()
+    stored_ext = normalized[1] if normalized else original_ext
     safe_so_number = re.sub(r'[^\w\-]', '_', str(so_number))
-    filename = f"{safe_so_number}_{idx}{original_ext}"
+    filename = f"{safe_so_number}_{idx}{stored_ext}"
 
     # Get media root from settings
-    images_dir = os.getenv('MEDIA_ROOT', r'D:\workplace\Images')
+    images_dir = photos_dir()
     os.makedirs(images_dir, exist_ok=True)
 
-    file_path = os.path.join(images_dir, filename)
-
     # Check if file already exists and generate unique name if needed
+    filename, file_path = unique_photo_path(images_dir, filename)
+
+    try:
+        # Save file securely
+        written = 0
+        with open(file_path, 'wb') as destination:
+            if normalized:
+                written = destination.write(normalized[0])
+            elif original is not None:
+                written = destination.write(original)
+            else:
+                for chunk in file.chunks():
+                    destination.write(chunk)
+                    written += len(chunk)
+        if normalized and settings.PHOTO_KEEP_ORIGINAL:
+            keep_original(filename, original_ext, original)
+        if not photos_deferred():
+            metrics_registry.record_photo(written, len(original) if original is not None else written)
+        return True, filename
+    except Exception as e:
+        return False, f'Error saving file: {str(e)}'
+
+def photos_dir():
+    return settings.MEDIA_ROOT
+
+def unique_photo_path(images_dir, filename):
+    """
+    (filename, path) for `filename` in images_dir, numbered name_1.ext, name_2.ext... if taken
+    """
+    file_path = os.path.join(images_dir, filename)
     counter = 1
     base_filename = filename
     while os.path.exists(file_path):
@@ -142,15 +212,101 @@ def save_file_safely(file, so_number, idx):
         filename = f"{name}_{counter}{ext}"
         file_path = os.path.join(images_dir, filename)
         counter += 1
+    return filename, file_path
+
+def keep_original(filename, original_ext, data):
+    originals_dir = settings.PHOTO_ORIGINALS_DIR
+    os.makedirs(originals_dir, exist_ok=True)
+    with open(os.path.join(originals_dir, os.path.splitext(filename)[0] + original_ext), 'wb') as fh:
+        fh.write(data)
 
+def photos_deferred():
+    """
+    True when uploads are stored as is and normalized later by a job (product.normalize_photo)
+    """
+    return settings.PHOTO_NORMALIZE and settings.JOBS_ENABLED
+
+def create_photo(product, filename):
+    """
+    Photo row for a file stored by save_file_safely, queueing its normalization when deferred
+    """
+    photo = Photo.objects.create(product=product, path=filename)
+    if photos_deferred():
+        enqueue('product.normalize_photo', {'photo_id': photo.pk})
+    return photo
+
+def normalize_stored_photo(photo_id):
+    """
+    Normalize a photo that save_file_safely stored as uploaded (job queue on). The
+    file is replaced, and renamed with the row when the format's extension differs.
+    """
+    photo = Photo.objects.filter(pk=photo_id).only('path', 'product_id').first()
+    if photo is None:
+        return {'skipped': 'photo deleted'}
+    images_dir = photos_dir()
+    name = photo.path.name
+    path = os.path.join(images_dir, name)
+    with open(path, 'rb') as fh:
+        original = fh.read()
     try:
-        # Save file securely
-        with open(file_path, 'wb') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        return True, filename
-    except Exception as e:
-        return False, f'Error saving file: {str(e)}'
+        normalized = normalize_photo(original)
+    except InvalidImage as e:
+        # It passed the upload signature check; keep it as uploaded
+        return {'name': name, 'unchanged': True, 'error': str(e)}
+    if normalized is None:
+        return {'name': name, 'unchanged': True}
+
+    data, ext = normalized
+    stem, original_ext = os.path.splitext(name)
+    new_name, new_path = (name, path) if ext == original_ext.lower() else unique_photo_path(images_dir, stem + ext)
+    with open(new_path + '.part', 'wb') as fh:
+        fh.write(data)
+    os.replace(new_path + '.part', new_path)
+    if settings.PHOTO_KEEP_ORIGINAL:
+        keep_original(new_name, original_ext, original)
+    if new_name != name:
+        with transaction.atomic():
+            renamed = Photo.objects.filter(pk=photo_id).update(path=new_name)
+            # The URL is part of the product's representation, as in Photo.save()
+            Product.objects.filter(pk=photo.product_id).touch()
+        # Drop whichever file no row points at
+        os.remove(path if renamed else new_path)
+        if not renamed:
+            return {'skipped': 'photo deleted'}
+    metrics_registry.record_photo(len(data), len(original))
+    return {'name': new_name, 'bytes': len(data), 'uploaded_bytes': len(original)}
+
+def delete_photo_files(names):
+    """
+    Remove stored photo files once their rows are gone; missing files are ignored
+    """
+    storage = Photo._meta.get_field('path').storage
+    for name in names:
+        storage.delete(name)
+    return {'deleted': len(names)}
+
+def _first_value(value):
+    """
+    QueryDict/JSON values may arrive as a list; take the first item
+    """
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+def resolve_created_by(request, username, resolved=None, user_id=None):
+    """
+    Return the user id to stamp as created_by.
+    Uses the given username when present (None if unknown), otherwise the authenticated user.
+    `resolved` is an optional username -> id map pre-fetched for a batch.
+    `user_id` stands in for the authenticated user when there is no request (background jobs).
+    """
+    if username:
+        if resolved is not None and username in resolved:
+            return resolved[username]
+        return username_cache.resolve(username)
+    if request is not None and request.user and request.user.is_authenticated:
+        return request.user.pk
+    return user_id
 
 # Zebra Scanner API
 @api_view(['POST'])
@@ -161,19 +317,28 @@ def scanner_api(request):
     入庫: action=inbound, 傳 date, barcode, so_number, weight, photos
     出貨: action=outbound, 傳 so_number, photos
     """
+    if not isinstance(request.data, dict):
+        return Response({'success': False, 'message': 'JSON object required'}, status=status.HTTP_400_BAD_REQUEST)
     action = request.data.get('action')
     if not action:
         return Response({'success': False, 'message': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
 
     # 新增 find_so_number 查詢
     if action == 'find_so_number':
+        if 'barcodes' in request.data:
+            # Batch form: many barcodes, one IN query for the cache misses
+            barcodes = requested_barcodes(request.data)
+            if not barcodes or len(barcodes) > FIND_SO_NUMBER_BATCH_MAX:
+                return Response({'success': False, 'message': f'1 to {FIND_SO_NUMBER_BATCH_MAX} barcodes required'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(batch_find_response(barcodes))
         barcode = request.data.get('barcode', '')
         if not barcode:
             return Response({'success': False, 'message': 'barcode required'}, status=status.HTTP_400_BAD_REQUEST)
-        product = Product.objects.filter(barcode=barcode).first()
-        if not product:
+        so_number = barcode_cache.resolve(barcode)
+        if so_number is None:
             return Response({'success': False, 'message': 'not found'}, status=status.HTTP_404_NOT_FOUND)
-        return Response({'success': True, 'so_number': product.so_number})
+        return Response({'success': True, 'so_number': so_number})
 
     if action == 'inbound':
         # 入庫: 建立新產品
@@ -193,23 +358,14 @@ def scanner_api(request):
         serializer = ProductSerializer(data=product_data)
         if serializer.is_valid():
             # Auto-assign created_by based on username from request
-            created_by_user = None
-            username = data.get('created_by_username')
-
-            if username:
-                from account.models import CustomUser
-                try:
-                    created_by_user = CustomUser.objects.get(username=username)
-                except CustomUser.DoesNotExist:
-                    pass  # User not found, created_by will be None
-            elif request.user and request.user.is_authenticated:
-                created_by_user = request.user
+            created_by_id = resolve_created_by(request, data.get('created_by_username'))
 
             # Save product with created_by
-            if created_by_user:
-                product = serializer.save(created_by=created_by_user)
+            if created_by_id:
+                product = serializer.save(created_by_id=created_by_id)
             else:
                 product = serializer.save()
+            emit_created(product)
 
             # Handle photo uploads with validation
             photos = request.FILES.getlist('photos')
@@ -220,7 +376,7 @@ def scanner_api(request):
                 success, result = save_file_safely(img, so_number, idx)
                 if success:
                     # Save filename to database
-                    Photo.objects.create(product=product, path=result)
+                    create_photo(product, result)
                 else:
                     failed_uploads.append({'file': img.name, 'error': result})
 
@@ -239,21 +395,27 @@ def scanner_api(request):
         if not so_number:
             return Response({'success': False, 'message': 'so_number required'}, status=status.HTTP_400_BAD_REQUEST)
         products = Product.objects.filter(so_number=so_number)
-        if not products.exists():
+        # The newest product takes the photos; it is among the recent dates whenever any product is
+        recent = products.recent_first()
+        latest_date = recent.aggregate(Max('date'))['date__max']
+        if latest_date is None:
             return Response({'success': False, 'message': 'not found'}, status=status.HTTP_404_NOT_FOUND)
         # 更新所有產品的 ex_date 和 current_status
         today = datetime.now().strftime('%Y-%m-%d')
+        product_ids = list(products.values_list('id', flat=True))
         products.update(ex_date=today, current_status='1')
+        emit_change(STATUS, product_ids, {'current_status': '1', 'ex_date': today})
 
         # 處理照片，只存到最新 date 的產品（若多個同日，取 first）
-        latest_date = products.aggregate(Max('date'))['date__max']
-        target_product = products.filter(date=latest_date).first()
+        target_product = recent.filter(date=latest_date).first()
 
         # Handle photo uploads with validation
         photos = request.FILES.getlist('photos')
         so_number_val = so_number if so_number else 'photo'
         # 取得目前已存在的照片數量
-        exist_count = Photo.objects.filter(product=target_product, path__startswith=f"{so_number_val}_").count() if target_product else 0
+        exist_count = Photo.objects.filter(
+            product=target_product, product_date=latest_date, path__startswith=f"{so_number_val}_"
+        ).count() if target_product else 0
         failed_uploads = []
 
         for idx, img in enumerate(photos, start=1):
@@ -261,9 +423,11 @@ def scanner_api(request):
             if success:
                 # Save filename to database
                 if target_product:
-                    Photo.objects.create(product=target_product, path=result)
+                    create_photo(target_product, result)
             else:
                 failed_uploads.append({'file': img.name, 'error': result})
+        if target_product and len(failed_uploads) < len(photos):
+            emit_change(UPDATED, [target_product.pk], {'photos': exist_count + len(photos) - len(failed_uploads)})
 
         # Build response
         response_data = {'success': True, 'product': ProductSerializer(products.first()).data}
@@ -291,12 +455,464 @@ def batch_update_status(request):
         update_fields = {'current_status': target_status}
         if ex_date:
             update_fields['ex_date'] = ex_date
-        updated = Product.objects.filter(id__in=ids).update(**update_fields)
+        products = Product.objects.filter(id__in=ids)
+        product_ids = list(products.values_list('id', flat=True))
+        updated = products.update(**update_fields)
+        emit_change(STATUS, product_ids, update_fields)
         return Response({'success': True, 'message': f'已更新 {updated} 筆產品狀態', 'updated_count': updated})
     except Exception as e:
         return Response({'success': False, 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Product columns stored as ids of small lookup tables but exposed by name
+LOOKUP_FIELDS = {'vender': Vender, 'client': Client, 'category': Category}
+
+# A search of exactly 'YYYY-MM' or 'YYYY-MM-DD' means "received then"
+DATE_SEARCH = re.compile(r'^(\d{4})-(\d{2})(?:-(\d{2}))?$')
+
+def search_date_range(search):
+    """
+    (first, last) day for a 'YYYY-MM' / 'YYYY-MM-DD' search, else None
+    """
+    match = DATE_SEARCH.match(search.strip()) if search else None
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if day:
+            first = last = datetime(year, month, day).date()
+        else:
+            first = datetime(year, month, 1).date()
+            last = (datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).date()
+    except ValueError:
+        return None
+    return first, last
+
+FIND_SO_NUMBER_BATCH_MAX = 1000
+
+
+def requested_barcodes(data):
+    """
+    Barcodes of a batch find_so_number: a JSON list, repeated form fields or a comma-separated string
+    """
+    values = data.getlist('barcodes') if hasattr(data, 'getlist') else data.get('barcodes') or []
+    if isinstance(values, str):
+        values = [values]
+    barcodes = []
+    for value in values:
+        barcodes.extend(part.strip() for part in str(value).split(','))
+    return list(dict.fromkeys(barcode for barcode in barcodes if barcode))
+
+
+def batch_find_response(barcodes):
+    resolved = barcode_cache.resolve_many(barcodes)
+    return {
+        'success': True,
+        'results': resolved,
+        'not_found': [barcode for barcode in barcodes if barcode not in resolved],
+    }
+
+
+def search_products(queryset, search):
+    """
+    Free-text search shared by the list and export endpoints
+    """
+    if not search:
+        return queryset
+    matches = Q(barcode__icontains=search) | Q(number__icontains=search) | Q(qty__icontains=search)
+    date_range = search_date_range(search)
+    if date_range:
+        # Same rows as date::text LIKE, but the date index can serve this branch of the OR
+        matches |= Q(date__range=date_range)
+    else:
+        matches |= Q(date__icontains=search)
+    return queryset.filter(matches)
+
+# sortField -> order_by() key. Columns have a (column, id) index (Product.Meta.indexes), so an
+# ordered page is an index scan + LIMIT. The exceptions are cargo_name and created_by_username,
+# which the dashboard's Cargo / Created By headers sort by the name shown: no index orders a
+# join, so they hash-join the small cargo/user table and top-N sort every filtered row (about
+# 220 ms unfiltered on 300k products). vender/client/category are filters, not sorts.
+SORTABLE_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'ex_date': 'ex_date',
+    'so_number': 'so_number',
+    'barcode': 'barcode',
+    'number': 'number',
+    'qty': 'qty',
+    'weight': 'weight',
+    'current_status': 'current_status',
+    'cargo': 'cargo_id',
+    'cargo_name': 'cargo__name',
+    'created_by': 'created_by_id',
+    'created_by_username': 'created_by__username',
+}
+
+def product_ordering(params):
+    """
+    order_by() arguments for sortField/sortOrder (default: date ascending).
+    id is always the last key so pages are stable; unsupported sorts raise ValidationError.
+    """
+    sort_field = params.get('sortField') or 'date'
+    sort_order = params.get('sortOrder') or 'asc'
+    if sort_field not in SORTABLE_FIELDS:
+        raise ValidationError({'sortField': [f'Unsupported sort field. Choose one of: {", ".join(SORTABLE_FIELDS)}']})
+    if sort_order not in ('asc', 'desc'):
+        raise ValidationError({'sortOrder': ['Must be "asc" or "desc".']})
+    # Both keys share the direction so the (column, id) index can be scanned backwards
+    prefix = '-' if sort_order == 'desc' else ''
+    column = SORTABLE_FIELDS[sort_field]
+    if column == 'id':
+        return [prefix + 'id']
+    return [prefix + column, prefix + 'id']
+
+# Facet name -> grouped column and, for relations, the table holding the display name
+FACET_FIELDS = {
+    'status': ('current_status', None),
+    'category': ('category_id', Category),
+    'vender': ('vender_id', Vender),
+    'client': ('client_id', Client),
+    'cargo': ('cargo_id', Cargo),
+}
+
+def _param_values(params, key):
+    return [value.strip() for value in params.getlist(key) if value.strip()]
+
+def _param_date(params, key):
+    value = params.get(key)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({key: ['Date has wrong format. Use YYYY-MM-DD.']})
+
+def filter_products(queryset, params):
+    """
+    Structured filters shared by the list and export endpoints. Repeat a key to
+    match any of several values, e.g. ?status=0&category=RAM&category=CPU.
+    vender/client/category take names, cargo takes ids; date_from/date_to and
+    ex_date_from/ex_date_to are inclusive YYYY-MM-DD bounds.
+    """
+    statuses = _param_values(params, 'status')
+    if statuses:
+        queryset = queryset.filter(current_status__in=statuses)
+    for field, model in LOOKUP_FIELDS.items():
+        names = _param_values(params, field)
+        if names:
+            # Resolve names to ids up front so the filter runs on the integer column
+            queryset = queryset.filter(**{f'{field}_id__in': lookup_cache.existing_ids(model, names)})
+    cargos = _param_values(params, 'cargo')
+    if cargos:
+        if not all(value.isdigit() for value in cargos):
+            raise ValidationError({'cargo': ['Expected cargo ids.']})
+        queryset = queryset.filter(cargo_id__in=cargos)
+    for field in ('date', 'ex_date'):
+        start = _param_date(params, f'{field}_from')
+        end = _param_date(params, f'{field}_to')
+        if start:
+            queryset = queryset.filter(**{f'{field}__gte': start})
+        if end:
+            queryset = queryset.filter(**{f'{field}__lte': end})
+    return queryset
+
+def product_facets(queryset, facets):
+    """
+    Counts per value of each requested facet (comma-separated names) for the
+    filtered queryset. One GROUP BY over all requested columns; the combinations
+    are folded per facet here, which is cheap because every facet column is a
+    low-cardinality code or lookup id.
+    """
+    names = [name.strip() for name in facets.split(',') if name.strip()]
+    unknown = [name for name in names if name not in FACET_FIELDS]
+    if unknown:
+        raise ValidationError({'facets': [f'Unsupported facet(s): {", ".join(unknown)}. Choose from: {", ".join(FACET_FIELDS)}']})
+    if not names:
+        return {}
+    columns = [FACET_FIELDS[name][0] for name in names]
+    counts = {name: {} for name in names}
+    # include_archived lists group each table separately
+    querysets = [queryset.hot, queryset.archived] if isinstance(queryset, CombinedProducts) else [queryset]
+    for part in querysets:
+        for row in part.order_by().values(*columns).annotate(count=Count('id')):
+            for name, column in zip(names, columns):
+                counts[name][row[column]] = counts[name].get(row[column], 0) + row['count']
+
+    result = {}
+    for name in names:
+        model = FACET_FIELDS[name][1]
+        if model is not None and model is not Cargo:
+            # By name, as the list shows them: products without one count under ''
+            by_name = {}
+            for value, count in counts[name].items():
+                label = lookup_cache.name_for(model, value) or ''
+                by_name[label] = by_name.get(label, 0) + count
+            counts[name] = by_name
+        entries = []
+        for value, count in sorted(counts[name].items(), key=lambda item: -item[1]):
+            if model is Cargo:
+                entries.append({'value': value, 'name': lookup_cache.name_for(Cargo, value), 'count': count})
+            else:
+                entries.append({'value': value, 'count': count})
+        result[name] = entries
+    return result
+
+def product_list_queryset(params, model=Product):
+    """
+    Build the product list queryset from query params (search, id, filter_products filters,
+    sortField, sortOrder). model=ArchivedProduct builds the same query on the archive.
+    Shared by ProductListAPIView and its async counterpart.
+    """
+    queryset = model.objects.all()
+    search = params.get('search', None)
+    product_id = params.get('id', None)
+
+    # Handle ID filter
+    if product_id:
+        return queryset.filter(id=product_id)
+
+    # Handle search and structured filters
+    queryset = filter_products(search_products(queryset, search), params)
+
+    return queryset.order_by(*product_ordering(params))
+
+def export_queryset(params, model=Product):
+    """
+    獲取符合條件的產品進行匯出 (search + structured filters, see filter_products)
+    """
+    # 可多選 category, e.g. ?category=RAM&category=CPU
+    search = ''.join(params.getlist('search'))
+    # 處理搜索條件
+    return filter_products(search_products(model.objects.all(), search), params)
+
+def include_archived(params, default=False):
+    """
+    include_archived=1/true/yes adds archived products (product/archive.py)
+    """
+    value = params.get('include_archived')
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+def export_querysets(params):
+    """
+    Querysets an export reads: live products, then archived ones unless include_archived=0
+    """
+    querysets = [export_queryset(params)]
+    if include_archived(params, default=True):
+        querysets.append(export_queryset(params, ArchivedProduct))
+    return querysets
+
+def run_in_background(params):
+    """
+    ?background=1 asks for a job instead of an inline response (only when the job queue is on)
+    """
+    return settings.JOBS_ENABLED and params.get('background', '').strip().lower() in ('1', 'true', 'yes')
+
+def job_accepted(request, job, **extra):
+    """
+    202 response pointing at a queued job's status endpoint
+    """
+    data = JobSerializer(job, context={'request': request}).data
+    return Response({**extra, 'job': data}, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']})
+
+def combined_list_queryset(params):
+    """
+    Hot + archived products for ?include_archived=1, same filters and ordering
+    """
+    return CombinedProducts(
+        product_list_queryset(params),
+        product_list_queryset(params, ArchivedProduct),
+        product_ordering(params),
+    )
+
+# Embedded/derived fields that can be added to a ?fields= selection with ?include=
+INCLUDE_FIELDS = ('photos', 'created_by_username', 'cargo_name')
+
+def _param_names(params, key):
+    return [name.strip() for value in params.getlist(key) for name in value.split(',') if name.strip()]
+
+def requested_fields(params):
+    """
+    Product fields picked by ?fields=, ?exclude= and ?include= (comma-separated),
+    or None for the full representation. fields= keeps just the listed fields
+    (and id); include= adds photos, created_by_username and/or cargo_name to
+    that selection; exclude= drops fields from either.
+    """
+    fields, exclude, include = (_param_names(params, key) for key in ('fields', 'exclude', 'include'))
+    if not fields and not exclude:
+        return None
+    available = list(ProductSerializer().fields)
+    errors = {}
+    for key, names, allowed in (('fields', fields, available), ('exclude', exclude, available),
+                                ('include', include, INCLUDE_FIELDS)):
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            errors[key] = [f'Unknown field(s): {", ".join(unknown)}. Choose from: {", ".join(allowed)}']
+    if errors:
+        raise ValidationError(errors)
+    wanted = set(fields) | set(include) | {'id'} if fields else set(available)
+    return [name for name in available if name in wanted and name not in exclude]
+
+def sparse_queryset(queryset, fields):
+    """
+    Load what serializing `fields` needs: only their columns, a join for
+    created_by_username / cargo_name (reading just the name) and the photos
+    prefetch for photos. fields=None loads everything (created_by and cargo
+    joined, photos prefetched).
+    """
+    if fields is None:
+        return queryset.select_related('created_by', 'cargo').prefetch_related('photos')
+    columns = {'id'} | {name for name in fields if name not in INCLUDE_FIELDS}
+    for name, relation, column in (('created_by_username', 'created_by', 'username'), ('cargo_name', 'cargo', 'name')):
+        if name in fields:
+            queryset = queryset.select_related(relation)
+            columns |= {relation, f'{relation}__{column}'}
+    if 'photos' in fields:
+        queryset = queryset.prefetch_related('photos')
+    return queryset.only(*columns)
+
+def normalize_product_payload(product_data):
+    """
+    Coerce one row of a bulk create payload (QueryDict or dict) into serializer input:
+    first value of multi-valued keys, stripped strings, int qty/weight, status/note aliases
+    """
+    # 將 QueryDict 轉成普通 dict，並把所有 value 只取第一個
+    if hasattr(product_data, 'lists'):
+        product_data = {k: v[0] if isinstance(v, list) else v for k, v in product_data.lists()}
+    else:
+        product_data = dict(product_data)
+        for k, v in product_data.items():
+            if isinstance(v, list):
+                product_data[k] = v[0] if v else ''
+    # 轉型態
+    for key in ['so_number', 'status', 'note', 'number', 'barcode', 'vender', 'client', 'category']:
+        val = product_data.get(key, '')
+        product_data[key] = str(val).strip()
+    # A missing or blank lookup name is no lookup row (NULL), not a row named ''
+    for key in ['vender', 'client', 'category']:
+        product_data[key] = product_data[key] or None
+    # qty 轉 int
+    if 'qty' in product_data:
+        try:
+            product_data['qty'] = int(product_data['qty'])
+        except Exception:
+            product_data['qty'] = 0
+    # weight 轉 int or None
+    if 'weight' in product_data:
+        weight_val = product_data['weight']
+        if weight_val == '' or weight_val is None:
+            product_data['weight'] = None
+        else:
+            try:
+                product_data['weight'] = int(weight_val)
+            except (ValueError, TypeError):
+                product_data['weight'] = None
+    # date 格式
+    if 'date' in product_data:
+        product_data['date'] = str(product_data['date']).strip()
+    # 優先用 current_status/noted，若沒有才用 status/note
+    if 'current_status' not in product_data and 'status' in product_data:
+        product_data['current_status'] = product_data.pop('status')
+    if 'noted' not in product_data and 'note' in product_data:
+        product_data['noted'] = product_data.pop('note')
+    # 保證 current_status/noted 欄位存在
+    if 'current_status' not in product_data:
+        product_data['current_status'] = ''
+    if 'noted' not in product_data:
+        product_data['noted'] = ''
+
+    return product_data
+
+def create_products(products_data, default_username=None, request=None, user_id=None, photos=()):
+    """
+    Create a product per valid row (POST /product/products/). Returns (created, errors):
+    serialized products, or product ids when there is no request (background jobs).
+    `photos` are stored for the product when there is a single row.
+    """
+    created_products = []
+    errors = []
+
+    # Resolve every created_by_username in the batch with one query
+    usernames = {_first_value(row.get('created_by_username')) for row in products_data if hasattr(row, 'get')}
+    usernames.add(default_username)
+    resolved_user_ids = username_cache.resolve_many(usernames)
+
+    for idx, product_data in enumerate(products_data):
+        product_data = normalize_product_payload(product_data)
+        # so_number 必填
+        so_number_val = product_data.get('so_number', '')
+        if not so_number_val or (isinstance(so_number_val, str) and so_number_val.strip() == ''):
+            errors.append({
+                'data': product_data,
+                'errors': {'so_number': ['This field is required.']}
+            })
+            continue
+
+        serializer = ProductSerializer(data=product_data)
+        if serializer.is_valid():
+            try:
+                # Auto-assign created_by based on username from request
+                username = product_data.get('created_by_username') or default_username
+                created_by_id = resolve_created_by(request, username, resolved_user_ids, user_id)
+
+                # Save product with created_by
+                if created_by_id:
+                    product = serializer.save(created_by_id=created_by_id)
+                else:
+                    product = serializer.save()
+                emit_created(product)
+
+                # 僅於單一產品時處理多圖
+                if len(products_data) == 1 and photos:
+                    so_number_val = product_data.get('so_number', 'photo')
+                    failed_uploads = []
+
+                    for idx, img in enumerate(photos, start=1):
+                        success, result = save_file_safely(img, so_number_val, idx)
+                        if success:
+                            create_photo(product, result)
+                        else:
+                            failed_uploads.append({'file': img.name, 'error': result})
+
+                    # Include upload warnings in product data if any failed
+                    product_serialized = ProductSerializer(product, context={'request': request}).data
+                    if failed_uploads:
+                        product_serialized['upload_warnings'] = failed_uploads
+                    created_products.append(product_serialized)
+                elif request is None:
+                    created_products.append(product.pk)
+                else:
+                    created_products.append(ProductSerializer(product, context={'request': request}).data)
+            except Exception as e:
+                errors.append({
+                    'data': product_data,
+                    'error': str(e)
+                })
+        else:
+            errors.append({
+                'data': product_data,
+                'errors': serializer.errors
+            })
+    return created_products, errors
+
+class DateWindowPaginator(Paginator):
+    """
+    Reads date-ordered product pages through ProductQuerySet.window_slice, so the
+    default list touches only the partitions of its date window (the count is not bounded)
+    """
+    def page(self, number):
+        if not isinstance(self.object_list, ProductQuerySet):
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(self.object_list.window_slice(bottom, top), number, self)
+
 class StandardPagination(PageNumberPagination):
+    django_paginator_class = DateWindowPaginator
     page_size = 100  # Must match ITEMS_PER_PAGE
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -307,55 +923,50 @@ class ProductListAPIView(generics.ListAPIView):
     pagination_class = StandardPagination
     
     def get_queryset(self):
-        queryset = Product.objects.all()
-        search = self.request.query_params.get('search', None)
-        product_id = self.request.query_params.get('id', None)
-        sort_field = self.request.query_params.get('sortField', None)
-        sort_order = self.request.query_params.get('sortOrder', 'asc')
-        
-        
-        # Handle ID filter
-        if product_id:
-            return queryset.filter(id=product_id)
+        return product_list_queryset(self.request.query_params)
 
+    @cached_property
+    def sparse_fields(self):
+        return requested_fields(self.request.query_params)
 
-        # Handle search
-        if search:
-            queryset = queryset.filter(
-                Q(barcode__icontains=search) |
-                Q(number__icontains=search) |
-                Q(qty__icontains=search) |
-                Q(date__icontains=search)
-            )
-        
-        # Handle sorting
-        if sort_field:
-            # Add minus sign for descending order
-            order_by = f"-{sort_field}" if sort_order == 'desc' else sort_field
-            queryset = queryset.order_by(order_by)
-        else:
-            # Default sorting by date
-            queryset = queryset.order_by('date')
-            
-        return queryset
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.sparse_fields)
+        return super().get_serializer(*args, **kwargs)
     
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        filtered = self.filter_queryset(self.get_queryset())
+        # ?fields= / ?exclude= / ?include= prune the columns loaded, not just the JSON
+        queryset = sparse_queryset(filtered, self.sparse_fields)
 
         # If ID was provided in query params, return single object
         product_id = self.request.query_params.get('id', None)
-        if product_id and queryset.exists():
-            serializer = self.get_serializer(queryset.first())
-            return Response({
-                'results': [serializer.data]  # Wrap in list to maintain consistent format
-            })
+        with_archive = include_archived(self.request.query_params)
+        if product_id:
+            product = queryset.first()
+            if product is None and with_archive:
+                product = sparse_queryset(
+                    product_list_queryset(self.request.query_params, ArchivedProduct), self.sparse_fields,
+                ).first()
+            if product is not None:
+                serializer = self.get_serializer(product)
+                return Response({
+                    'results': [serializer.data]  # Wrap in list to maintain consistent format
+                })
+        elif with_archive:
+            queryset = combined_list_queryset(self.request.query_params)
+            queryset.prepare = lambda table: sparse_queryset(table, self.sparse_fields)
         
         #paginate_queryset will call StandardPagination
         page = self.paginate_queryset(queryset)    #handle page 2..
         
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            response = self.get_paginated_response(serializer.data)
+            # ?facets=status,category,... adds value counts for the whole filtered set
+            facets = self.request.query_params.get('facets')
+            if facets:
+                response.data['facets'] = product_facets(queryset if with_archive else filtered, facets)
+            return response
 
         # Fallback for non-paginated case (shouldn't happen with pagination_class)
         serializer = self.get_serializer(queryset, many=True)
@@ -370,116 +981,22 @@ class ProductListAPIView(generics.ListAPIView):
         Handles bulk product creation. Accepts a list of products.
         支援多圖上傳，將每張圖片存入 Photo 並關聯到 Product。
         """
+        products_data = request.data if isinstance(request.data, list) else [request.data]
+        if settings.JOBS_ENABLED and isinstance(request.data, list) and (
+            len(products_data) > settings.JOBS_BULK_CREATE_THRESHOLD or run_in_background(request.query_params)
+        ):
+            # Large batches are created by a worker; the job's result has the counts and errors
+            user_id = request.user.pk if request.user and request.user.is_authenticated else None
+            job = enqueue('product.bulk_create', {'rows': products_data, 'user_id': user_id}, created_by=request.user)
+            return job_accepted(request, job, success=True, queued=True, total_count=len(products_data))
+
         try:
             with transaction.atomic():
-                products_data = request.data if isinstance(request.data, list) else [request.data]
-                created_products = []
-                errors = []
-
-                for idx, product_data in enumerate(products_data):
-                    # 將 QueryDict 轉成普通 dict，並把所有 value 只取第一個
-                    if hasattr(product_data, 'lists'):
-                        product_data = {k: v[0] if isinstance(v, list) else v for k, v in product_data.lists()}
-                    else:
-                        product_data = dict(product_data)
-                        for k, v in product_data.items():
-                            if isinstance(v, list):
-                                product_data[k] = v[0] if v else ''
-                    # 轉型態
-                    for key in ['so_number', 'status', 'note', 'number', 'barcode', 'vender', 'client', 'category']:
-                        val = product_data.get(key, '')
-                        product_data[key] = str(val).strip()
-                    # qty 轉 int
-                    if 'qty' in product_data:
-                        try:
-                            product_data['qty'] = int(product_data['qty'])
-                        except Exception:
-                            product_data['qty'] = 0
-                    # weight 轉 int or None
-                    if 'weight' in product_data:
-                        weight_val = product_data['weight']
-                        if weight_val == '' or weight_val is None:
-                            product_data['weight'] = None
-                        else:
-                            try:
-                                product_data['weight'] = int(weight_val)
-                            except (ValueError, TypeError):
-                                product_data['weight'] = None
-                    # date 格式
-                    if 'date' in product_data:
-                        product_data['date'] = str(product_data['date']).strip()
-                    # so_number 必填
-                    so_number_val = product_data.get('so_number', '')
-                    if not so_number_val or (isinstance(so_number_val, str) and so_number_val.strip() == ''):
-                        errors.append({
-                            'data': product_data,
-                            'errors': {'so_number': ['This field is required.']}
-                        })
-                        continue
-
-                    # 優先用 current_status/noted，若沒有才用 status/note
-                    if 'current_status' not in product_data and 'status' in product_data:
-                        product_data['current_status'] = product_data.pop('status')
-                    if 'noted' not in product_data and 'note' in product_data:
-                        product_data['noted'] = product_data.pop('note')
-                    # 保證 current_status/noted 欄位存在
-                    if 'current_status' not in product_data:
-                        product_data['current_status'] = ''
-                    if 'noted' not in product_data:
-                        product_data['noted'] = ''
-
-                    serializer = ProductSerializer(data=product_data)
-                    if serializer.is_valid():
-                        try:
-                            # Auto-assign created_by based on username from request
-                            created_by_user = None
-                            username = product_data.get('created_by_username') or request.data.get('created_by_username')
-
-                            if username:
-                                from account.models import CustomUser
-                                try:
-                                    created_by_user = CustomUser.objects.get(username=username)
-                                except CustomUser.DoesNotExist:
-                                    pass  # User not found, created_by will be None
-                            elif request.user and request.user.is_authenticated:
-                                created_by_user = request.user
-
-                            # Save product with created_by
-                            if created_by_user:
-                                product = serializer.save(created_by=created_by_user)
-                            else:
-                                product = serializer.save()
-
-                            # 僅於單一產品時處理多圖
-                            if len(products_data) == 1:
-                                product_files = request.FILES.getlist('photos')
-                                so_number_val = product_data.get('so_number', 'photo')
-                                failed_uploads = []
-
-                                for idx, img in enumerate(product_files, start=1):
-                                    success, result = save_file_safely(img, so_number_val, idx)
-                                    if success:
-                                        Photo.objects.create(product=product, path=result)
-                                    else:
-                                        failed_uploads.append({'file': img.name, 'error': result})
-
-                                # Include upload warnings in product data if any failed
-                                product_serialized = ProductSerializer(product, context={'request': request}).data
-                                if failed_uploads:
-                                    product_serialized['upload_warnings'] = failed_uploads
-                                created_products.append(product_serialized)
-                            else:
-                                created_products.append(ProductSerializer(product, context={'request': request}).data)
-                        except Exception as e:
-                            errors.append({
-                                'data': product_data,
-                                'error': str(e)
-                            })
-                    else:
-                        errors.append({
-                            'data': product_data,
-                            'errors': serializer.errors
-                        })
+                # A single form-data product may carry created_by_username as a list
+                default_username = None if isinstance(request.data, list) else _first_value(request.data.get('created_by_username'))
+                created_products, errors = create_products(
+                    products_data, default_username, request=request, photos=request.FILES.getlist('photos'),
+                )
 
                 if errors and not created_products:
                     raise Exception(f"Failed to create any products: {errors}")
@@ -539,6 +1056,7 @@ class ProductListAPIView(generics.ListAPIView):
             serializer = ProductSerializer(product, data=data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                emit_update(serializer)
                 return Response(serializer.data, status=status.HTTP_200_OK)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
@@ -565,11 +1083,14 @@ def product_detail(request, pk):
     if request.method == 'DELETE':
         # 先刪除所有關聯照片（包含檔案）
         photos = Photo.objects.filter(product=product)
+        names = [photo.path.name for photo in photos if photo.path]
         for photo in photos:
-            if photo.path:
-                photo.path.delete(save=False)  # 刪除Local實體檔案
             photo.delete()  # 刪除資料庫紀錄
         product.delete()
+        emit_change(DELETED, [pk])
+        # 刪除Local實體檔案: in a worker when the job queue is on
+        if names:
+            enqueue('product.delete_files', {'names': names}, created_by=request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
     elif request.method == 'PUT':
         # 1. 先處理圖片刪除
@@ -586,11 +1107,16 @@ def product_detail(request, pk):
                 elif val.strip():
                     delete_photo_ids = [val.strip()]
         delete_photo_ids = [int(pid) for pid in delete_photo_ids if str(pid).strip()]
+        deleted_names = []
         for pid in delete_photo_ids:
             photo = Photo.objects.filter(id=pid, product=product).first()
             if photo:
-                photo.path.delete(save=False)  # 刪除實體檔案
+                if photo.path:
+                    deleted_names.append(photo.path.name)
                 photo.delete()                 # 刪除資料庫紀錄
+        if deleted_names:
+            # 刪除實體檔案 (in a worker when the job queue is on)
+            enqueue('product.delete_files', {'names': deleted_names}, created_by=request.user)
 
         # 2. 新增新圖片 with validation
         new_files = request.FILES.getlist('photos')
@@ -598,10 +1124,12 @@ def product_detail(request, pk):
         # Get current photo count for indexing
         current_photo_count = Photo.objects.filter(product=product).count()
 
+        photos_changed = bool(delete_photo_ids)
         for idx, img in enumerate(new_files, start=1):
             success, result = save_file_safely(img, so_number_val, current_photo_count + idx)
             if success:
-                Photo.objects.create(product=product, path=result)
+                create_photo(product, result)
+                photos_changed = True
             # Note: In edit mode, we silently skip invalid files rather than showing errors
 
         # 3. 更新產品本身欄位
@@ -613,7 +1141,9 @@ def product_detail(request, pk):
         serializer = ProductSerializer(product, data=data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
-            return Response(ProductSerializer(product, context={'request': request}).data)
+            emit_update(serializer, {'photos': Photo.objects.filter(product=product).count()} if photos_changed else None)
+            fields = requested_fields(request.query_params)
+            return Response(ProductSerializer(product, context={'request': request}, fields=fields).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -624,33 +1154,70 @@ def get_all_products_for_export(request):
     獲取符合條件的產品進行匯出
     支援搜索和分類過濾
     """
-    search = request.query_params.get('search', '')
-    # category = request.query_params.get('category', None)
-    categories = request.query_params.getlist('category')
-    # 解析搜索查詢參數
-    # 移除可能包含的 category 參數
-    search_params = dict(request.query_params)
-    search_params.pop('category', None)
-    search = ''.join(search_params.get('search', ['']))
-    
-    queryset = Product.objects.all()
-    if categories:  # If there are categories, e.g., ['1', '3']
-        queryset = queryset.filter(category__in=categories)
-    # 處理搜索條件
-    if search:
-        queryset = queryset.filter(
-            Q(barcode__icontains=search) |
-            Q(number__icontains=search) |
-            Q(qty__icontains=search) |
-            Q(date__icontains=search)
+    fields = requested_fields(request.query_params)
+    if run_in_background(request.query_params):
+        # The file is written by a worker; fetch it from the job's download_url
+        return job_accepted(request, enqueue_export(request, 'json'))
+    # Exports cover archived products too unless include_archived=0
+    querysets = export_querysets(request.query_params)
+    if settings.EXPORT_STREAMING and isinstance(request.accepted_renderer, JSONRenderer):
+        # Same bytes as the buffered response, produced a chunk at a time
+        return StreamingHttpResponse(
+            iter_json_array(export_chunks(querysets, fields=fields), request.accepted_renderer),
+            content_type='application/json',
         )
-    
-    # 處理分類過濾
-    # if category:
-    #     queryset = queryset.filter(category=category)
-    
-    serializer = ProductSerializer(queryset, many=True)
-    return Response(serializer.data)
+    data = []
+    for queryset in querysets:
+        data = data + ProductSerializer(sparse_queryset(queryset, fields), many=True, fields=fields).data
+    return Response(data)
+
+
+def enqueue_export(request, kind):
+    """
+    Queue product.export with this request's filters
+    """
+    params = {key: request.query_params.getlist(key) for key in request.query_params if key != 'background'}
+    return enqueue('product.export', {'params': params, 'kind': kind}, created_by=request.user)
+
+
+def export_chunks(querysets, chunk_size=None, fields=None):
+    """
+    Serialized products of each queryset in lists of EXPORT_CHUNK_SIZE, read through a server-side cursor
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    for queryset in querysets:
+        batch = []
+        for product in sparse_queryset(queryset, fields).iterator(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                yield ProductSerializer(batch, many=True, fields=fields).data
+                batch = []
+        if batch:
+            yield ProductSerializer(batch, many=True, fields=fields).data
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def export_columnar(request):
+    """
+    Export in a columnar/binary format for reporting jobs (product/columnar.py):
+    ?as=arrow|parquet|msgpack, default arrow when pyarrow is installed, else msgpack.
+    Same filters as get_all_products_for_export.
+    """
+    formats = available_formats()
+    kind = request.query_params.get('as') or (formats[0] if formats else '')
+    if kind not in formats:
+        return Response(
+            {'detail': f'Export format {kind!r} is not available. Choose from: {", ".join(formats) or "none installed"}'},
+            status=status.HTTP_406_NOT_ACCEPTABLE,
+        )
+    if run_in_background(request.query_params):
+        return job_accepted(request, enqueue_export(request, kind))
+    querysets = export_querysets(request.query_params)
+    content_type, extension = COLUMNAR_FORMATS[kind]
+    response = StreamingHttpResponse(export_stream(querysets, kind), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="products-{datetime.now():%Y%m%d}.{extension}"'
+    return response
 
 
 # Cargo API endpoints
@@ -671,3 +1238,103 @@ def cargo_list(request):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def lookup_values(request):
+    """
+    Distinct vender / client / category names, for filter dropdowns
+    """
+    return Response({
+        field: list(model.objects.order_by('name').values_list('name', flat=True))
+        for field, model in LOOKUP_FIELDS.items()
+    })
+
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def product_changes(request):
+    """
+    Delta sync: products created/updated and ids deleted or archived after ?since=<cursor>.
+    Without since, the pages are a full download. Follow `cursor` while has_more
+    is true, then keep it for the next sync.
+    """
+    since = request.query_params.get('since', '')
+    try:
+        limit = int(request.query_params.get('limit', CHANGES_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+    try:
+        products, tombstones, cursor, has_more = changes_page(since, limit)
+    except ValueError:
+        raise ValidationError({'since': 'Invalid cursor.'})
+    except CursorExpired:
+        return Response(
+            {'detail': 'Cursor is older than the retained deletions; download everything again.', 'resync': True},
+            status=status.HTTP_410_GONE,
+        )
+    return Response({
+        'changes': ProductSerializer(products, many=True, context={'request': request}).data,
+        'deleted': [
+            {'id': tombstone.id, 'change_seq': tombstone.change_seq, 'archived': tombstone.archived}
+            for tombstone in tombstones
+        ],
+        'cursor': cursor,
+        'has_more': has_more,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrHasAPIKey])
+def barcode_snapshot(request):
+    """
+    Offline barcode -> so_number map for scanners (product/barcodes.py).
+    ?since=<version> returns a delta when one exists, 304 when already current,
+    otherwise the full snapshot. X-Snapshot-Version is the version to send next time.
+    """
+    manifest = load_manifest()
+    if not manifest or manifest['version'] is None:
+        return Response({'detail': 'No barcode snapshot has been built yet.'}, status=status.HTTP_404_NOT_FOUND)
+    version = str(manifest['version'])
+    since = request.query_params.get('since', '')
+    if since == version:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['X-Snapshot-Version'] = version
+        return response
+
+    delta = manifest['deltas'].get(since)
+    name = delta['file'] if delta else manifest['snapshots'][-1]['file']
+    try:
+        response = FileResponse(open(os.path.join(snapshot_dir(), name), 'rb'), content_type='application/gzip')
+    except FileNotFoundError:
+        # Replaced by a concurrent build; the device retries
+        return Response({'detail': 'Snapshot is being rebuilt, retry.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['X-Snapshot-Version'] = version
+    response['X-Snapshot-Kind'] = 'delta' if delta else 'full'
+    if delta:
+        response['X-Snapshot-From'] = since
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrSignedPhotoURL])
+def photo_file(request, pk):
+    """
+    The image of a photo (live or archived), sent by nginx/Apache when
+    MEDIA_DELIVERY is x-accel/x-sendfile, otherwise by Django with Range support
+    """
+    photo = Photo.objects.filter(pk=pk).only('path').first() or ArchivedPhoto.objects.filter(pk=pk).only('path').first()
+    if photo is None or not photo.path:
+        return Response({'detail': 'Photo not found.'}, status=status.HTTP_404_NOT_FOUND)
+    response = file_response(request, photo.path)
+    if response.status_code in (200, 206, 304):
+        # Signed URLs are per-user; keep the file out of shared caches
+        patch_cache_control(response, private=True, max_age=settings.MEDIA_URL_TTL)
+    return response
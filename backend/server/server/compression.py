@@ -0,0 +1,231 @@
+"""
+Response compression: gzip always, brotli ("br") and zstd when their
+libraries are installed and the client lists them in Accept-Encoding.
+
+Only compressible types (COMPRESSION_CONTENT_TYPES: JSON, text, CSV...) are
+touched, so photos, gzip'd barcode snapshots and the SSE stream
+(text/event-stream, which must not be buffered) pass through as they are.
+Buffered responses below COMPRESSION_MIN_SIZE bytes are left alone.
+Streaming responses (exports) are compressed chunk by chunk and flushed after
+each chunk, so the client still receives every chunk as soon as it is
+rendered. Levels are set by COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY
+/ COMPRESSION_ZSTD_LEVEL; see benchmarks/compression.py for the trade-off.
+"""
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+DEFAULT_CONTENT_TYPES = (
+    'application/json', 'application/javascript', 'application/xml',
+    'text/html', 'text/plain', 'text/csv', 'text/css', 'text/javascript', 'image/svg+xml',
+    # Columnar exports (product/columnar.py); Parquet is compressed already
+    'application/msgpack', 'application/vnd.apache.arrow.stream',
+)
+_CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31: gzip container
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._zlib.compress(data)
+
+    def flush(self):
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self._brotli = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._brotli.process(data)
+
+    def flush(self):
+        return self._brotli.flush()
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self._zstd = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._zstd.compress(data)
+
+    def flush(self):
+        return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# encoding -> (compressor class, level setting, default level); unavailable ones are left out
+COMPRESSORS = {'gzip': (GzipCompressor, 'COMPRESSION_GZIP_LEVEL', 5)}
+if brotli is not None:
+    COMPRESSORS['br'] = (BrotliCompressor, 'COMPRESSION_BROTLI_QUALITY', 4)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (ZstdCompressor, 'COMPRESSION_ZSTD_LEVEL', 3)
+
+
+def accepted_encodings(header):
+    """
+    Codings a client accepts (q > 0) from an Accept-Encoding header; '*' stands for any other
+    """
+    accepted, refused = set(), set()
+    for part in header.split(','):
+        match = _CODING.match(part)
+        if not match:
+            continue
+        coding, q = match.group(1).lower(), match.group(2)
+        try:
+            (refused if q is not None and float(q) <= 0 else accepted).add(coding)
+        except ValueError:
+            continue
+    if '*' in accepted:
+        accepted |= set(COMPRESSORS) - refused
+    return accepted - refused
+
+
+def negotiate(header, preference=None):
+    """
+    The first encoding in `preference` (default COMPRESSION_ENCODINGS) that is installed and accepted, or None
+    """
+    if not header:
+        return None
+    accepted = accepted_encodings(header)
+    for encoding in preference or getattr(settings, 'COMPRESSION_ENCODINGS', ('zstd', 'br', 'gzip')):
+        if encoding in accepted and encoding in COMPRESSORS:
+            return encoding
+    return None
+
+
+def compressor(encoding):
+    cls, setting, default = COMPRESSORS[encoding]
+    return cls(getattr(settings, setting, default))
+
+
+def compress(data, encoding):
+    """
+    Compress a whole body at once
+    """
+    c = compressor(encoding)
+    return c.compress(data) + c.finish()
+
+
+def compress_chunks(chunks, encoding):
+    """
+    Compress an iterable of byte chunks, flushing after each so the output keeps pace with the input
+    """
+    c = compressor(encoding)
+    for chunk in chunks:
+        if chunk:
+            out = c.compress(chunk) + c.flush()
+            if out:
+                yield out
+    yield c.finish()
+
+
+async def acompress_chunks(chunks, encoding):
+    """
+    compress_chunks() for the async iterators of ASGI streaming responses
+    """
+    c = compressor(encoding)
+    async for chunk in chunks:
+        if chunk:
+            out = c.compress(chunk) + c.flush()
+            if out:
+                yield out
+    yield c.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses for clients that accept it. Place it after
+    MetricsMiddleware (so recorded sizes are what goes on the wire) and before
+    anything that sets or reads the response body.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_CONTENT_TYPES))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def compressible(self, request, response):
+        if request.method == 'HEAD' or response.status_code in (204, 206, 304):
+            return False
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return False
+        return response.streaming or len(response.content) >= self.min_size
+
+    def process_response(self, request, response):
+        if not self.compressible(request, response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # Bind the current iterator: assigning streaming_content replaces it
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = acompress_chunks(content, encoding)
+            else:
+                response.streaming_content = compress_chunks(content, encoding)
+            # The compressed length is unknown until the stream ends
+            if response.has_header('Content-Length'):
+                del response.headers['Content-Length']
+        else:
+            body = compress(response.content, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        # A strong ETag names the identity bytes; weaken it (RFC 9110 8.8.1) as GZipMiddleware does
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
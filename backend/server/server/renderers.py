@@ -0,0 +1,99 @@
+"""
+orjson-backed drop-ins for DRF's JSONRenderer and JSONParser.
+
+The renderer emits the same bytes as rest_framework.renderers.JSONRenderer
+with the default settings (compact, UTF-8, U+2028/U+2029 escaped): dates,
+times, Decimals, lazy translation strings and everything else orjson does not
+handle natively go through DRF's own JSONEncoder.default. Indented output
+(browsable API, ?indent=) and the non-default COMPACT_JSON / UNICODE_JSON
+settings use the stdlib path, as does anything orjson rejects (e.g. integers
+wider than 64 bits) and output containing a float in exponent notation, which
+orjson spells differently (1e16 / 1e-7 vs 1e+16 / 1e-07). Known difference:
+NaN/Infinity floats, which the stdlib path refuses under STRICT_JSON, are
+written as null.
+
+Without orjson installed both classes behave exactly like DRF's.
+"""
+import io
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder/decoder
+    orjson = None
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+# Every digit becomes b'0', so the checks below are plain substring searches
+# (a regex scan costs more than orjson saves on large bodies)
+_DIGITS = bytes.maketrans(b'0123456789', b'0000000000')
+# Integers orjson would read as floats
+_LONG_NUMBER = b'0' * 19
+# Dates/times go through DRF's formatting (millisecond precision, 'Z' for UTC)
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj):
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # A float in exponent notation (or a string that merely looks like one)
+        digits = ret.translate(_DIGITS)
+        if b'0e0' in digits or b'0e-0' in digits:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same JavaScript-safety escaping as JSONRenderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read() if stream is not None else b''
+        if _LONG_NUMBER not in body.translate(_DIGITS):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        # DRF's parser: exact big integers, and the usual ParseError for bad input
+        return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+def iter_json_array(chunks, renderer=None):
+    """
+    Render an iterable of lists as one JSON array, chunk by chunk. The bytes
+    equal rendering the concatenated list at once, so a streamed export is
+    indistinguishable from a buffered one.
+    """
+    renderer = renderer or FastJSONRenderer()
+    separator = b',' if renderer.compact else b', '
+    yield b'['
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        body = renderer.render(list(chunk))
+        yield (b'' if first else separator) + body[1:-1]
+        first = False
+    yield b']'
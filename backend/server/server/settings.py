@@ -43,12 +43,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'account',
     'product',
+    'monitoring',
+    'jobs',  # background job queue in the database (manage.py run_workers)
     'rest_framework',
     'rest_framework_simplejwt',  # JWT authentication
     'corsheaders'  # use this to allow requests from different origins
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',  # keep first: times the whole stack
+    'monitoring.profiler.SQLProfilerMiddleware',  # no-op unless SQL_PROFILER=True
+    'server.compression.CompressionMiddleware',  # after metrics: sizes recorded are the compressed ones
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +88,21 @@ WSGI_APPLICATION = 'server.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connection reuse:
+#   DB_POOL=True        psycopg3 connection pool (needs `pip install "psycopg[binary,pool]"`, Postgres only)
+#   DB_CONN_MAX_AGE=60  otherwise keep each worker's connection open this many seconds (0 = per request)
+# Under ASGI (server/asgi.py sets DJANGO_ASGI) sync code runs in per-request threads, so a persistent
+# connection would be left open in every thread; DB_CONN_MAX_AGE defaults to 0 there, use DB_POOL to reuse.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+RUNNING_ASGI = os.getenv('DJANGO_ASGI', 'False') == 'True'
+DB_OPTIONS = {}
+if DB_POOL:
+    DB_OPTIONS['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+
 DATABASES = {
     "default": {
         "ENGINE": os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
@@ -91,6 +111,10 @@ DATABASES = {
         "PASSWORD": os.getenv('DB_PASSWORD', ''),
         "HOST": os.getenv('DB_HOST', 'localhost'),
         "PORT": os.getenv('DB_PORT', '5432'),
+        # Pooling and persistent connections are mutually exclusive in Django
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '0' if RUNNING_ASGI else '60')),
+        "CONN_HEALTH_CHECKS": os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        "OPTIONS": DB_OPTIONS,
     }
 }
 
@@ -144,6 +168,23 @@ AUTH_USER_MODEL = 'account.CustomUser'
 
 MEDIA_ROOT = os.getenv('MEDIA_ROOT', r'D:\workplace\Images')  # use raw string or double backslashes
 MEDIA_URL = '/media/'
+
+# Photos only through the authenticated /product/photos/<id>/file/ endpoint (product/media.py)
+MEDIA_PROTECTED = os.getenv('MEDIA_PROTECTED', 'False') == 'True'
+MEDIA_DELIVERY = os.getenv('MEDIA_DELIVERY', 'django')  # x-accel (nginx), x-sendfile (Apache) or django
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')  # nginx `internal` location
+MEDIA_URL_TTL = int(os.getenv('MEDIA_URL_TTL', '3600'))  # seconds a signed photo URL stays valid (1-2x)
+
+# With PHOTO_NORMALIZE=True uploaded photos are downscaled and re-encoded before they are stored
+# (product/images.py); the uploaded file itself is then kept only with PHOTO_KEEP_ORIGINAL
+PHOTO_NORMALIZE = os.getenv('PHOTO_NORMALIZE', 'False') == 'True'
+PHOTO_MAX_EDGE = int(os.getenv('PHOTO_MAX_EDGE', '2048'))  # pixels, long edge; 0 = keep the size
+PHOTO_FORMAT = os.getenv('PHOTO_FORMAT', 'JPEG')  # JPEG or WEBP
+PHOTO_QUALITY = int(os.getenv('PHOTO_QUALITY', '82'))
+PHOTO_KEEP_ORIGINAL = os.getenv('PHOTO_KEEP_ORIGINAL', 'False') == 'True'
+# Kept originals still carry EXIF/GPS: keep them out of MEDIA_ROOT, which may be served
+PHOTO_ORIGINALS_DIR = os.getenv('PHOTO_ORIGINALS_DIR', os.path.join(BASE_DIR, 'photo_originals'))
+PHOTO_WORKERS = int(os.getenv('PHOTO_WORKERS', '2'))  # normalization processes per web worker; 0 = inline
 DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', '52428800'))
 
 # Static files for production
@@ -152,13 +193,38 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'account.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson when installed, same output as DRF's JSONRenderer/JSONParser (server/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'server.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'server.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Export endpoints stream the JSON array in chunks of N products instead of building it in memory
+EXPORT_STREAMING = os.getenv('EXPORT_STREAMING', 'True') == 'True'
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+# /product/export/columnar/: rows per Arrow record batch / Parquet row group / MessagePack write
+COLUMNAR_BATCH_SIZE = int(os.getenv('COLUMNAR_BATCH_SIZE', '50000'))
+
+# Response compression (server/compression.py): gzip, plus br/zstd when brotli/zstandard are installed.
+# Levels from benchmarks.compression on an export body: gzip 5 is ~11x at ~100 MB/s; 9 is 6x the CPU for 15% less.
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_ENCODINGS = [e.strip() for e in os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',') if e.strip()]
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '5'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv('COMPRESSION_ZSTD_LEVEL', '3'))
+
 # JWT Configuration
 from datetime import timedelta
 
@@ -184,5 +250,96 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Seconds an authenticated user stays in the in-process auth cache (0 disables it)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+# Max usernames kept in the created_by_username -> user id LRU, and seconds an entry lives
+# (renames/deletes in other workers are seen after it; 0 disables the cache)
+USERNAME_CACHE_SIZE = int(os.getenv('USERNAME_CACHE_SIZE', '256'))
+USERNAME_CACHE_TTL = int(os.getenv('USERNAME_CACHE_TTL', '60'))
+
+# Seconds the vender/client/category/cargo name <-> id maps are kept per worker
+# (renames in other workers are seen after it; 0 disables the cache)
+LOOKUP_CACHE_TTL = int(os.getenv('LOOKUP_CACHE_TTL', '60'))
+
+# Scanner barcode / outbound lookups and date-ordered list pages read products of the last
+# N days (ascending lists: the first N days) first and the whole table only on a miss; with
+# monthly partitions (manage.py partition_products) that touches only a few partitions.
+# 0 reads everything at once.
+PRODUCT_RECENT_DAYS = int(os.getenv('PRODUCT_RECENT_DAYS', '90'))
+
+# manage.py archive_products moves products shipped more than N days ago to the archive tables
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+# ...and drops delete/archive tombstones older than N days; /product/changes/ cursors from
+# before the newest dropped tombstone get 410 and must download everything again
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', '90'))
+
+# In-process barcode -> so_number LRU behind find_so_number; writes in this worker clear entries
+# at once, other workers' writes are seen after the TTL (seconds). 0 disables it.
+BARCODE_CACHE_SIZE = int(os.getenv('BARCODE_CACHE_SIZE', '10000'))
+BARCODE_CACHE_TTL = float(os.getenv('BARCODE_CACHE_TTL', '60'))
+
+# Offline barcode -> so_number snapshots for scanners (manage.py build_barcode_snapshot)
+BARCODE_SNAPSHOT_DIR = os.getenv('BARCODE_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+# Snapshots kept; a device on any of them downloads a delta instead of the full file
+BARCODE_SNAPSHOT_KEEP = int(os.getenv('BARCODE_SNAPSHOT_KEEP', '10'))
+
+# Background jobs (jobs/queue.py). False: no worker is deployed and enqueued tasks run inline in the request
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', 'False') == 'True'
+# manage.py run_workers pool: processes x threads; seconds between polls of an empty queue
+JOBS_WORKER_PROCESSES = int(os.getenv('JOBS_WORKER_PROCESSES', '1'))
+JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', '4'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1.0'))
+# Retries: attempts per job, first delay in seconds (doubled per attempt, with jitter) and the cap
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '3'))
+JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', '10'))
+JOBS_RETRY_MAX_DELAY = float(os.getenv('JOBS_RETRY_MAX_DELAY', '3600'))
+JOBS_ERROR_MAX_LENGTH = 4000  # characters of traceback kept on the job
+# Running jobs refresh started_at every JOBS_HEARTBEAT_INTERVAL seconds; one not refreshed for
+# JOBS_TIMEOUT is assumed to belong to a dead worker and is requeued. Keep the timeout several beats long
+JOBS_HEARTBEAT_INTERVAL = float(os.getenv('JOBS_HEARTBEAT_INTERVAL', '60'))
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', '1800'))
+JOBS_RETENTION_DAYS = int(os.getenv('JOBS_RETENTION_DAYS', '7'))  # finished jobs and their files
+JOBS_OUTPUT_DIR = os.getenv('JOBS_OUTPUT_DIR', os.path.join(BASE_DIR, 'job_output'))  # background exports
+# POST /product/products/ lists longer than this are created by a job (202 + job) when JOBS_ENABLED
+JOBS_BULK_CREATE_THRESHOLD = int(os.getenv('JOBS_BULK_CREATE_THRESHOLD', '500'))
+
+# /product/events/ (SSE) sends a comment line after N idle seconds so proxies keep the stream open
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+# On PostgreSQL, send events through LISTEN/NOTIFY so every process's clients see every write (False: per process)
+EVENTS_NOTIFY = os.getenv('EVENTS_NOTIFY', 'True') == 'True'
+
+# Prometheus /metrics: static bearer token for the scraper (admins/managers may also use their JWT)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Directory shared by all workers (e.g. /dev/shm/tgt_metrics) so /metrics merges every process
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+# Opt-in SQL profiler: Server-Timing/X-DB-Queries headers and a rotating slow-query log with EXPLAIN
+SQL_PROFILER = os.getenv('SQL_PROFILER', 'False') == 'True'
+SQL_SLOW_QUERY_MS = float(os.getenv('SQL_SLOW_QUERY_MS', '200'))
+SQL_SLOW_LOG = os.getenv('SQL_SLOW_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.log'))
+
+if SQL_PROFILER:
+    os.makedirs(os.path.dirname(SQL_SLOW_LOG), exist_ok=True)
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'slow_sql': {'format': '%(asctime)s %(message)s'},
+        },
+        'handlers': {
+            'slow_sql_file': {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': SQL_SLOW_LOG,
+                'maxBytes': int(os.getenv('SQL_SLOW_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                'backupCount': int(os.getenv('SQL_SLOW_LOG_BACKUPS', '5')),
+                'formatter': 'slow_sql',
+            },
+        },
+        'loggers': {
+            'sql.slow': {'handlers': ['slow_sql_file'], 'level': 'WARNING', 'propagate': False},
+        },
+    }
+
 # Scanner API Key Authentication
 SCANNER_API_KEY = os.getenv('SCANNER_API_KEY', 'insecure-default-key-change-in-production')
\ No newline at end of file
@@ -19,17 +19,24 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from monitoring.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     # JWT Authentication endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/', include('monitoring.urls')),
+    path('metrics', metrics, name='metrics'),
     # App endpoints
+    # Background job status (under /product/ so the nginx API location covers it)
+    path('product/jobs/', include('jobs.urls')),
     path('product/', include('product.urls')),
     path('account/', include('account.urls')),
 ]
 
 # Serve media files in both development and production
 # For production, consider using nginx to serve static/media files instead
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# With MEDIA_PROTECTED photos are only reachable through /product/photos/<id>/file/
+if not settings.MEDIA_PROTECTED:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)